@@ -0,0 +1,31 @@
+"""Offline end-to-end benchmark of the collector with a simulated Siemens OPCUA Server"""
+import sys
+import json
+import asyncio
+from my_benchmark.benchmark import Benchmark
+from my_collector.my_collector import load_config
+
+
+def main(config: dict) -> int:
+    report = asyncio.run(Benchmark(config).run())
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}" if isinstance(value, float) else f"{key}: {value}")
+    if "report_path" in config:
+        with open(config["report_path"], "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=4)
+    # thresholds, so a regression of the hot paths fails the CI job
+    failed = False
+    if report["samples_per_second"] < config.get("min_samples_per_second", 0):
+        print(f"samples_per_second below {config['min_samples_per_second']}")
+        failed = True
+    if report["cycle_latency_p99"] > config.get("max_cycle_latency_p99", float("inf")):
+        print(f"cycle_latency_p99 above {config['max_cycle_latency_p99']}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    benchmark_config = load_config(
+        sys.argv[1] if len(sys.argv) > 1 else "benchmark_config_example.json"
+    )
+    sys.exit(main(benchmark_config))
@@ -0,0 +1,79 @@
+"""Headless collector to save many data blocks of many OPCUA Servers into the MySQL Server"""
+import os
+import sys
+import asyncio
+from dotenv import load_dotenv, find_dotenv
+from my_collector.my_collector import Collector, load_config
+from my_collector.sharded_runner import ShardedRunner
+from my_metrics.metrics import metrics
+from my_metrics.metrics_server import MetricsServer
+from my_mysql.infile_mysql import InfileMySQL
+from my_mysql.my_mysql import MySQL
+from my_mysql.async_writer import AsyncMySQLWriter
+from my_processing.aggregator import RollupAggregator
+from my_processing.change_filter import ChangeFilter
+
+load_dotenv(find_dotenv())
+
+
+async def main(config: dict):
+    mysql_config = config.get("mysql", {})
+    engine_arguments = {}
+    if mysql_config.get("engine", "insert") == "infile":
+        # rows streamed to spool segments and loaded with LOAD DATA LOCAL INFILE
+        engine_arguments = {
+            "spool_dir": mysql_config.get("spool_dir", "mysql_segments"),
+            "max_segment_bytes": mysql_config.get("max_segment_bytes", 64 * 1024 * 1024),
+        }
+    my_mysql = await asyncio.to_thread(
+        InfileMySQL if engine_arguments else MySQL,
+        host_name=mysql_config.get("host_name", "localhost"),
+        user_name=os.getenv("MYSQL_USER"),
+        user_password=os.getenv("MYSQL_PASSWORD"),
+        database_name=os.getenv("MYSQL_DATABASE"),
+        batch_size=mysql_config.get("batch_size", 500),
+        max_latency=mysql_config.get("max_latency", 1.0),
+        **engine_arguments,
+    )
+    print("Connected with MySQL Server")
+    async with AsyncMySQLWriter(
+        my_mysql,
+        max_queue_size=mysql_config.get("max_queue_size", 10000),
+        overflow_policy=mysql_config.get("overflow_policy", "spill"),
+        spool_path=mysql_config.get("spool_path", "mysql_spool.sqlite3"),
+        schema=mysql_config.get("schema", "wide"),
+        change_filter=ChangeFilter(**config["change_filter"])
+        if "change_filter" in config
+        else None,
+        aggregator=RollupAggregator(config["rollup_windows"])
+        if "rollup_windows" in config
+        else None,
+        partition_by=mysql_config.get("partition_by", ""),
+        future_partitions=mysql_config.get("future_partitions", 7),
+        retention_days=mysql_config.get("retention_days", 30),
+        maintenance_interval=mysql_config.get("maintenance_interval", 3600),
+    ) as writer:
+        if "metrics" not in config:
+            await Collector(config, writer).run()
+            return
+        # Prometheus endpoint, e.g. http://localhost:9108/metrics
+        metrics.enable()
+        async with MetricsServer(
+            config["metrics"].get("host", "0.0.0.0"), config["metrics"].get("port", 9108)
+        ):
+            await Collector(config, writer).run()
+
+
+if __name__ == "__main__":
+    collector_config = load_config(
+        sys.argv[1] if len(sys.argv) > 1 else "collector_config.json"
+    )
+    if collector_config.get("workers", 1) > 1:
+        # one collector per worker process, rows written by the writer processes
+        ShardedRunner(
+            collector_config,
+            workers=collector_config["workers"],
+            writers=collector_config.get("writers", 1),
+        ).run()
+    else:
+        asyncio.run(main(collector_config))
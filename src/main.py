@@ -1,9 +1,12 @@
 """Main example to connect with OPCUA Server and save data into de MySQL Server"""
 import os
 import asyncio
+from datetime import datetime
 from dotenv import load_dotenv, find_dotenv
 from my_opcua.my_opcua import MyOPCUA
+from my_opcua.scheduler import AcquisitionScheduler
 from my_mysql.my_mysql import MySQL
+from my_mysql.async_writer import AsyncMySQLWriter
 
 load_dotenv(find_dotenv())
 
@@ -13,9 +16,11 @@ async def main():
     url = input("Enter the url of the server (opc.tcp://<IP_OPCUA-SERVERr>:<PORT>): ")
     # client = Client("opc.tcp://192.168.0.120:4840")
     try:
-        async with MyOPCUA(url) as my_opcua:
+        async with MyOPCUA(url, cache_path="node_cache.json") as my_opcua:
             try:
                 print(f"Connected with the OPCUA-Server: {url}")
+                # reconnect automatically instead of ending on a connection problem
+                my_opcua.start_watchdog()
                 print(f"Listing OPCUA-Server {url}:")
                 # print all databases un the server
                 databases_list = await my_opcua.get_list_of_databases()
@@ -25,10 +30,13 @@ async def main():
                 specific_db_name = input(
                     "Please, enter the name of the database you want to read and save: "
                 )
-                db_variables = await my_opcua.get_values_from_db_name(specific_db_name)
+                db_variables, _ = await my_opcua.get_sample_from_db_name(
+                    specific_db_name
+                )
                 if bool(db_variables):  # check if db_variable is not empty
                     # connecting with the database
-                    my_mysql = MySQL(
+                    my_mysql = await asyncio.to_thread(
+                        MySQL,
                         # host_name="192.168.0.99",
                         host_name="192.168.68.133",
                         user_name=os.getenv("MYSQL_USER"),
@@ -36,21 +44,46 @@ async def main():
                         database_name=os.getenv("MYSQL_DATABASE"),
                     )
                     print("Connected with MySQL Server")
-                    # creating the dict with all values from the specific database
-                    db_variables = await my_opcua.get_values_from_db_name(
-                        specific_db_name
-                    )
-                    if my_mysql.create_table(specific_db_name, db_variables):
-                        print("Table created successfully")
-                        while True:
-                            # creating the dict with all values from the specific database
-                            db_variables = await my_opcua.get_values_from_db_name(
-                                specific_db_name
+                    # the MySQL writes run in a writer thread, not on the event loop
+                    async with AsyncMySQLWriter(
+                        my_mysql, overflow_policy="spill"
+                    ) as writer:
+                        # creating the dict with all columns from the specific database,
+                        # including the variables that are Bad right now
+                        db_variables = await my_opcua.get_db_columns(specific_db_name)
+                        if await writer.create_table(specific_db_name, db_variables):
+                            print("Table created successfully")
+                            mode = input(
+                                "Acquisition mode, poll every 5 s or subscribe to changes (poll/subscribe): "
                             )
-                            # inserting values into the table
-                            if my_mysql.insert_into_table(specific_db_name, db_variables):
-                                print(f"Info saved in the database: {db_variables}")
-                            await asyncio.sleep(5)
+                            if mode.strip().lower() == "subscribe":
+
+                                async def save_values(values: dict, created: datetime) -> None:
+                                    await writer.put(specific_db_name, values, created)
+                                    print(f"Info queued for the database: {len(values)} values")
+
+                                await my_opcua.subscribe_db_name(
+                                    specific_db_name, save_values, sampling_interval=100
+                                )
+                                while True:
+                                    await asyncio.sleep(3600)
+
+                            async def acquire(tick: datetime) -> None:
+                                # creating the dict with all values from the specific database,
+                                # stamped with the time of the read
+                                db_variables, created = await my_opcua.get_sample_from_db_name(
+                                    specific_db_name
+                                )
+                                # queueing values to be inserted into the table
+                                await writer.put(specific_db_name, db_variables, created)
+                                print(
+                                    f"Info queued for the database: {len(db_variables)} values"
+                                )
+
+                            # acquisitions every 5 s, aligned to the wall clock
+                            scheduler = AcquisitionScheduler()
+                            scheduler.add_job(specific_db_name, 5, acquire)
+                            await scheduler.run()
                 else:
                     print(f"Error reading database {specific_db_name}")
             finally:
@@ -0,0 +1,181 @@
+"""Benchmark class to measure the collector end to end against a simulated server and a local SQL stand-in"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from my_benchmark.simulated_server import SimulatedSiemensServer, serve
+from my_benchmark.sql_stand_in import SQLiteMySQL
+from my_collector.my_collector import Collector
+from my_mysql.async_writer import AsyncMySQLWriter
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class Benchmark:
+    """
+    An offline, reproducible end-to-end benchmark of the read and insert hot paths.
+
+    A SimulatedSiemensServer runs in a separate process, so the CPU and memory figures are those of
+    the collector only. A Collector acquires all its data blocks with a shared AsyncMySQLWriter on a
+    SQLiteMySQL stand-in, so the MyOPCUA reads, the scheduler, the writer thread and the MySQL
+    buffering and INSERT code all run as in production. After a warm-up, the figures are measured
+    during "duration" seconds.
+
+    The configuration is a dictionary (every key is optional):
+        {
+            "endpoint": "opc.tcp://127.0.0.1:48500/",
+            "server": {"data_blocks": 4, "scalars": 50, "arrays": 5, "array_length": 10,
+                       "change_rate": 10.0, "changed_fraction": 0.2, "seed": 0},
+            "interval": 0.1,
+            "max_concurrency": 2,
+            "pack_arrays": false,
+            "columnar": false,
+            "mysql": {"batch_size": 500, "max_latency": 1.0, "schema": "wide"},
+            "database_path": ":memory:",
+            "warmup": 3.0,
+            "duration": 20.0
+        }
+
+    Args:
+        config (dict): The benchmark configuration.
+
+    Example:
+        report = await Benchmark({"duration": 10}).run()
+        print(report["samples_per_second"])
+    """
+
+    def __init__(self, config: dict = None) -> None:
+        """
+        Initialize a new instance of Benchmark.
+
+        Args:
+            config (dict): The benchmark configuration.
+        """
+        self.config = config or {}
+        self.endpoint = self.config.get("endpoint", "opc.tcp://127.0.0.1:48500/")
+        self.server_config = dict(self.config.get("server", {}), endpoint=self.endpoint)
+
+    def get_collector_config(self) -> dict:
+        """
+        Get the collector configuration acquiring all the simulated data blocks.
+
+        Returns:
+            dict: The configuration of the Collector.
+        """
+        db_names = SimulatedSiemensServer(**self.server_config).get_db_names()
+        return {
+            "overrun_policy": "skip",
+            "mysql": self.config.get("mysql", {}),
+            "endpoints": [
+                {
+                    "url": self.endpoint,
+                    "max_concurrency": self.config.get("max_concurrency", 2),
+                    "pack_arrays": self.config.get("pack_arrays", False),
+                    "data_blocks": [
+                        {
+                            "name": db_name,
+                            "interval": self.config.get("interval", 0.1),
+                            "table": f"bench_{db_name}",
+                            "columnar": self.config.get("columnar", False),
+                        }
+                        for db_name in db_names
+                    ],
+                }
+            ],
+        }
+
+    async def run(self) -> dict:
+        """
+        Start the simulated server, run the collector and measure it.
+
+        Returns:
+            dict: The report: samples (rows of the tables) and values written per second, acquisition
+            cycles, cycle latency percentiles in seconds (worst data block), overruns, write latencies,
+            CPU usage in percent of one core and peak memory (RSS) in MB.
+        """
+        context = multiprocessing.get_context("spawn")
+        ready = context.Event()
+        stop = context.Event()
+        server_process = context.Process(
+            target=serve, args=(self.server_config, ready, stop), daemon=True
+        )
+        server_process.start()
+        try:
+            if not await asyncio.to_thread(ready.wait, 60):
+                raise TimeoutError("The simulated server did not start")
+            with tempfile.TemporaryDirectory() as spool_dir:
+                return await self._measure(os.path.join(spool_dir, "spool.sqlite3"))
+        finally:
+            stop.set()
+            await asyncio.to_thread(server_process.join, 10)
+            if server_process.is_alive():
+                server_process.terminate()
+
+    async def _measure(self, spool_path: str) -> dict:
+        mysql_config = self.config.get("mysql", {})
+        my_mysql = SQLiteMySQL(
+            self.config.get("database_path", ":memory:"),
+            batch_size=mysql_config.get("batch_size", 500),
+            max_latency=mysql_config.get("max_latency", 1.0),
+        )
+        async with AsyncMySQLWriter(
+            my_mysql, spool_path=spool_path, schema=mysql_config.get("schema", "wide")
+        ) as writer:
+            collector = Collector(self.get_collector_config(), writer)
+            task = asyncio.create_task(collector.run())
+            await asyncio.sleep(self.config.get("warmup", 3.0))
+            collector.scheduler.reset_stats()
+            rows_start = my_mysql.rows_written
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            await asyncio.sleep(self.config.get("duration", 20.0))
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            rows = my_mysql.rows_written - rows_start
+            job_stats = collector.get_stats()
+            writer_stats = await writer.get_stats()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if mysql_config.get("schema", "wide") == "long":
+            values_per_row = 1  # one row per tag and sample
+        else:
+            array_length = (
+                1
+                if self.config.get("pack_arrays")
+                else self.server_config.get("array_length", 10)
+            )
+            values_per_row = (
+                self.server_config.get("scalars", 50)
+                + self.server_config.get("arrays", 5) * array_length
+            )
+        return {
+            "duration": wall,
+            "samples_per_second": rows / wall,
+            "values_per_second": rows * values_per_row / wall,
+            "cycles": sum(stats["runs"] for stats in job_stats.values()),
+            "overruns": sum(stats["overruns"] for stats in job_stats.values()),
+            "skipped_ticks": sum(stats["skipped_ticks"] for stats in job_stats.values()),
+            "cycle_latency_p50": max(
+                (stats["p50_duration"] for stats in job_stats.values()), default=0.0
+            ),
+            "cycle_latency_p95": max(
+                (stats["p95_duration"] for stats in job_stats.values()), default=0.0
+            ),
+            "cycle_latency_p99": max(
+                (stats["p99_duration"] for stats in job_stats.values()), default=0.0
+            ),
+            "cycle_latency_max": max(
+                (stats["max_duration"] for stats in job_stats.values()), default=0.0
+            ),
+            "avg_write_latency": writer_stats["avg_write_latency"],
+            "max_write_latency": writer_stats["max_write_latency"],
+            "rows_spilled": writer_stats["rows_spilled"],
+            "cpu_percent": 100 * cpu / wall,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            if resource is not None
+            else None,
+        }
@@ -0,0 +1,191 @@
+"""SimulatedSiemensServer class, a local OPCUA Server with the address space of a Siemens PLC"""
+import asyncio
+import random
+from asyncua import Server, ua
+
+# Data types of the scalar variables, in rotation (Siemens REAL, INT and BOOL)
+SCALAR_TYPES = (ua.VariantType.Float, ua.VariantType.Int16, ua.VariantType.Boolean)
+
+
+class SimulatedSiemensServer:
+    """
+    A local asyncua server exposing data blocks like the OPC UA server of a Siemens S7-1500.
+
+    The data blocks are objects "ns=3;s="DB_<n>"" under "ns=3;s=DataBlocksGlobal", with scalar variables
+    "ns=3;s="DB_<n>"."Scalar_<i>"" (REAL, INT and BOOL in rotation) and REAL array variables
+    "ns=3;s="DB_<n>"."Array_<i>"". "change_rate" times per second, a random "changed_fraction" of the
+    variables gets a new value. The changes are seeded, so two runs are identical.
+
+    Args:
+        endpoint (str): The endpoint of the server, e.g. "opc.tcp://127.0.0.1:48500/".
+        data_blocks (int): The number of data blocks.
+        scalars (int): The number of scalar variables per data block.
+        arrays (int): The number of array variables per data block.
+        array_length (int): The number of elements of the arrays.
+        change_rate (float): The number of change cycles per second. 0 keeps the values constant.
+        changed_fraction (float): The fraction of the variables changed on every cycle.
+        seed (int): The seed of the random changes.
+
+    Example:
+        async with SimulatedSiemensServer("opc.tcp://127.0.0.1:48500/", data_blocks=4) as server:
+            async with MyOPCUA(server.endpoint) as my_opcua:
+                values = await my_opcua.get_values_from_db_name("DB_1")
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        data_blocks: int = 4,
+        scalars: int = 50,
+        arrays: int = 5,
+        array_length: int = 10,
+        change_rate: float = 10.0,
+        changed_fraction: float = 0.2,
+        seed: int = 0,
+    ) -> None:
+        """
+        Initialize a new instance of SimulatedSiemensServer.
+
+        Args:
+            endpoint (str): The endpoint of the server.
+            data_blocks (int): The number of data blocks.
+            scalars (int): The number of scalar variables per data block.
+            arrays (int): The number of array variables per data block.
+            array_length (int): The number of elements of the arrays.
+            change_rate (float): The number of change cycles per second.
+            changed_fraction (float): The fraction of the variables changed on every cycle.
+            seed (int): The seed of the random changes.
+        """
+        self.endpoint = endpoint
+        self.data_blocks = data_blocks
+        self.scalars = scalars
+        self.arrays = arrays
+        self.array_length = array_length
+        self.change_rate = change_rate
+        self.changed_fraction = changed_fraction
+        self.random = random.Random(seed)
+        self.server = None
+        self.variables = []  # (node id, variant type, is array)
+        self.changes = 0
+        self._changer = None
+
+    async def __aenter__(self):
+        """
+        Start the server when entering an asynchronous context.
+
+        Returns:
+            self: The instance of the object.
+        """
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Stop the server when exiting an asynchronous context.
+        """
+        await self.stop()
+
+    def get_db_names(self) -> list:
+        """
+        Get the names of the simulated data blocks.
+
+        Returns:
+            list[str]: The names of the data blocks ("DB_1", "DB_2", ...).
+        """
+        return [f"DB_{number}" for number in range(1, self.data_blocks + 1)]
+
+    async def start(self) -> None:
+        """
+        Build the address space, start the server and the change cycles.
+        """
+        self.server = Server()
+        await self.server.init()
+        self.server.set_endpoint(self.endpoint)
+        self.server.set_server_name("Simulated SIMATIC S7-1500 OPC UA Server")
+        # ns=2 and ns=3, as on a S7-1500 where the PLC variables are in ns=3
+        await self.server.register_namespace("http://www.siemens.com/simatic-s7-opcua")
+        namespace = await self.server.register_namespace("urn:SIMATIC.S7-1500.OPC-UA.Application:PLC_1")
+        folder = await self.server.nodes.objects.add_folder(
+            ua.NodeId("DataBlocksGlobal", namespace), "DataBlocksGlobal"
+        )
+        for db_name in self.get_db_names():
+            data_block = await folder.add_object(
+                ua.NodeId(f'"{db_name}"', namespace), db_name
+            )
+            for index in range(self.scalars):
+                variant_type = SCALAR_TYPES[index % len(SCALAR_TYPES)]
+                node = await data_block.add_variable(
+                    ua.NodeId(f'"{db_name}"."Scalar_{index}"', namespace),
+                    f"Scalar_{index}",
+                    self._get_value(variant_type),
+                    variant_type,
+                )
+                self.variables.append((node.nodeid, variant_type, False))
+            for index in range(self.arrays):
+                node = await data_block.add_variable(
+                    ua.NodeId(f'"{db_name}"."Array_{index}"', namespace),
+                    f"Array_{index}",
+                    [self._get_value(ua.VariantType.Float) for _ in range(self.array_length)],
+                    ua.VariantType.Float,
+                )
+                self.variables.append((node.nodeid, ua.VariantType.Float, True))
+        await self.server.start()
+        if self.change_rate > 0:
+            self._changer = asyncio.create_task(self._change_values())
+
+    async def stop(self) -> None:
+        """
+        Stop the change cycles and the server.
+        """
+        if self._changer is not None:
+            self._changer.cancel()
+            self._changer = None
+        if self.server is not None:
+            await self.server.stop()
+            self.server = None
+
+    def _get_value(self, variant_type):
+        if variant_type == ua.VariantType.Boolean:
+            return self.random.random() < 0.5
+        if variant_type == ua.VariantType.Int16:
+            return self.random.randint(-1000, 1000)
+        return round(self.random.uniform(0.0, 100.0), 3)
+
+    async def _change_values(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_cycle = loop.time()
+        changed = max(1, round(len(self.variables) * self.changed_fraction))
+        while True:
+            for node_id, variant_type, is_array in self.random.sample(
+                self.variables, min(changed, len(self.variables))
+            ):
+                value = (
+                    [self._get_value(variant_type) for _ in range(self.array_length)]
+                    if is_array
+                    else self._get_value(variant_type)
+                )
+                await self.server.write_attribute_value(
+                    node_id, ua.DataValue(ua.Variant(value, variant_type))
+                )
+                self.changes += 1
+            next_cycle += 1 / self.change_rate
+            await asyncio.sleep(max(0.0, next_cycle - loop.time()))
+
+
+def serve(server_config: dict, ready, stop) -> None:
+    """
+    Run a SimulatedSiemensServer until "stop" is set, e.g. in a separate process.
+
+    Args:
+        server_config (dict): The arguments of SimulatedSiemensServer.
+        ready (multiprocessing.Event): Set once the server accepts connections.
+        stop (multiprocessing.Event): Set to stop the server.
+    """
+
+    async def run() -> None:
+        async with SimulatedSiemensServer(**server_config):
+            ready.set()
+            while not stop.is_set():
+                await asyncio.sleep(0.1)
+
+    asyncio.run(run())
@@ -0,0 +1,185 @@
+"""SQLiteMySQL class, a local SQLite stand-in of the MySQL Server for offline benchmarks"""
+import functools
+import re
+import sqlite3
+from datetime import datetime
+import mysql.connector
+from mysql.connector import errorcode
+from my_mysql.my_mysql import MySQL
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+
+
+def to_mysql_error(err: sqlite3.Error) -> mysql.connector.Error:
+    """
+    Convert a SQLite error to the mysql.connector error the MySQL server would raise.
+
+    Args:
+        err (sqlite3.Error): The SQLite error.
+
+    Returns:
+        mysql.connector.Error: A ProgrammingError (with errno ER_NO_SUCH_TABLE for a missing table)
+        for an invalid statement, an IntegrityError or a DataError for rows the table rejects, an
+        OperationalError (transient, e.g. a locked database) otherwise.
+    """
+    message = str(err)
+    if message.startswith("no such table"):
+        return mysql.connector.errors.ProgrammingError(
+            msg=message, errno=errorcode.ER_NO_SUCH_TABLE
+        )
+    if isinstance(err, sqlite3.IntegrityError):
+        return mysql.connector.errors.IntegrityError(msg=message)
+    if isinstance(err, (sqlite3.DataError, sqlite3.InterfaceError)):
+        return mysql.connector.errors.DataError(msg=message)
+    if isinstance(err, sqlite3.ProgrammingError) or not re.search(
+        "locked|busy|disk i/o|unable to open", message
+    ):
+        return mysql.connector.errors.ProgrammingError(msg=message)
+    return mysql.connector.errors.OperationalError(msg=message)
+
+
+@functools.lru_cache(maxsize=256)
+def translate_sql(sql: str) -> str:
+    """
+    Translate a SQL command of the MySQL class to SQLite.
+
+    Args:
+        sql (str): The MySQL command.
+
+    Returns:
+        str: The same command for SQLite.
+
+    Example:
+        translate_sql("INSERT IGNORE INTO t (a, created) VALUES(%s, %s)")
+        # Output:
+        # "INSERT OR IGNORE INTO t (a, created) VALUES(?, ?)"
+    """
+    sql = re.sub(r"\s+PARTITION BY .*$", "", sql, flags=re.DOTALL)
+    sql = re.sub(r", INDEX \w+ \(created\)", "", sql)
+    # the index names of SQLite are global: one created index per table, with the table in its name
+    sql = re.sub(
+        r"^SHOW INDEX FROM (\w+) WHERE .*$",
+        r"SELECT name FROM sqlite_master WHERE type = 'index' AND name = '\1_created_index'",
+        sql,
+    )
+    sql = re.sub(r"^CREATE INDEX (\w+) ON (\w+)", r"CREATE INDEX \2_\1 ON \2", sql)
+    sql = sql.replace("AUTO_INCREMENT", "").replace("INSERT IGNORE", "INSERT OR IGNORE")
+    return sql.replace("%s", "?")
+
+
+class _SQLiteCursor:
+    """
+    A cursor with the subset of the mysql.connector cursor API used by the MySQL class.
+    """
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.cursor = connection.cursor()
+
+    def execute(self, sql: str, params=()) -> None:
+        head, separator, values = sql.rpartition("VALUES")
+        rows = values.count("(")
+        try:
+            if params and separator and rows > 1:
+                # multi-row INSERT: SQLite limits the placeholders of a statement, one row per execution
+                row_size = len(params) // rows
+                self.cursor.executemany(
+                    translate_sql(f"{head}VALUES {values.split('),')[0].strip()})"),
+                    [params[start : start + row_size] for start in range(0, len(params), row_size)],
+                )
+            else:
+                self.cursor.execute(translate_sql(sql), tuple(params))
+        except sqlite3.Error as err:
+            raise to_mysql_error(err) from err
+
+    def executemany(self, sql: str, rows: list) -> None:
+        try:
+            self.cursor.executemany(translate_sql(sql), rows)
+        except sqlite3.Error as err:
+            raise to_mysql_error(err) from err
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchmany(self, size: int) -> list:
+        return self.cursor.fetchmany(size)
+
+    def fetchall(self) -> list:
+        return self.cursor.fetchall()
+
+    @property
+    def column_names(self) -> tuple:
+        return tuple(description[0] for description in self.cursor.description)
+
+    @property
+    def description(self) -> list:
+        return self.cursor.description  # no type codes: None
+
+    def close(self) -> None:
+        self.cursor.close()
+
+
+class _SQLiteConnection:
+    """
+    A connection with the subset of the mysql.connector connection API used by the MySQL class.
+    """
+
+    def __init__(self, database_path: str) -> None:
+        # the MySQL instance is created in one thread and used in the writer thread
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+
+    def cursor(self, prepared: bool = False, buffered: bool = False) -> _SQLiteCursor:
+        return _SQLiteCursor(self.connection)
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    def is_connected(self) -> bool:
+        return True
+
+    def reconnect(self, attempts: int = 1, delay: int = 0) -> None:
+        pass
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class SQLiteMySQL(MySQL):
+    """
+    The MySQL class on a local SQLite database instead of a MySQL server.
+
+    All the table creation, buffering and INSERT code of MySQL runs unchanged; only the connection
+    is replaced, and the SQL commands are translated to SQLite (see translate_sql). It lets the
+    collector and the writer be measured offline, without a MySQL server.
+
+    Args:
+        database_path (str): The SQLite database file, ":memory:" for an in-memory database.
+        batch_size (int): Number of buffered rows that triggers a flush.
+        max_latency (float): Maximum time in seconds a buffered row waits before being flushed.
+
+    Example:
+        my_mysql = SQLiteMySQL(":memory:")
+        async with AsyncMySQLWriter(my_mysql) as writer:
+            await Collector(config, writer).run()
+    """
+
+    def __init__(
+        self, database_path: str = ":memory:", batch_size: int = 500, max_latency: float = 1.0
+    ) -> None:
+        """
+        Initialize a new instance of SQLiteMySQL.
+
+        Args:
+            database_path (str): The SQLite database file, ":memory:" for an in-memory database.
+            batch_size (int): Number of buffered rows that triggers a flush.
+            max_latency (float): Maximum time in seconds a buffered row waits before being flushed.
+        """
+        self.database_path = database_path
+        super().__init__("", "", "", "", batch_size, max_latency)
+
+    def _connect(
+        self, host_name: str, user_name: str, user_password: str, database_name: str
+    ) -> _SQLiteConnection:
+        return _SQLiteConnection(self.database_path)
@@ -0,0 +1,372 @@
+"""Collector class to acquire many data blocks of many OPCUA servers concurrently in one process"""
+import asyncio
+import json
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from my_metrics.metrics import metrics
+from my_mysql.my_mysql import utc_now
+from my_opcua.my_opcua import MyOPCUA
+from my_opcua.scheduler import AcquisitionScheduler
+from my_processing.columnar_buffer import ColumnarRingBuffer
+
+
+def load_config(path: str) -> dict:
+    """
+    Load a collector configuration from a JSON file.
+
+    Args:
+        path (str): The path of the JSON file (see src/collector_config_example.json).
+
+    Returns:
+        dict: The configuration.
+    """
+    with open(path, encoding="utf-8") as config_file:
+        return json.load(config_file)
+
+
+def validate_config(config: dict) -> None:
+    """
+    Check the combinations of options that cannot work together.
+
+    Packed arrays (endpoint option "pack_arrays") are only stored by the wide schema: the long schema
+    keeps one numeric sample per tag, so an array must be stored as one tag per element.
+
+    Args:
+        config (dict): The collector configuration.
+
+    Raises:
+        ValueError: If an option combination is not supported.
+    """
+    if config.get("mysql", {}).get("schema", "wide") != "long":
+        return
+    for endpoint in config.get("endpoints", []):
+        if endpoint.get("pack_arrays", False):
+            raise ValueError(
+                f"pack_arrays of {endpoint['url']} is not supported with the long schema"
+            )
+
+
+class Collector:
+    """
+    A headless collector that acquires many data blocks of many OPC UA servers on a single event loop.
+
+    The collector holds one session per server, schedules every data block on its own interval with
+    an AcquisitionScheduler, limits the number of concurrent reads per server with a semaphore, and
+    sends all the rows to one shared sink (e.g. an AsyncMySQLWriter).
+
+    The configuration is a dictionary with an "endpoints" list:
+        {
+            "endpoints": [
+                {
+                    "url": "opc.tcp://192.168.68.200:4840",
+                    "max_concurrency": 2,
+                    "cache_path": "node_cache_plc1.json",
+                    "data_blocks": [
+                        {"name": "Data_DB", "interval": 1.0, "table": "plc1_Data_DB"}
+                    ]
+                }
+            ]
+        }
+    "max_concurrency" defaults to 1, "cache_path" to no persisted cache, "interval" to 5 s and
+    "table" to the data block name. Rows are stamped with the time of the read, and the long schema
+    stores every tag with its own source timestamp; a data block option "bad_quality" ("flag" or
+    "drop", see MyOPCUA.get_sample_from_db_name) defaults to "flag". The table gets a column for
+    every variable of the data block (see MyOPCUA.get_db_columns). With "pack_arrays": true on an
+    endpoint, its numeric arrays are stored as one packed BLOB column each, described in the
+    "<table>_arrays" table.
+
+    With "columnar": true, a data block is read straight into a ColumnarRingBuffer (see
+    MyOPCUA.read_into_buffer, the samples with a Bad variable are dropped) and handed to the sink
+    with "put_batch(db_name, batch)" every "columnar_batch" samples (1 by default), without a
+    dictionary per sample.
+
+    The reads, transformations, inserts and acquisition cycles are measured with the shared metrics
+    registry (see my_metrics.metrics), which only collects when it is enabled.
+
+    Every session is watched with keepalives and reconnected automatically (see
+    MyOPCUA.start_watchdog, configured by an optional "watchdog" section with its arguments).
+
+    With a "backfill" section, the gap between the newest stored row of every table and its first
+    live sample, or the end of a reconnection, is filled from the history of the server (see
+    backfill_data_block), next to the live acquisition:
+        "backfill": {"max_age": 86400, "chunk_length": 600, "max_values_per_node": 1000,
+                     "min_request_interval": 0.5}
+
+    Args:
+        config (dict): The collector configuration.
+        sink: An object with "create_table(db_name, variables)" and
+            "put(db_name, variables, created, source_timestamps)" coroutines, like AsyncMySQLWriter.
+            The backfill also needs "get_last_timestamp(db_name)" and "put_history(db_name, rows)",
+            the columnar data blocks "put_batch(db_name, batch)".
+
+    Example:
+        async with AsyncMySQLWriter(my_mysql) as writer:
+            collector = Collector(load_config("collector_config.json"), writer)
+            await collector.run()
+    """
+
+    def __init__(self, config: dict, sink) -> None:
+        """
+        Initialize a new instance of Collector.
+
+        Args:
+            config (dict): The collector configuration.
+            sink: The sink shared by all the data blocks.
+
+        Raises:
+            ValueError: If the configuration combines unsupported options (see validate_config).
+        """
+        validate_config(config)
+        self.config = config
+        self.sink = sink
+        self.scheduler = AcquisitionScheduler(config.get("overrun_policy", "skip"))
+        self.sessions = {}  # url -> MyOPCUA
+        self._backfill_tasks = []
+        self._last_handed = {}  # table -> time of the newest live sample handed to the sink
+        self._reconnect_handed = {}  # table -> time of the first sample handed during a reconnection
+
+    async def run(self) -> None:
+        """
+        Connect to all the servers, create the tables and acquire the data blocks until cancelled.
+
+        Servers that cannot be connected or data blocks that cannot be read are reported and skipped,
+        the rest of the plant keeps being acquired.
+        """
+        async with AsyncExitStack() as stack:
+            endpoints = self.config["endpoints"]
+            connected = await asyncio.gather(
+                *(self._connect(stack, endpoint) for endpoint in endpoints),
+                return_exceptions=True,
+            )
+            jobs = []
+            for endpoint, my_opcua in zip(endpoints, connected):
+                if isinstance(my_opcua, BaseException):
+                    print(f"Error connecting with {endpoint['url']}: {my_opcua}")
+                    continue
+                semaphore = asyncio.Semaphore(endpoint.get("max_concurrency", 1))
+                for data_block in endpoint["data_blocks"]:
+                    jobs.append(self._add_data_block(my_opcua, semaphore, data_block))
+                my_opcua.start_watchdog(**self.config.get("watchdog", {}))
+                if "backfill" in self.config:
+                    my_opcua.add_reconnect_callback(
+                        self._get_reconnect_backfill(my_opcua, semaphore, endpoint)
+                    )
+            await asyncio.gather(*jobs)
+            try:
+                await self.scheduler.run()
+            finally:
+                for task in self._backfill_tasks:
+                    task.cancel()
+
+    def get_stats(self) -> dict:
+        """
+        Get the scheduler statistics of every data block.
+
+        Returns:
+            dict: A dictionary mapping table names to their acquisition statistics.
+        """
+        return self.scheduler.get_stats()
+
+    def get_connection_stats(self) -> dict:
+        """
+        Get the session statistics (reconnections and downtimes) of every server.
+
+        Returns:
+            dict: A dictionary mapping server URLs to their MyOPCUA.get_connection_stats.
+        """
+        return {
+            url: my_opcua.get_connection_stats() for url, my_opcua in self.sessions.items()
+        }
+
+    async def _connect(self, stack: AsyncExitStack, endpoint: dict) -> MyOPCUA:
+        my_opcua = await stack.enter_async_context(
+            MyOPCUA(
+                endpoint["url"],
+                cache_path=endpoint.get("cache_path"),
+                pack_arrays=endpoint.get("pack_arrays", False),
+            )
+        )
+        self.sessions[endpoint["url"]] = my_opcua
+        print(f"Connected with the OPCUA-Server: {endpoint['url']}")
+        return my_opcua
+
+    def _get_reconnect_backfill(
+        self, my_opcua: MyOPCUA, semaphore: asyncio.Semaphore, endpoint: dict
+    ):
+        def backfill(disconnected_since: datetime, reconnected_at: datetime) -> None:
+            for data_block in endpoint["data_blocks"]:
+                table = data_block.get("table", data_block["name"])
+                # taken now: the live samples of the new session are handed during the backfill
+                handed = self._last_handed.get(table)
+                # the samples read while the session was restored are already live rows
+                first_live = self._reconnect_handed.pop(table, None)
+                end = min(reconnected_at, first_live) if first_live else reconnected_at
+                self._backfill_tasks.append(
+                    asyncio.create_task(
+                        self.backfill_data_block(
+                            my_opcua, semaphore, data_block, end, handed, disconnected_since
+                        )
+                    )
+                )
+            self._backfill_tasks = [task for task in self._backfill_tasks if not task.done()]
+
+        return backfill
+
+    def _set_handed(self, my_opcua: MyOPCUA, table: str, created: datetime) -> None:
+        # The samples read while a lost session is restored (before the reconnect callbacks) do not
+        # move the start of the reconnect backfill: the first one ends it.
+        if my_opcua.disconnected_since is None:
+            self._last_handed[table] = created
+        else:
+            self._reconnect_handed.setdefault(table, created)
+
+    async def _add_data_block(
+        self, my_opcua: MyOPCUA, semaphore: asyncio.Semaphore, data_block: dict
+    ) -> None:
+        db_name = data_block["name"]
+        table = data_block.get("table", db_name)
+        bad_quality = data_block.get("bad_quality", "flag")
+        try:
+            async with semaphore:
+                # every variable gets a column, even if it is Bad right now
+                db_variables = await my_opcua.get_db_columns(db_name)
+        except Exception as err:
+            print(f"Error reading database {db_name}: {err}")
+            return
+        created = utc_now()
+        if not db_variables:
+            print(f"Error reading database {db_name}")
+            return
+        if not await self.sink.create_table(table, db_variables):
+            print(f"Error creating table {table}")
+            return
+        if my_opcua.pack_arrays:
+            arrays = await my_opcua.get_array_metadata(db_name)
+            if not await self.sink.save_array_metadata(table, arrays):
+                print(f"Error saving the array metadata of {table}")
+        if "backfill" in self.config:
+            self._backfill_tasks.append(
+                asyncio.create_task(
+                    self.backfill_data_block(my_opcua, semaphore, data_block, created)
+                )
+            )
+
+        async def acquire(tick: datetime) -> None:
+            with metrics.timer("collector_cycle_seconds", table=table):
+                try:
+                    async with semaphore:
+                        (
+                            values,
+                            created,
+                            source_timestamps,
+                        ) = await my_opcua.get_timestamped_sample_from_db_name(
+                            db_name, bad_quality
+                        )
+                except Exception:
+                    metrics.inc("collector_errors_total", table=table)
+                    raise
+                if values:
+                    metrics.inc("collector_samples_total", table=table)
+                    await self.sink.put(table, values, created, source_timestamps)
+                    self._set_handed(my_opcua, table, created)
+
+        buffers = []  # the ColumnarRingBuffer of the data block, with "columnar": true
+        batch_rows = data_block.get("columnar_batch", 1)
+
+        async def acquire_columnar(tick: datetime) -> None:
+            with metrics.timer("collector_cycle_seconds", table=table):
+                try:
+                    async with semaphore:
+                        tag_index = await my_opcua.get_tag_index(db_name)
+                        if not buffers or buffers[-1].tag_index is not tag_index:
+                            buffers.append(ColumnarRingBuffer(tag_index, max(batch_rows, 1)))
+                        added = await my_opcua.read_into_buffer(db_name, buffers[-1])
+                except Exception:
+                    metrics.inc("collector_errors_total", table=table)
+                    raise
+                if added:
+                    metrics.inc("collector_samples_total", table=table)
+                    # a buffered sample is handed to the sink with its batch
+                    self._set_handed(my_opcua, table, buffers[-1].last_timestamp)
+                # a new layout (the node cache was invalidated) replaces the old buffer
+                for buffer in buffers[:-1]:
+                    await self.sink.put_batch(table, buffer.drain())
+                del buffers[:-1]
+                if buffers[-1].count >= batch_rows:
+                    await self.sink.put_batch(table, buffers[-1].drain())
+
+        self.scheduler.add_job(
+            table,
+            data_block.get("interval", 5),
+            acquire_columnar if data_block.get("columnar", False) else acquire,
+            data_block.get("offset", 0.0),
+        )
+
+    async def backfill_data_block(
+        self,
+        my_opcua: MyOPCUA,
+        semaphore: asyncio.Semaphore,
+        data_block: dict,
+        end: datetime,
+        handed: datetime = None,
+        disconnected_since: datetime = None,
+    ) -> int:
+        """
+        Fill the gap between the newest stored row of a data block and "end" from the server history.
+
+        The gap starts after "handed", the newest live sample handed to the sink before the session
+        was lost (it may still wait in the queue of the writer, and the newer stored rows come from
+        the new session), or else after the newest row stored by the sink (in MySQL or its spool),
+        at most "disconnected_since": so no sample is written twice after a reconnection. Nothing is
+        done for a new (empty) table or a gap shorter than the interval of the data block. Gaps
+        longer than "max_age" seconds are only filled for the last "max_age" seconds.
+
+        Args:
+            my_opcua (MyOPCUA): The session of the server of the data block.
+            semaphore (asyncio.Semaphore): The semaphore of the server, shared with the live reads.
+            data_block (dict): The configuration of the data block.
+            end (datetime): The end of the gap, e.g. the start of the live acquisition.
+            handed (datetime): The time of the newest live sample handed to the sink before the gap.
+            disconnected_since (datetime): The time the session was lost, for a reconnect backfill.
+
+        Returns:
+            int: The number of backfilled samples.
+        """
+        db_name = data_block["name"]
+        table = data_block.get("table", db_name)
+        backfill = self.config.get("backfill", {})
+        try:
+            last_timestamp = await self.sink.get_last_timestamp(table)
+            if last_timestamp is None:
+                return 0
+            if handed is not None:
+                last_timestamp = handed
+            elif disconnected_since is not None:
+                last_timestamp = min(last_timestamp, disconnected_since)
+            start = max(
+                last_timestamp + timedelta(microseconds=1),
+                end - timedelta(seconds=backfill.get("max_age", 86400)),
+            )
+            if (end - start).total_seconds() <= data_block.get("interval", 5):
+                return 0
+            print(f"Backfilling {table} from {start} to {end}")
+
+            async def save(rows: list) -> None:
+                await self.sink.put_history(table, rows)
+
+            samples = await my_opcua.backfill_db_name(
+                db_name,
+                start,
+                end,
+                save,
+                chunk_length=backfill.get("chunk_length", 600.0),
+                max_values_per_node=backfill.get("max_values_per_node", 1000),
+                min_request_interval=backfill.get("min_request_interval", 0.5),
+                semaphore=semaphore,
+                bad_quality=data_block.get("bad_quality", "flag"),
+            )
+            print(f"Backfilled {samples} samples of {table}")
+            return samples
+        except Exception as err:
+            print(f"Error backfilling {table}: {err}")
+            return 0
@@ -0,0 +1,474 @@
+"""ShardedRunner class to spread the collector over several worker processes"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from my_collector.my_collector import Collector, validate_config
+from my_metrics.metrics import metrics
+from my_mysql.async_writer import AsyncMySQLWriter
+from my_mysql.infile_mysql import InfileMySQL
+from my_mysql.my_mysql import MySQL
+from my_processing.aggregator import RollupAggregator
+from my_processing.change_filter import ChangeFilter
+from my_processing.columnar_buffer import ColumnarBatch
+
+# Number of rows a worker groups in one message to a writer process
+IPC_BATCH_SIZE = 200
+# Maximum time in seconds a row waits in a worker before being sent to a writer process
+IPC_MAX_LATENCY = 0.2
+# Maximum number of messages waiting in the queue of a writer process
+WRITER_QUEUE_SIZE = 10000
+# Maximum number of rows a worker keeps while the queue of their writer process is full
+MAX_PENDING_ROWS = 10000
+# Time in seconds between two checks of the stop event of a worker or writer process
+STOP_CHECK_INTERVAL = 0.2
+# Time in seconds a worker process gets to send its pending rows and stop
+STOP_TIMEOUT = 10.0
+
+
+def assign_endpoints(endpoints: list, worker_ids: list) -> dict:
+    """
+    Assign every endpoint to a worker with rendezvous (highest random weight) hashing.
+
+    The assignment only depends on the endpoint URLs and the worker ids, so it is stable between runs,
+    and when a worker is removed only its own endpoints move to other workers.
+
+    Args:
+        endpoints (list): The endpoint configurations (dictionaries with an "url").
+        worker_ids (list): The ids of the available workers.
+
+    Returns:
+        dict: A dictionary mapping every worker id to its list of endpoints.
+
+    Example:
+        assign_endpoints([{"url": "opc.tcp://plc1:4840"}, {"url": "opc.tcp://plc2:4840"}], [0, 1])
+        # Output:
+        # {0: [{"url": "opc.tcp://plc2:4840"}], 1: [{"url": "opc.tcp://plc1:4840"}]}
+    """
+    assignment = {worker_id: [] for worker_id in worker_ids}
+    for endpoint in endpoints:
+        worker_id = max(
+            worker_ids,
+            key=lambda worker: hashlib.sha1(
+                f"{worker}:{endpoint['url']}".encode()
+            ).digest(),
+        )
+        assignment[worker_id].append(endpoint)
+    return assignment
+
+
+def get_writer_index(table: str, writers: int) -> int:
+    """
+    Get the writer process of a table. All the rows of a table go to the same writer, in order.
+
+    Args:
+        table (str): The name of the table.
+        writers (int): The number of writer processes.
+
+    Returns:
+        int: The index of the writer process.
+    """
+    return int.from_bytes(hashlib.sha1(table.encode()).digest()[:4], "big") % writers
+
+
+class QueueSink:
+    """
+    A collector sink that sends the rows to the writer processes through multiprocessing queues.
+
+    Rows are grouped in batches of IPC_BATCH_SIZE rows (or IPC_MAX_LATENCY seconds), so the
+    pickling and queue overhead is paid per batch and not per row. The batches are sent without
+    blocking the event loop: while the queue of a writer process is full its rows wait in the
+    worker, and beyond MAX_PENDING_ROWS the oldest ones are dropped (counted in rows_dropped and
+    the "queue_sink_rows_dropped_total" metric). The other messages are sent from a thread.
+
+    Args:
+        writer_queues (list): The input queues of the writer processes.
+        mysql_config (dict): The "mysql" section of the configuration, used to read the last stored
+            timestamps for the gap backfill.
+    """
+
+    def __init__(self, writer_queues: list, mysql_config: dict = None) -> None:
+        """
+        Initialize a new instance of QueueSink.
+
+        Args:
+            writer_queues (list): The input queues of the writer processes.
+            mysql_config (dict): The "mysql" section of the configuration.
+        """
+        self.writer_queues = writer_queues
+        self.mysql_config = mysql_config or {}
+        self.rows_dropped = 0
+        self._batches = [[] for _ in writer_queues]
+        self._flusher = None
+
+    async def create_table(self, db_name: str, variables: dict) -> bool:
+        """
+        Ask the writer process of the table to create it.
+        """
+        await self._send_message(db_name, ("create", db_name, variables))
+        return True
+
+    async def save_array_metadata(self, db_name: str, arrays: dict) -> bool:
+        """
+        Ask the writer process of the table to record the metadata of its packed arrays.
+        """
+        await self._send_message(db_name, ("arrays", db_name, arrays))
+        return True
+
+    async def put(
+        self, db_name: str, variables: dict, created, source_timestamps: dict = None
+    ) -> bool:
+        """
+        Add a row to the batch of its writer process.
+        """
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+        index = get_writer_index(db_name, len(self.writer_queues))
+        if self.mysql_config.get("schema", "wide") != "long":
+            source_timestamps = None  # only used by the long schema
+        self._batches[index].append((db_name, variables, created, source_timestamps))
+        if len(self._batches[index]) >= IPC_BATCH_SIZE:
+            self._send(index)
+        return True
+
+    async def put_batch(self, db_name: str, batch) -> bool:
+        """
+        Add a columnar batch (see AsyncMySQLWriter.put_batch) to the batch of its writer process.
+        """
+        return await self.put(db_name, batch, None)
+
+    async def put_history(self, db_name: str, rows: list) -> bool:
+        """
+        Send rows rebuilt from the history of the server to the writer process of the table.
+        """
+        for start in range(0, len(rows), IPC_BATCH_SIZE):
+            await self._send_message(
+                db_name, ("history", db_name, rows[start : start + IPC_BATCH_SIZE])
+            )
+        return True
+
+    async def get_last_timestamp(self, db_name: str):
+        """
+        Get the time of the newest row of a table with a short-lived MySQL connection of the worker.
+        """
+
+        def read():
+            my_mysql = _connect_mysql(self.mysql_config)
+            try:
+                return my_mysql.get_last_timestamp(
+                    db_name, self.mysql_config.get("schema", "wide") == "long"
+                )
+            finally:
+                my_mysql.close()
+
+        return await asyncio.to_thread(read)
+
+    async def close(self) -> None:
+        """
+        Stop the periodic sending and send all the pending rows, waiting for room in the queues.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        for index, batch in enumerate(self._batches):
+            for start in range(0, len(batch), IPC_BATCH_SIZE):
+                await asyncio.to_thread(
+                    self.writer_queues[index].put,
+                    ("rows", batch[start : start + IPC_BATCH_SIZE]),
+                )
+            self._batches[index] = []
+
+    async def _send_message(self, db_name: str, message: tuple) -> None:
+        # a blocking put in a thread: the event loop keeps running while the queue is full
+        index = get_writer_index(db_name, len(self.writer_queues))
+        await asyncio.to_thread(self.writer_queues[index].put, message)
+
+    def _send(self, index: int) -> None:
+        batch = self._batches[index]
+        if not batch:
+            return
+        try:
+            self.writer_queues[index].put_nowait(("rows", batch))
+        except queue.Full:
+            # backpressure: keep the rows for the next try, up to MAX_PENDING_ROWS
+            if len(batch) > MAX_PENDING_ROWS:
+                dropped = len(batch) - MAX_PENDING_ROWS
+                del batch[:dropped]
+                self.rows_dropped += dropped
+                metrics.inc("queue_sink_rows_dropped_total", dropped)
+            return
+        self._batches[index] = []
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(IPC_MAX_LATENCY)
+            for index in range(len(self._batches)):
+                self._send(index)
+
+
+def _connect_mysql(mysql_config: dict, engine: str = "insert") -> MySQL:
+    arguments = {
+        "host_name": mysql_config.get("host_name", "localhost"),
+        "user_name": os.getenv("MYSQL_USER"),
+        "user_password": os.getenv("MYSQL_PASSWORD"),
+        "database_name": os.getenv("MYSQL_DATABASE"),
+        "batch_size": mysql_config.get("batch_size", 500),
+        "max_latency": mysql_config.get("max_latency", 1.0),
+    }
+    if engine != "infile":
+        return MySQL(**arguments)
+    return InfileMySQL(
+        **arguments,
+        spool_dir=mysql_config.get("spool_dir", "mysql_segments"),
+        max_segment_bytes=mysql_config.get("max_segment_bytes", 64 * 1024 * 1024),
+    )
+
+
+def _worker_main(config: dict, endpoints: list, writer_queues: list, stop_event) -> None:
+    # Ctrl+C reaches the whole process group: the coordinator stops the workers with stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(dict(config, endpoints=endpoints), writer_queues, stop_event))
+
+
+async def _run_worker(config: dict, writer_queues: list, stop_event) -> None:
+    sink = QueueSink(writer_queues, config.get("mysql"))
+    collector = asyncio.create_task(Collector(config, sink).run())
+    while not collector.done() and not stop_event.is_set():
+        await asyncio.sleep(STOP_CHECK_INTERVAL)
+    collector.cancel()
+    try:
+        await collector
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await sink.close()
+
+
+def _writer_main(config: dict, input_queue, spool_path: str) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_writer(config, input_queue, spool_path))
+
+
+async def _run_writer(config: dict, input_queue, spool_path: str) -> None:
+    # the rows go through an AsyncMySQLWriter: reconnection, spool, quarantine, change filter and
+    # rollups work as with a single process (a table always goes to the same writer process)
+    mysql_config = config.get("mysql", {})
+    my_mysql = await asyncio.to_thread(
+        _connect_mysql, mysql_config, mysql_config.get("engine", "insert")
+    )
+    async with AsyncMySQLWriter(
+        my_mysql,
+        max_queue_size=mysql_config.get("max_queue_size", 10000),
+        overflow_policy=mysql_config.get("overflow_policy", "spill"),
+        spool_path=spool_path,
+        schema=mysql_config.get("schema", "wide"),
+        change_filter=ChangeFilter(**config["change_filter"])
+        if "change_filter" in config
+        else None,
+        aggregator=RollupAggregator(config["rollup_windows"])
+        if "rollup_windows" in config
+        else None,
+        partition_by=mysql_config.get("partition_by", ""),
+        future_partitions=mysql_config.get("future_partitions", 7),
+        retention_days=mysql_config.get("retention_days", 30),
+        maintenance_interval=mysql_config.get("maintenance_interval", 3600),
+    ) as writer:
+        while True:
+            try:
+                message = await asyncio.to_thread(input_queue.get, True, STOP_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            if message is None:
+                break
+            if message[0] == "create":
+                await writer.create_table(message[1], message[2])
+            elif message[0] == "arrays":
+                await writer.save_array_metadata(message[1], message[2])
+            elif message[0] == "history":
+                await writer.put_history(message[1], message[2])
+            else:
+                for db_name, variables, created, source_timestamps in message[1]:
+                    if isinstance(variables, ColumnarBatch):
+                        await writer.put_batch(db_name, variables)
+                    else:
+                        await writer.put(db_name, variables, created, source_timestamps)
+    await asyncio.to_thread(my_mysql.close)
+
+
+class ShardedRunner:
+    """
+    A coordinator that splits the collector configuration over several worker processes.
+
+    Each worker process runs its own Collector (and MyOPCUA sessions) for the endpoints assigned to it
+    by assign_endpoints. The rows flow, in batches, through multiprocessing queues to one or more writer
+    processes, each one with its own MySQL connection and AsyncMySQLWriter (reconnection, spool,
+    "change_filter" and "rollup_windows" of the configuration). A table always goes to the same writer
+    process. The coordinator restarts dead workers and writers; a worker that dies more than
+    "max_restarts" times is retired and its endpoints are rebalanced over the other workers.
+    The processes are stopped with messages (a stop event for the workers, which send their pending
+    rows, then None for the writers), never terminated while they use the queues, except a worker
+    that does not stop within STOP_TIMEOUT seconds.
+
+    Args:
+        config (dict): The collector configuration (see Collector), with an optional "mysql" section.
+        workers (int): The number of worker processes. Defaults to the number of CPU cores.
+        writers (int): The number of writer processes.
+        max_restarts (int): The number of restarts after which a worker is retired.
+
+    Example:
+        ShardedRunner(load_config("collector_config.json"), workers=8, writers=2).run()
+    """
+
+    def __init__(
+        self, config: dict, workers: int = 0, writers: int = 1, max_restarts: int = 3
+    ) -> None:
+        """
+        Initialize a new instance of ShardedRunner.
+
+        Args:
+            config (dict): The collector configuration.
+            workers (int): The number of worker processes. Defaults to the number of CPU cores.
+            writers (int): The number of writer processes.
+            max_restarts (int): The number of restarts after which a worker is retired.
+
+        Raises:
+            ValueError: If the configuration combines unsupported options (see validate_config).
+        """
+        validate_config(config)
+        self.config = config
+        self.worker_ids = list(range(workers or os.cpu_count() or 1))
+        self.max_restarts = max_restarts
+        self.context = multiprocessing.get_context("spawn")
+        self.writer_queues = [self.context.Queue(maxsize=WRITER_QUEUE_SIZE) for _ in range(writers)]
+        self.writers = []
+        self.workers = {}  # worker id -> Process
+        self.stop_events = {}  # worker id -> Event stopping the worker
+        self.restarts = {worker_id: 0 for worker_id in self.worker_ids}
+        self.assignment = {}
+
+    def run(self, check_interval: float = 1.0) -> None:
+        """
+        Start the writer and worker processes and supervise them until interrupted (Ctrl+C).
+
+        Args:
+            check_interval (float): The time in seconds between two checks of the workers.
+        """
+        self.writers = [self._start_writer(index) for index in range(len(self.writer_queues))]
+        self._rebalance()
+        try:
+            while True:
+                time.sleep(check_interval)
+                self._check_writers()
+                self._check_workers()
+        except KeyboardInterrupt:
+            print("Stopping the collector")
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """
+        Stop the worker processes, then let the writer processes flush their rows and stop.
+        """
+        for worker_id in list(self.workers):
+            self.stop_events[worker_id].set()
+        for worker_id in list(self.workers):
+            self._stop_worker(worker_id)
+        for input_queue in self.writer_queues:
+            input_queue.put(None)
+        for writer in self.writers:
+            writer.join()
+        self.writers = []
+
+    def _start_writer(self, index: int):
+        mysql_config = self.config.get("mysql", {})
+        # every writer process has its own LOAD DATA segments and spool
+        spool_dir = os.path.join(mysql_config.get("spool_dir", "mysql_segments"), f"writer_{index}")
+        spool_base, spool_extension = os.path.splitext(
+            mysql_config.get("spool_path", "mysql_spool.sqlite3")
+        )
+        config = dict(self.config, mysql=dict(mysql_config, spool_dir=spool_dir))
+        writer = self.context.Process(
+            target=_writer_main,
+            args=(config, self.writer_queues[index], f"{spool_base}_{index}{spool_extension}"),
+            daemon=True,
+        )
+        writer.start()
+        return writer
+
+    def _start_worker(self, worker_id: int) -> None:
+        self.stop_events[worker_id] = self.context.Event()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(
+                self.config,
+                self.assignment[worker_id],
+                self.writer_queues,
+                self.stop_events[worker_id],
+            ),
+            daemon=True,
+        )
+        process.start()
+        self.workers[worker_id] = process
+
+    def _stop_worker(self, worker_id: int) -> None:
+        process = self.workers.pop(worker_id)
+        self.stop_events[worker_id].set()
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            print(f"Worker {worker_id} did not stop, terminating it")
+            process.terminate()
+            process.join()
+
+    def _rebalance(self) -> None:
+        new_assignment = assign_endpoints(self.config["endpoints"], self.worker_ids)
+        for worker_id, endpoints in new_assignment.items():
+            if endpoints == self.assignment.get(worker_id) and worker_id in self.workers:
+                continue
+            if worker_id in self.workers:
+                self._stop_worker(worker_id)
+            self.assignment[worker_id] = endpoints
+            if endpoints:
+                self._start_worker(worker_id)
+        print(
+            "Endpoints per worker: "
+            f"{ {worker_id: len(endpoints) for worker_id, endpoints in new_assignment.items()} }"
+        )
+
+    def _check_writers(self) -> None:
+        restarted = False
+        for index, writer in enumerate(self.writers):
+            if writer.is_alive():
+                continue
+            print(f"Writer {index} died (exit code {writer.exitcode}), restarting")
+            # a killed writer can hold the lock of its queue: the new writer gets a new queue
+            self.writer_queues[index] = self.context.Queue(maxsize=WRITER_QUEUE_SIZE)
+            self.writers[index] = self._start_writer(index)
+            restarted = True
+        if restarted:
+            # the workers are restarted to send their rows to the new queue
+            for worker_id in list(self.workers):
+                self.stop_events[worker_id].set()
+            for worker_id in list(self.workers):
+                self._stop_worker(worker_id)
+                self._start_worker(worker_id)
+
+    def _check_workers(self) -> None:
+        retired = False
+        for worker_id, process in list(self.workers.items()):
+            if process.is_alive():
+                continue
+            self.restarts[worker_id] += 1
+            if self.restarts[worker_id] > self.max_restarts and len(self.worker_ids) > 1:
+                print(f"Worker {worker_id} retired, rebalancing its endpoints")
+                del self.workers[worker_id]
+                self.worker_ids.remove(worker_id)
+                self.assignment.pop(worker_id, None)
+                retired = True
+            else:
+                print(f"Worker {worker_id} died (exit code {process.exitcode}), restarting")
+                self._start_worker(worker_id)
+        if retired:
+            self._rebalance()
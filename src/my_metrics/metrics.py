@@ -0,0 +1,268 @@
+"""Metrics class to collect counters, gauges and latency histograms of the acquisition and storage stages"""
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+# Help texts of the metrics exported by the project
+DESCRIPTIONS = {
+    "opcua_browse_seconds": "Duration of the Browse (and BrowseNext) requests of a discovery",
+    "opcua_read_seconds": "Duration of the Read requests of a batched read",
+    "opcua_read_nodes_total": "Number of nodes read",
+    "opcua_transform_seconds": "Duration of the conversion of DataValues into a sample",
+    "opcua_history_read_seconds": "Duration of the HistoryRead requests of a backfill chunk",
+    "opcua_reconnects_total": "Number of automatic reconnections",
+    "opcua_downtime_seconds": "Duration of the session outages",
+    "opcua_connected": "1 if the session is connected, 0 otherwise",
+    "collector_cycle_seconds": "Duration of an acquisition cycle of a data block",
+    "collector_samples_total": "Number of samples acquired",
+    "collector_errors_total": "Number of failed acquisition cycles",
+    "mysql_insert_seconds": "Duration of the INSERT statements of a flush",
+    "mysql_commit_seconds": "Duration of the COMMIT of a flush",
+    "mysql_rows_written_total": "Number of rows written",
+    "mysql_flush_errors_total": "Number of failed flushes",
+    "writer_queue_depth": "Number of items waiting in the queue of the MySQL writer",
+    "writer_rows_spilled_total": "Number of rows written to the local spool",
+    "writer_rows_dropped_total": "Number of rows dropped by the drop_oldest policy",
+    "queue_sink_rows_dropped_total": "Number of rows dropped while a writer process queue was full",
+}
+
+
+class _Histogram:
+    """
+    Cumulative bucket counts, sum and count of the observations of one metric and label set.
+    """
+
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Timer:
+    """
+    A context manager observing its duration in a histogram.
+    """
+
+    def __init__(self, metrics, name: str, labels: dict) -> None:
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class Metrics:
+    """
+    A registry of counters, gauges and latency histograms, rendered in the Prometheus text format.
+
+    It is disabled by default: every call then returns at once (a timer is a shared no-op context
+    manager), so the instrumentation of the hot paths costs almost nothing. Gauges that are expensive or
+    owned by another object, like queue depths, are registered as callbacks and only evaluated when the
+    metrics are rendered. All the methods are thread safe (the MySQL writer runs in its own thread).
+
+    Args:
+        enabled (bool): True to collect the metrics.
+
+    Example:
+        from my_metrics.metrics import metrics
+
+        metrics.enable()
+        with metrics.timer("opcua_read_seconds", endpoint="opc.tcp://plc1:4840"):
+            data_values = await my_opcua.read_attributes(nodes)
+        metrics.inc("opcua_read_nodes_total", len(nodes), endpoint="opc.tcp://plc1:4840")
+        print(metrics.render())
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Initialize a new instance of Metrics.
+
+        Args:
+            enabled (bool): True to collect the metrics.
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._types = {}  # name -> "counter", "gauge" or "histogram"
+        self._values = {}  # (name, labels) -> value or _Histogram
+        self._callbacks = {}  # (name, labels) -> function returning the value
+        self._null_timer = nullcontext()
+
+    def enable(self) -> None:
+        """
+        Start collecting the metrics.
+        """
+        self.enabled = True
+
+    def disable(self) -> None:
+        """
+        Stop collecting the metrics. The values collected so far are kept.
+        """
+        self.enabled = False
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name (str): The name of the counter, ending with "_total".
+            value (float): The increment.
+            **labels: The labels of the counter, e.g. endpoint="opc.tcp://plc1:4840".
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._types[name] = "counter"
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """
+        Set a gauge.
+
+        Args:
+            name (str): The name of the gauge.
+            value (float): The new value.
+            **labels: The labels of the gauge.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._types[name] = "gauge"
+            self._values[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """
+        Add an observation (e.g. a duration in seconds) to a histogram with LATENCY_BUCKETS.
+
+        Args:
+            name (str): The name of the histogram, ending with the unit, e.g. "_seconds".
+            value (float): The observed value.
+            **labels: The labels of the histogram.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._types[name] = "histogram"
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = _Histogram(LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """
+        Get a context manager that observes the duration of its block in a histogram.
+
+        Args:
+            name (str): The name of the histogram, ending with "_seconds".
+            **labels: The labels of the histogram.
+
+        Returns:
+            A context manager (a shared no-op one when the metrics are disabled).
+        """
+        if not self.enabled:
+            return self._null_timer
+        return _Timer(self, name, labels)
+
+    def register_callback(
+        self, name: str, function, metric_type: str = "gauge", **labels
+    ) -> None:
+        """
+        Register a function evaluated when the metrics are rendered, e.g. to export a queue depth.
+
+        Args:
+            name (str): The name of the metric.
+            function: A function without arguments returning the value.
+            metric_type (str): "gauge" or "counter".
+            **labels: The labels of the metric.
+        """
+        with self._lock:
+            self._types[name] = metric_type
+            self._callbacks[(name, tuple(sorted(labels.items())))] = function
+
+    def get_snapshot(self) -> dict:
+        """
+        Get the current values of all the metrics (pull API).
+
+        Returns:
+            dict: A dictionary mapping (name, labels) tuples to values; histograms are dictionaries
+            with "buckets" (upper bound -> cumulative count), "sum" and "count".
+        """
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        snapshot = {}
+        for key, value in values.items():
+            if isinstance(value, _Histogram):
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                    cumulative += count
+                    buckets[bound] = cumulative
+                value = {"buckets": buckets, "sum": value.sum, "count": value.count}
+            snapshot[key] = value
+        for key, function in callbacks.items():
+            try:
+                snapshot[key] = function()
+            except Exception as err:
+                print(f"Error reading metric {key[0]}: {err}")
+        return snapshot
+
+    def render(self) -> str:
+        """
+        Render all the metrics in the Prometheus text exposition format (version 0.0.4).
+
+        Returns:
+            str: The metrics, one sample per line.
+        """
+        lines = []
+        described = set()
+        for (name, labels), value in sorted(
+            self.get_snapshot().items(), key=lambda item: item[0]
+        ):
+            if name not in described:
+                described.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {name} {self._types.get(name, 'untyped')}")
+            if not isinstance(value, dict):
+                lines.append(f"{name}{self._format_labels(labels)} {float(value)}")
+                continue
+            for bound, count in value["buckets"].items():
+                bucket_labels = labels + (("le", "+Inf" if bound == float("inf") else bound),)
+                lines.append(f"{name}_bucket{self._format_labels(bucket_labels)} {count}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for name, value in labels
+        )
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+# The registry shared by all the modules of the process, disabled until enable() is called
+metrics = Metrics()
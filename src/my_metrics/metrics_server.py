@@ -0,0 +1,98 @@
+"""MetricsServer class to expose the metrics over HTTP in the Prometheus text format"""
+import asyncio
+from my_metrics.metrics import Metrics, metrics
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """
+    A minimal HTTP server on the event loop answering "GET /metrics" with Metrics.render().
+
+    Every scrape renders the registry once; nothing is formatted or printed between scrapes, so the
+    acquisition only pays for updating the counters and histograms. Any other path gets a 404.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The TCP port to listen on.
+        registry (Metrics): The metrics to expose. Defaults to the shared registry.
+
+    Example:
+        metrics.enable()
+        async with MetricsServer("0.0.0.0", 9108):
+            await collector.run()
+        # curl http://localhost:9108/metrics
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9108, registry: Metrics = None) -> None:
+        """
+        Initialize a new instance of MetricsServer.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The TCP port to listen on.
+            registry (Metrics): The metrics to expose. Defaults to the shared registry.
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry if registry is not None else metrics
+        self.server = None
+
+    async def __aenter__(self):
+        """
+        Start the server when entering an asynchronous context.
+
+        Returns:
+            self: The instance of the object.
+        """
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Stop the server when exiting an asynchronous context.
+        """
+        await self.stop()
+
+    async def start(self) -> None:
+        """
+        Start listening for scrapes.
+        """
+        if self.server is None:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self) -> None:
+        """
+        Stop listening and close the server.
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass  # the headers are not needed
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] in ("GET", "HEAD") and parts[1].split("?")[0] == "/metrics":
+                status = "200 OK"
+                body = self.registry.render().encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+            )
+            if parts and parts[0] != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except Exception as err:
+            print(f"Error serving the metrics: {err}")
+        finally:
+            writer.close()
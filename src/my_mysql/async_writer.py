@@ -0,0 +1,673 @@
+"""AsyncMySQLWriter class to run the MySQL writes in a dedicated thread, fed by a bounded asyncio queue"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from my_metrics.metrics import metrics
+from my_mysql.my_mysql import MySQL, group_by_timestamp, is_row_error, utc_now
+from my_mysql.spool import SQLiteSpool
+from my_processing.columnar_buffer import ColumnarBatch
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "spill")
+SCHEMAS = ("wide", "long")
+PARTITIONINGS = ("", "day", "week")
+ROLLUP_KEY = "__rollup__"
+
+
+class AsyncMySQLWriter:
+    """
+    A sink that takes rows from the asyncio event loop and writes them to MySQL in a dedicated thread.
+
+    mysql.connector calls are blocking, so they never run on the event loop: rows are put in a
+    bounded asyncio queue and a consumer task hands them, in batches, to a single writer thread
+    (a MySQL connection must not be used by two threads at the same time). The writer thread adds
+    them to the write buffer of MySQL, committed by MySQL.flush_if_due once "batch_size" rows are
+    buffered or the oldest one waited "max_latency" seconds, even when no other row arrives. When the queue is full,
+    the overflow policy decides what happens:
+        - "block": put() waits until there is room in the queue (backpressure on the acquisition).
+        - "drop_oldest": the oldest queued row is discarded to make room for the new one.
+        - "spill": the row is appended to the local SQLite spool.
+
+    When MySQL is unreachable or a write fails with a transient error (a read-only server during a
+    failover, a deadlock, a lock wait timeout, ...), the rows that were not written are appended to
+    the local SQLite spool and all the following rows go to the spool until MySQL is reachable again.
+    Only a write failing because of the rows themselves (see is_row_error: e.g. an unknown column or
+    data too long) is split until the failing rows are isolated; they are moved to the quarantine
+    table of the spool file and the other rows are written, so a bad row never blocks the ingestion. A background task reconnects
+    and replays the spool in ordered batches of "drain_batch_size" rows, at most one batch every
+    "drain_interval" seconds and only while the live queue is less than half full, so the catch-up
+    does not starve the live ingestion.
+
+    With schema="wide" each row goes to the table with one column per variable (MySQL.create_table).
+    With schema="long" only the changed variables of each row are stored, as samples of the
+    tag dictionary/samples tables (MySQL.create_long_schema).
+
+    An optional ChangeFilter (report-by-exception with deadbands and heartbeat) decides which tags are
+    stored: with the long schema only the tags it lets through are written, with the wide schema a row
+    is only written when at least one of its tags passes the filter.
+
+    An optional RollupAggregator receives every row (before the change filter) and its completed
+    windows are written to the rollup tables created next to the raw tables. A window is queued as
+    one item (see rollup_item), so it is batched, spooled and replayed like the rows.
+
+    With partition_by="day" or "week" the wide tables are created partitioned by their created column
+    and a maintenance task (see start_partition_maintenance) is started for each of them, pre-creating
+    "future_partitions" partitions and dropping the ones older than "retention_days" days every
+    "maintenance_interval" seconds.
+
+    Args:
+        my_mysql (MySQL): The MySQL instance used by the writer thread.
+        max_queue_size (int): The maximum number of rows waiting in the queue.
+        overflow_policy (str): "block", "drop_oldest" or "spill".
+        spool_path (str): The SQLite file used as spool.
+        drain_batch_size (int): The number of spooled rows replayed per batch.
+        drain_interval (float): The pause in seconds between two replayed batches.
+        schema (str): "wide" or "long".
+        change_filter (ChangeFilter): The filter applied to the rows before they are queued.
+        aggregator (RollupAggregator): The aggregation stage fed with every row.
+        partition_by (str): "" (no partitioning), "day" or "week", for the wide schema.
+        future_partitions (int): The number of partitions to keep ready after the current one.
+        retention_days (int): The number of days of data to keep in the partitioned tables.
+        maintenance_interval (float): The time in seconds between two partition maintenance runs.
+
+    Example:
+        async with AsyncMySQLWriter(my_mysql, max_queue_size=5000, overflow_policy="drop_oldest") as writer:
+            await writer.create_table("employees", variables)
+            await writer.put("employees", variables)
+    """
+
+    def __init__(
+        self,
+        my_mysql: MySQL,
+        max_queue_size: int = 10000,
+        overflow_policy: str = "block",
+        spool_path: str = "mysql_spool.sqlite3",
+        drain_batch_size: int = 5000,
+        drain_interval: float = 0.5,
+        schema: str = "wide",
+        change_filter=None,
+        aggregator=None,
+        partition_by: str = "",
+        future_partitions: int = 7,
+        retention_days: int = 30,
+        maintenance_interval: float = 3600,
+    ) -> None:
+        """
+        Initialize a new instance of AsyncMySQLWriter.
+
+        Args:
+            my_mysql (MySQL): The MySQL instance used by the writer thread.
+            max_queue_size (int): The maximum number of rows waiting in the queue.
+            overflow_policy (str): "block", "drop_oldest" or "spill".
+            spool_path (str): The SQLite file used as spool.
+            drain_batch_size (int): The number of spooled rows replayed per batch.
+            drain_interval (float): The pause in seconds between two replayed batches.
+            schema (str): "wide" or "long".
+            change_filter (ChangeFilter): The filter applied to the rows before they are queued.
+            aggregator (RollupAggregator): The aggregation stage fed with every row.
+            partition_by (str): "" (no partitioning), "day" or "week", for the wide schema.
+            future_partitions (int): The number of partitions to keep ready after the current one.
+            retention_days (int): The number of days of data to keep in the partitioned tables.
+            maintenance_interval (float): The time in seconds between two partition maintenance runs.
+        """
+        if schema not in SCHEMAS:
+            raise ValueError(f"schema must be one of {SCHEMAS}, not {schema!r}")
+        if partition_by not in PARTITIONINGS:
+            raise ValueError(
+                f"partition_by must be one of {PARTITIONINGS}, not {partition_by!r}"
+            )
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"overflow_policy must be one of {OVERFLOW_POLICIES}, not {overflow_policy!r}"
+            )
+        self.my_mysql = my_mysql
+        self.overflow_policy = overflow_policy
+        self.schema = schema
+        self.change_filter = change_filter
+        self.aggregator = aggregator
+        self.partition_by = partition_by
+        self.future_partitions = future_partitions
+        self.retention_days = retention_days
+        self.maintenance_interval = maintenance_interval
+        self.spool = SQLiteSpool(spool_path)
+        self.drain_batch_size = drain_batch_size
+        self.drain_interval = drain_interval
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="mysql-writer"
+        )
+        self._consumer = None
+        self._drainer = None
+        self._maintenance_tasks = []
+        self._maintained_tables = set()
+        self.mysql_available = True
+        self.rows_dropped = 0
+        self.rows_spilled = 0
+        self.rows_replayed = 0
+        self.rows_quarantined = 0
+        self.last_write_latency = 0.0
+        self.max_write_latency = 0.0
+        self._total_write_latency = 0.0
+        self._writes = 0
+        self._buffered = []  # items in the write buffer of MySQL, not committed yet
+        self._buffered_since = None
+        self._write_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        """
+        Start the writer when entering an asynchronous context.
+
+        Returns:
+            self: The instance of the object.
+        """
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Write the pending rows and stop the writer when exiting an asynchronous context.
+        """
+        await self.close()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        int: The number of rows waiting in the queue.
+        """
+        return self.queue.qsize()
+
+    async def start(self) -> None:
+        """
+        Open the spool and start the consumer and spool drainer tasks.
+
+        The queue depth and the dropped and spilled rows are exported as metrics (evaluated when the
+        metrics are rendered, so they cost nothing in the write path).
+        """
+        if self._consumer is None:
+            await self.spool.open()
+            metrics.register_callback("writer_queue_depth", lambda: self.queue_depth)
+            metrics.register_callback(
+                "writer_rows_spilled_total", lambda: self.rows_spilled, "counter"
+            )
+            metrics.register_callback(
+                "writer_rows_dropped_total", lambda: self.rows_dropped, "counter"
+            )
+            self._consumer = asyncio.create_task(self._consume())
+            self._drainer = asyncio.create_task(self._drain_spool())
+
+    async def run_in_writer(self, function, *args):
+        """
+        Run a function in the writer thread and return its result.
+
+        Use it for any other call on the MySQL instance, so it is never used by two threads at once.
+
+        Args:
+            function: The function to call.
+            *args: The arguments of the function.
+
+        Returns:
+            The value returned by the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    async def create_table(
+        self, db_name: str, variables: dict, partition_by: str = None
+    ) -> bool:
+        """
+        Create the table (wide schema) or tables (long schema) in the writer thread.
+        See MySQL.create_table and MySQL.create_long_schema.
+
+        A partitioned table (partition_by, defaulting to the partition_by of the writer) gets its
+        partition maintenance task the first time it is created.
+        """
+        if partition_by is None:
+            partition_by = self.partition_by
+        if self.aggregator is not None:
+            for window_label in self.aggregator.windows:
+                if not await self.run_in_writer(
+                    self.my_mysql.create_rollup_table, db_name, window_label
+                ):
+                    return False
+        if self.schema == "long":
+            return await self.run_in_writer(self.my_mysql.create_long_schema, db_name)
+        if not await self.run_in_writer(
+            self.my_mysql.create_table, db_name, variables, partition_by
+        ):
+            return False
+        if partition_by and db_name not in self._maintained_tables:
+            self.start_partition_maintenance(
+                db_name,
+                partition_by,
+                self.future_partitions,
+                self.retention_days,
+                self.maintenance_interval,
+            )
+        return True
+
+    async def save_array_metadata(self, db_name: str, arrays: dict) -> bool:
+        """
+        Record the element type and dimensions of the packed arrays of a table in the writer thread.
+        See MySQL.save_array_metadata.
+        """
+        return await self.run_in_writer(
+            self.my_mysql.save_array_metadata, db_name, arrays
+        )
+
+    def start_partition_maintenance(
+        self,
+        db_name: str,
+        partition_by: str,
+        future_partitions: int = 7,
+        retention_days: int = 30,
+        interval: float = 3600,
+    ) -> None:
+        """
+        Start a background task running MySQL.maintain_partitions every "interval" seconds.
+
+        The maintenance runs in the writer thread, so it never uses the connection at the same time as the writes.
+
+        Args:
+            db_name (str): The name of the partitioned table.
+            partition_by (str): "day" or "week", as used in create_table.
+            future_partitions (int): The number of partitions to keep ready after the current one.
+            retention_days (int): The number of days of data to keep.
+            interval (float): The time in seconds between two maintenance runs.
+
+        Example:
+            await writer.create_table("employees", variables, partition_by="day")
+            writer.start_partition_maintenance("employees", "day", retention_days=90)
+        """
+
+        async def maintenance() -> None:
+            while True:
+                await self.run_in_writer(
+                    self.my_mysql.maintain_partitions,
+                    db_name,
+                    partition_by,
+                    future_partitions,
+                    retention_days,
+                )
+                await asyncio.sleep(interval)
+
+        self._maintained_tables.add(db_name)
+        self._maintenance_tasks.append(asyncio.create_task(maintenance()))
+
+    async def put(
+        self,
+        db_name: str,
+        variables: dict,
+        created: datetime = None,
+        source_timestamps: dict = None,
+    ) -> bool:
+        """
+        Queue a row to be written, applying the overflow policy if the queue is full.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+            created (datetime): The time of the row (naive UTC). Defaults to the current time.
+            source_timestamps (dict): The source timestamps of the variables (naive UTC). With the long
+                schema every sample is stored with the source timestamp of its variable, or created.
+
+        Returns:
+            bool: True once the row is queued or spilled (or skipped because nothing changed).
+        """
+        created = created if created is not None else utc_now()
+        if self.aggregator is not None:
+            for window in self.aggregator.add(db_name, variables, created):
+                await self._enqueue(self.rollup_item(db_name, *window))
+        if self.change_filter is not None:
+            changed = self.change_filter.filter(variables, created, db_name)
+            if not changed:
+                return True
+            if self.schema == "long":
+                variables = changed
+        elif self.schema == "long":
+            variables = self.my_mysql.filter_changed_tags(db_name, variables)
+            if not variables:
+                return True
+        if self.schema == "long":
+            for group, timestamp in group_by_timestamp(variables, created, source_timestamps):
+                await self._enqueue((db_name, group, timestamp))
+            return True
+        item = (db_name, variables, created)
+        return await self._enqueue(item)
+
+    @staticmethod
+    def rollup_item(
+        db_name: str, window_label: str, window_start: datetime, rollups: dict
+    ) -> tuple:
+        """
+        Build the queue item of a completed rollup window (see RollupAggregator).
+
+        The item has the (db_name, variables, created) layout of a row, with the window under the
+        ROLLUP_KEY variable, so it goes through the queue, the spool and the quarantine unchanged.
+
+        Args:
+            db_name (str): The name of the raw table.
+            window_label (str): The label of the window, e.g. "1m" or "1h".
+            window_start (datetime): The start of the window.
+            rollups (dict): A dictionary mapping tag names to (min, max, mean, last, count) tuples.
+
+        Returns:
+            tuple: The (db_name, variables, created) item.
+        """
+        return (db_name, {ROLLUP_KEY: [window_label, rollups]}, window_start)
+
+    async def put_history(self, db_name: str, rows: list) -> bool:
+        """
+        Queue rows rebuilt from the history of the server (see MyOPCUA.backfill_db_name).
+
+        The rows are older than the live ones, so they bypass the aggregator and the change filters,
+        whose state follows the live rows, and go straight to the bulk insert path.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            rows (list): A list of (variables, created) tuples.
+
+        Returns:
+            bool: True once all the rows are queued or spilled.
+        """
+        for variables, created in rows:
+            await self._enqueue((db_name, variables, created))
+        return True
+
+    async def get_last_timestamp(self, db_name: str):
+        """
+        Get the time of the newest row of a table, stored in MySQL or waiting in the spool.
+        See MySQL.get_last_timestamp.
+        """
+        timestamps = [
+            await self.run_in_writer(
+                self.my_mysql.get_last_timestamp, db_name, self.schema == "long"
+            ),
+            await self.spool.get_last_created(db_name),
+        ]
+        timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+        return max(timestamps) if timestamps else None
+
+    async def put_batch(self, db_name: str, batch) -> bool:
+        """
+        Queue all the rows of a columnar batch (see ColumnarRingBuffer.drain) as one item.
+
+        Without change filter and aggregator, the batch goes to the wide table as is, without a
+        dictionary per row. Otherwise, and with the long schema, every row goes through put, so the
+        filter and the aggregator see it like a polled sample.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            batch (ColumnarBatch): The rows to write.
+
+        Returns:
+            bool: True once the batch is queued or spilled.
+        """
+        if not len(batch):
+            return True
+        if self.change_filter is not None or self.aggregator is not None or self.schema == "long":
+            for variables, created in batch.to_dicts():
+                await self.put(db_name, variables, created)
+            return True
+        item = (db_name, batch, None)
+        return await self._enqueue(item)
+
+    async def get_stats(self) -> dict:
+        """
+        Get the statistics of the writer.
+
+        Returns:
+            dict: Queue depth, dropped, spilled, replayed and spooled rows, write latencies (in seconds)
+            and the statistics of the MySQL buffered writer.
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "mysql_available": self.mysql_available,
+            "rows_dropped": self.rows_dropped,
+            "rows_spilled": self.rows_spilled,
+            "rows_replayed": self.rows_replayed,
+            "rows_quarantined": self.rows_quarantined,
+            "rows_spooled": await self.spool.count(),
+            "last_write_latency": self.last_write_latency,
+            "max_write_latency": self.max_write_latency,
+            "avg_write_latency": self._total_write_latency / self._writes
+            if self._writes
+            else 0.0,
+            **self.my_mysql.get_writer_stats(),
+        }
+
+    async def close(self) -> None:
+        """
+        Wait until all the queued rows are written or spooled, then stop the tasks and the writer thread.
+
+        Rows still in the spool stay there and are replayed on the next start.
+        """
+        for task in self._maintenance_tasks:
+            task.cancel()
+        self._maintenance_tasks = []
+        self._maintained_tables.clear()
+        if self.aggregator is not None:
+            for window in self.aggregator.flush():
+                await self._enqueue(self.rollup_item(*window))
+        if self._consumer is not None:
+            await self.queue.join()
+            async with self._write_lock:
+                self._consumer.cancel()
+                self._drainer.cancel()
+                await self._commit(force=True)
+            self._consumer = None
+            self._drainer = None
+            await self.spool.close()
+        self._executor.shutdown(wait=True)
+
+    async def _enqueue(self, item: tuple) -> bool:
+        if self.overflow_policy == "block":
+            await self.queue.put(item)
+            return True
+        if not self.queue.full():
+            self.queue.put_nowait(item)
+            return True
+        if self.overflow_policy == "drop_oldest":
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.rows_dropped += 1
+            self.queue.put_nowait(item)
+            return True
+        await self._spill([item])
+        return True
+
+    async def _consume(self) -> None:
+        while True:
+            timeout = None
+            if self._buffered:
+                # wake up to commit the buffered rows when the oldest one reaches max_latency
+                timeout = max(
+                    self._buffered_since + self.my_mysql.max_latency - time.monotonic(), 0.0
+                )
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                async with self._write_lock:
+                    await self._commit(force=True)
+                continue
+            items = [item]
+            while not self.queue.empty() and len(items) < self.my_mysql.batch_size:
+                items.append(self.queue.get_nowait())
+            try:
+                async with self._write_lock:
+                    if self.mysql_available:
+                        await self._buffer(items)
+                    else:
+                        await self._spill(items)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    async def _buffer(self, items: list) -> None:
+        # Adds the items to the write buffer of MySQL and commits it if it is due.
+        rejected = []
+        buffered, failed = await self.run_in_writer(self._add_items, items, rejected)
+        if buffered:
+            if not self._buffered:
+                self._buffered_since = time.monotonic()
+            self._buffered.extend(buffered)
+        if rejected:
+            await self._quarantine(rejected)
+        if failed:
+            await self._spill(failed)
+        await self._commit(force=bool(failed))
+
+    async def _commit(self, force: bool = False) -> None:
+        # Commits the buffered items (only if the buffer is due unless forced); the items that could
+        # not be written are spooled.
+        if not self._buffered:
+            return
+        items = self._buffered
+        start = time.perf_counter()
+        rejected = []
+        written = await self.run_in_writer(self._commit_rows, items, rejected, force)
+        if written is None:
+            return  # not due yet
+        self._buffered = []
+        self._buffered_since = None
+        self._record_latency(start)
+        if rejected:
+            await self._quarantine(rejected)
+        if written < len(items):
+            self.mysql_available = False
+            await self._spill(items[written:])
+
+    async def _write(self, items: list) -> int:
+        # Returns the number of leading items written or quarantined; the others were not written
+        # because MySQL is unreachable or failed with a transient error.
+        start = time.perf_counter()
+        rejected = []
+        written = await self.run_in_writer(self._write_rows, items, rejected)
+        self._record_latency(start)
+        if rejected:
+            await self._quarantine(rejected)
+        if written < len(items):
+            self.mysql_available = False
+        return written
+
+    def _record_latency(self, start: float) -> None:
+        self.last_write_latency = time.perf_counter() - start
+        self.max_write_latency = max(self.max_write_latency, self.last_write_latency)
+        self._total_write_latency += self.last_write_latency
+        self._writes += 1
+
+    def _add_items(self, items: list, rejected: list) -> tuple:
+        # Returns the items added to the write buffer and the ones that failed with a transient error.
+        buffered = []
+        failed = []
+        for item in items:
+            try:
+                self._add_item(*item)
+            except Exception as err:
+                print(f"Database error: {err}")
+                if is_row_error(err):
+                    rejected.append((item, err))
+                else:
+                    failed.append(item)
+            else:
+                buffered.append(item)
+        return buffered, failed
+
+    def _commit_rows(self, items: list, rejected: list, force: bool):
+        # Returns None if the buffer is not due yet, otherwise the number of leading items written or
+        # quarantined (see _write).
+        if self.my_mysql.flush() if force else self.my_mysql.flush_if_due():
+            if self.my_mysql.get_writer_stats()["buffered_rows"]:
+                return None
+            return len(items)
+        error = self.my_mysql.last_error
+        self.my_mysql.clear_buffer()
+        if not is_row_error(error):
+            return 0  # retried from the spool
+        return self._write_rows(items, rejected)
+
+    def _write_rows(self, items: list, rejected: list) -> int:
+        error = self._write_items(items)
+        if error is None:
+            return len(items)
+        if not is_row_error(error):
+            return 0  # retried from the spool
+        if len(items) == 1:
+            rejected.append((items[0], error))
+            return 1
+        # permanent error: split the batch to isolate the failing rows
+        middle = len(items) // 2
+        written = self._write_rows(items[:middle], rejected)
+        if written < middle:
+            return written
+        return middle + self._write_rows(items[middle:], rejected)
+
+    def _add_item(self, db_name: str, variables, created: datetime) -> None:
+        if isinstance(variables, ColumnarBatch):
+            self.my_mysql.add_batch_to_buffer(db_name, variables)
+        elif ROLLUP_KEY in variables:
+            window_label, rollups = variables[ROLLUP_KEY]
+            self.my_mysql.add_rollups(db_name, window_label, created, rollups)
+        elif self.schema == "long":
+            self.my_mysql.add_long_samples(db_name, variables, created)
+        else:
+            self.my_mysql.add_to_buffer(db_name, variables, created)
+
+    def _write_items(self, items: list):
+        try:
+            for item in items:
+                self._add_item(*item)
+        except Exception as err:
+            print(f"Database error: {err}")
+            self.my_mysql.clear_buffer()
+            return err
+        if self.my_mysql.flush():
+            return None
+        self.my_mysql.clear_buffer()
+        return self.my_mysql.last_error
+
+    async def _spill(self, items: list) -> None:
+        rows = self._expand_items(items)
+        await self.spool.append(rows)
+        self.rows_spilled += len(rows)
+
+    async def _quarantine(self, rejected: list) -> None:
+        rows = []
+        for item, error in rejected:
+            print(f"Quarantined a row of {item[0]}: {error}")
+            rows.extend((*row, error) for row in self._expand_items([item]))
+        await self.spool.quarantine(rows)
+        self.rows_quarantined += len(rows)
+
+    @staticmethod
+    def _expand_items(items: list) -> list:
+        rows = []
+        for db_name, variables, created in items:
+            if isinstance(variables, ColumnarBatch):
+                rows.extend(
+                    (db_name, batch_variables, batch_created)
+                    for batch_variables, batch_created in variables.to_dicts()
+                )
+            else:
+                rows.append((db_name, variables, created))
+        return rows
+
+    async def _drain_spool(self) -> None:
+        while True:
+            await asyncio.sleep(self.drain_interval)
+            if not self.mysql_available:
+                self.mysql_available = await self.run_in_writer(self.my_mysql.reconnect)
+                continue
+            if self.queue_depth > self.queue.maxsize // 2:
+                continue  # the live rows have priority
+            batch = await self.spool.read_batch(self.drain_batch_size)
+            if not batch:
+                continue
+            async with self._write_lock:
+                # the replay flushes the write buffer: the live rows in it are committed first
+                await self._commit(force=True)
+                if not self.mysql_available:
+                    continue
+                written = await self._write([item for _, item in batch])
+                if written:
+                    await self.spool.delete_up_to(batch[written - 1][0])
+                    self.rows_replayed += written
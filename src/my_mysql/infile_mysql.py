@@ -0,0 +1,364 @@
+"""InfileMySQL class to write the buffered rows with LOAD DATA LOCAL INFILE instead of INSERT statements"""
+import itertools
+import math
+import os
+import re
+import time
+from datetime import datetime
+import mysql.connector
+from my_metrics.metrics import metrics
+from my_mysql.my_mysql import MySQL, is_row_error
+
+# The buffered statements and the duplicate handling of their LOAD DATA equivalent
+STATEMENT_PATTERN = re.compile(r"^(INSERT IGNORE|INSERT|REPLACE) INTO (\S+) \((.*?)\) VALUES")
+DUPLICATE_HANDLING = {"INSERT": "", "INSERT IGNORE": "IGNORE ", "REPLACE": "REPLACE "}
+# Characters escaped in the fields of a segment (LOAD DATA defaults, ESCAPED BY '\\')
+ESCAPE_PATTERN = re.compile(rb"[\\\t\n\r\x00]")
+ESCAPES = {b"\\": b"\\\\", b"\t": b"\\t", b"\n": b"\\n", b"\r": b"\\r", b"\x00": b"\\0"}
+# A NULL field
+NULL_FIELD = b"\\N"
+# Suffixes of the segments being written and of the closed segments ready to be loaded
+PART_SUFFIX = ".part"
+SEGMENT_SUFFIX = ".tsv"
+# Suffix of the recovered segments rejected by MySQL, kept for inspection
+REJECTED_SUFFIX = ".bad"
+
+
+def escape_field(value) -> bytes:
+    """
+    Encode a value as a field of a LOAD DATA file (tab separated, backslash escaped).
+
+    Args:
+        value: The value of the column (None, bool, int, float, datetime, bytes or str).
+
+    Returns:
+        bytes: The escaped field. None and non-finite floats (not storable in MySQL) are NULL.
+
+    Example:
+        escape_field("a\\tb")
+        # Output:
+        # b'a\\\\tb'
+    """
+    if value is None:
+        return NULL_FIELD
+    if isinstance(value, bool):
+        return b"1" if value else b"0"
+    if isinstance(value, int):
+        return str(value).encode()
+    if isinstance(value, float):
+        return repr(value).encode() if math.isfinite(value) else NULL_FIELD
+    if isinstance(value, datetime):
+        return value.isoformat(" ").encode()
+    field = bytes(value) if isinstance(value, (bytes, bytearray)) else str(value).encode()
+    return ESCAPE_PATTERN.sub(lambda match: ESCAPES[match.group()], field)
+
+
+def encode_row(row) -> bytes:
+    """
+    Encode a row as a line of a LOAD DATA file.
+
+    Args:
+        row (tuple): The values of the row, in the column order of the segment.
+
+    Returns:
+        bytes: The escaped fields separated by tabs, with the line terminator.
+    """
+    return b"\t".join([escape_field(value) for value in row]) + b"\n"
+
+
+class _Segment:
+    """
+    A spool segment being written: a header line with the buffered statement, then one line per row.
+    """
+
+    def __init__(self, path: str, sql: str) -> None:
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(sql.replace("\n", " ").encode() + b"\n")
+        self.size = 0
+
+    def write(self, rows: list) -> None:
+        data = b"".join([encode_row(row) for row in rows])
+        self.file.write(data)
+        self.size += len(data)
+
+    def close(self, fsync: bool) -> str:
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        # atomic handoff: a ".tsv" segment is always complete
+        path = self.path[: -len(PART_SUFFIX)] + SEGMENT_SUFFIX
+        os.replace(self.path, path)
+        return path
+
+
+class InfileMySQL(MySQL):
+    """
+    The MySQL class writing its buffered rows with LOAD DATA LOCAL INFILE, for very high sample rates.
+
+    The rows added with add_to_buffer, add_batch_to_buffer, add_long_samples and add_rollups are not
+    kept in memory: they are streamed as tab separated lines to a spool segment per statement in
+    "spool_dir". A segment is closed (renamed from ".part" to ".tsv") when it reaches
+    "max_segment_bytes" or on the next flush, which loads every closed segment with a single
+    LOAD DATA LOCAL INFILE statement and commits them in one transaction. The flush policy
+    ("batch_size" and "max_latency") and the return values are those of MySQL; after a failed flush
+    the segments stay on disk and are loaded by the next one, clear_buffer deletes them.
+
+    Segments left by a crash (a ".part" segment up to its last complete line) are kept apart from the
+    live ones: they are loaded at startup, each in its own transaction, and the ones left while MySQL
+    is unreachable by the next flushes (see load_recovered). A failed flush or clear_buffer never
+    touches them. A crash between the commit and the deletion of a segment loads it twice, which only
+    the tables with a unique key (the long schema and the rollups) absorb.
+
+    The MySQL server must allow it ("local_infile=ON"); the connection only sends files of
+    "spool_dir". insert_into_table keeps using a single INSERT.
+
+    Args:
+        host_name (str): The hostname or IP address of the MySQL server.
+        user_name (str): The MySQL user name for authentication.
+        user_password (str): The password associated with the MySQL user.
+        database_name (str): The name of the MySQL database to connect to.
+        batch_size (int): Number of buffered rows that triggers a flush (see buffer_into_table).
+        max_latency (float): Maximum time in seconds a buffered row waits before being flushed.
+        spool_dir (str): The directory of the spool segments.
+        max_segment_bytes (int): The size in bytes from which a segment is closed.
+        fsync (bool): True to sync every segment to the disk when it is closed.
+
+    Example:
+        my_mysql = InfileMySQL("localhost", "myuser", "mypassword", "mydatabase", batch_size=50000)
+        async with AsyncMySQLWriter(my_mysql) as writer:
+            await Collector(config, writer).run()
+    """
+
+    def __init__(
+        self,
+        host_name: str,
+        user_name: str,
+        user_password: str,
+        database_name: str,
+        batch_size: int = 500,
+        max_latency: float = 1.0,
+        spool_dir: str = "mysql_segments",
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        fsync: bool = False,
+    ) -> None:
+        """
+        Initialize a new instance of InfileMySQL.
+
+        Args:
+            host_name (str): The hostname or IP address of the MySQL server.
+            user_name (str): The MySQL user name for authentication.
+            user_password (str): The password associated with the MySQL user.
+            database_name (str): The name of the MySQL database to connect to.
+            batch_size (int): Number of buffered rows that triggers a flush.
+            max_latency (float): Maximum time in seconds a buffered row waits before being flushed.
+            spool_dir (str): The directory of the spool segments.
+            max_segment_bytes (int): The size in bytes from which a segment is closed.
+            fsync (bool): True to sync every segment to the disk when it is closed.
+        """
+        self.spool_dir = os.path.abspath(spool_dir)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        super().__init__(
+            host_name, user_name, user_password, database_name, batch_size, max_latency
+        )
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.segments_loaded = 0
+        self._segments = {}  # buffered statement -> open _Segment
+        self._closed = []  # paths of the live segments to load
+        self._recovered = self._recover_segments()  # (path, rows) of the segments left by a crash
+        numbers = [int(os.path.basename(path).split(".")[0]) for path, _ in self._recovered]
+        self._numbers = itertools.count(max(numbers, default=0) + 1)
+        self.load_recovered()
+
+    def _connect(
+        self, host_name: str, user_name: str, user_password: str, database_name: str
+    ):
+        return mysql.connector.connect(
+            host=host_name,
+            user=user_name,
+            passwd=user_password,
+            database=database_name,
+            allow_local_infile_in_path=self.spool_dir,
+        )
+
+    def _recover_segments(self) -> list:
+        paths = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            if name.endswith(PART_SUFFIX):
+                with open(path, "rb+") as part:
+                    data = part.read()
+                    part.truncate(data.rfind(b"\n") + 1)  # drop the incomplete last line
+                if data.count(b"\n") < 2:
+                    os.remove(path)  # no complete row
+                    continue
+                recovered = path[: -len(PART_SUFFIX)] + SEGMENT_SUFFIX
+                os.replace(path, recovered)
+                path = recovered
+            elif not name.endswith(SEGMENT_SUFFIX):
+                continue
+            with open(path, "rb") as segment:
+                paths.append((path, sum(1 for _ in segment) - 1))
+        return sorted(paths)
+
+    def _add_rows(self, sql: str, rows: list) -> None:
+        if not rows:
+            return
+        segment = self._segments.get(sql)
+        if segment is None:
+            if not STATEMENT_PATTERN.match(sql):
+                raise ValueError(f"Statement not supported by LOAD DATA: {sql}")
+            path = os.path.join(self.spool_dir, f"{next(self._numbers):012d}{PART_SUFFIX}")
+            segment = self._segments[sql] = _Segment(path, sql)
+        segment.write(rows)
+        self._buffered_rows += len(rows)
+        if self._oldest_buffered is None:
+            self._oldest_buffered = time.monotonic()
+        if segment.size >= self.max_segment_bytes:
+            self._closed.append(self._segments.pop(sql).close(self.fsync))
+
+    def get_load_data_cmd(self, path: str, sql: str) -> str:
+        """
+        Generate the LOAD DATA LOCAL INFILE command equivalent to a buffered statement.
+
+        Args:
+            path (str): The segment file.
+            sql (str): The buffered INSERT, INSERT IGNORE or REPLACE statement.
+
+        Returns:
+            str: A SQL command loading the rows of the segment (after its header line).
+
+        Example:
+            get_load_data_cmd("/spool/000000000001.tsv", "INSERT INTO t (`a`, created) VALUES(%s, %s)")
+            # Output:
+            # "LOAD DATA LOCAL INFILE '/spool/000000000001.tsv' INTO TABLE t CHARACTER SET binary
+            # FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' IGNORE 1 LINES
+            # (`a`, created)"
+        """
+        statement, table, columns = STATEMENT_PATTERN.match(sql).groups()
+        path = path.replace("\\", "\\\\").replace("'", "\\'")
+        return (
+            f"LOAD DATA LOCAL INFILE '{path}' {DUPLICATE_HANDLING[statement]}INTO TABLE {table} "
+            "CHARACTER SET binary FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' IGNORE 1 LINES ({columns})"
+        )
+
+    def load_recovered(self) -> bool:
+        """
+        Load the segments left by a crash, each in its own transaction, oldest first.
+
+        A segment rejected by MySQL with a permanent error (e.g. a corrupt line or a dropped table) is
+        renamed with the ".bad" suffix and kept for inspection, so it never blocks the live rows.
+
+        Returns:
+            bool: True if no recovered segment is left, False if MySQL is unreachable or failed with
+                a transient error (the remaining segments are loaded by the next flush).
+        """
+        while self._recovered:
+            path, rows = self._recovered[0]
+            try:
+                with open(path, "rb") as segment:
+                    sql = segment.readline().decode().rstrip("\n")
+                if not STATEMENT_PATTERN.match(sql):
+                    raise ValueError(f"Statement not supported by LOAD DATA: {sql}")
+                with metrics.timer("mysql_insert_seconds"):
+                    self.mycursor.execute(self.get_load_data_cmd(path, sql))
+                with metrics.timer("mysql_commit_seconds"):
+                    self.my_db.commit()
+            except Exception as err:
+                print(f"Error loading the recovered segment {path}: {err}")
+                metrics.inc("mysql_flush_errors_total")
+                self._rollback()
+                if not is_row_error(err):
+                    return False
+                os.replace(path, path[: -len(SEGMENT_SUFFIX)] + REJECTED_SUFFIX)
+            else:
+                os.remove(path)
+                metrics.inc("mysql_rows_written_total", rows)
+                self.rows_written += rows
+                self.batches_written += 1
+                self.segments_loaded += 1
+            self._recovered.pop(0)
+        return True
+
+    def flush(self) -> bool:
+        """
+        Close the open segments and load all the closed ones in a single transaction.
+
+        The segments left by a crash are loaded first, in their own transactions (see load_recovered).
+
+        Returns:
+            bool: True if the rows were committed (or there was nothing to write), False otherwise.
+                On failure the transaction is rolled back and the segments stay on disk.
+        """
+        self.last_error = None
+        if self._recovered:
+            self.load_recovered()
+        for sql in list(self._segments):
+            self._closed.append(self._segments.pop(sql).close(self.fsync))
+        if not self._closed:
+            return True
+        try:
+            with metrics.timer("mysql_insert_seconds"):
+                for path in self._closed:
+                    with open(path, "rb") as segment:
+                        sql = segment.readline().decode().rstrip("\n")
+                    self.mycursor.execute(self.get_load_data_cmd(path, sql))
+            with metrics.timer("mysql_commit_seconds"):
+                self.my_db.commit()
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            metrics.inc("mysql_flush_errors_total")
+            self.last_error = err
+            self._rollback()
+            return False
+        except Exception as err:
+            # Handle other exceptions here.
+            print(f"An unexpected error occurred: {err}")
+            metrics.inc("mysql_flush_errors_total")
+            self.last_error = err
+            self._rollback()
+            return False
+        for path in self._closed:
+            os.remove(path)
+        metrics.inc("mysql_rows_written_total", self._buffered_rows)
+        self.rows_written += self._buffered_rows
+        self.batches_written += len(self._closed)
+        self.segments_loaded += len(self._closed)
+        self._closed = []
+        self._buffered_rows = 0
+        self._oldest_buffered = None
+        return True
+
+    def clear_buffer(self) -> None:
+        """
+        Discard all the buffered rows and delete their segments, e.g. after they were saved somewhere else.
+
+        The segments left by a crash are not buffered rows: they stay on disk until they are loaded.
+        """
+        for sql in list(self._segments):
+            self._closed.append(self._segments.pop(sql).close(False))
+        for path in self._closed:
+            try:
+                os.remove(path)
+            except OSError as err:
+                print(f"Error deleting the segment {path}: {err}")
+        self._closed = []
+        super().clear_buffer()
+
+    def get_writer_stats(self) -> dict:
+        """
+        Get the statistics of the buffered writer.
+
+        Returns:
+            dict: The statistics of MySQL.get_writer_stats, the segments loaded so far and the
+            segments waiting on disk.
+        """
+        return {
+            **super().get_writer_stats(),
+            "segments_loaded": self.segments_loaded,
+            "pending_segments": len(self._segments) + len(self._closed) + len(self._recovered),
+        }
@@ -1,6 +1,112 @@
 """MySQL class to handle comminication with MySQL Server, create table and insert values"""
+import time
 import mysql.connector
-from datetime import datetime
+import numpy as np
+from mysql.connector import errorcode
+from mysql.connector.constants import FieldType
+from my_metrics.metrics import metrics
+from my_processing.array_codec import decode_array
+from my_processing.columnar_buffer import ColumnarBatch
+from datetime import date, datetime, timedelta, timezone
+
+# Rows per multi-row prepared INSERT used when flushing the write buffer
+PREPARED_ROWS_PER_STATEMENT = 100
+# Maximum number of placeholders of a MySQL prepared statement
+MAX_PREPARED_PLACEHOLDERS = 65535
+# Name of the index on the "created" column of the wide tables
+CREATED_INDEX = "created_index"
+# Formats of the chunks returned by read_time_range
+BATCH_FORMATS = ("arrays", "columnar")
+# Error numbers of a write worth retrying: unreachable server (can't connect, server gone away,
+# lost connection), table full, lock wait timeout, deadlock and read-only server (failover)
+TRANSIENT_ERRNOS = (2003, 2006, 2013, 2055, 1114, 1205, 1213, 1290)
+
+
+def utc_now() -> datetime:
+    """
+    Get the current time as a naive UTC datetime, the time zone of the OPC UA source timestamps.
+
+    Returns:
+        datetime: The current UTC time without tzinfo.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def is_transient_error(err: Exception) -> bool:
+    """
+    Tell whether a write failed because of the state of the MySQL server (unreachable, read-only
+    during a failover, deadlock, lock wait timeout, table full), so the same rows can be retried later.
+
+    Args:
+        err (Exception): The error raised by a write.
+
+    Returns:
+        bool: True for operational, internal and interface errors and the transient error numbers,
+        False otherwise.
+    """
+    if isinstance(
+        err,
+        (
+            mysql.connector.errors.OperationalError,
+            mysql.connector.errors.InternalError,
+            mysql.connector.errors.InterfaceError,
+        ),
+    ):
+        return True
+    return isinstance(err, mysql.connector.Error) and err.errno in TRANSIENT_ERRNOS
+
+
+def is_row_error(err: Exception) -> bool:
+    """
+    Tell whether a write failed because of the rows themselves (unknown column, data too long,
+    duplicate key, a value that cannot be encoded, ...), so retrying the same rows would never succeed.
+
+    Args:
+        err (Exception): The error raised by a write.
+
+    Returns:
+        bool: True for programming, data and integrity errors and for the errors raised before the
+        rows reach MySQL, False otherwise (the rows are retried).
+    """
+    if is_transient_error(err):
+        return False
+    if isinstance(err, mysql.connector.Error):
+        return isinstance(
+            err,
+            (
+                mysql.connector.errors.ProgrammingError,
+                mysql.connector.errors.DataError,
+                mysql.connector.errors.IntegrityError,
+            ),
+        )
+    return True
+
+
+def group_by_timestamp(
+    variables: dict, created: datetime, source_timestamps: dict = None
+) -> list:
+    """
+    Split a row into one row per source timestamp, so every long schema sample keeps its own time.
+
+    Args:
+        variables (dict): A dictionary mapping variable names to their corresponding values.
+        created (datetime): The time of the row, used for the variables without a source timestamp.
+        source_timestamps (dict): A dictionary mapping variable names to their source timestamps.
+
+    Returns:
+        list: A list of (variables, created) tuples, one per distinct timestamp.
+
+    Example:
+        group_by_timestamp({"a": 1, "b": 2}, read_time, {"a": t1, "b": t2})
+        # Output:
+        # [({"a": 1}, t1), ({"b": 2}, t2)]
+    """
+    if not source_timestamps:
+        return [(variables, created)]
+    groups = {}
+    for name, value in variables.items():
+        groups.setdefault(source_timestamps.get(name, created), {})[name] = value
+    return [(group, timestamp) for timestamp, group in groups.items()]
 
 
 class MySQL:
@@ -12,6 +118,8 @@ class MySQL:
         user_name (str): The MySQL user name for authentication.
         user_password (str): The password associated with the MySQL user.
         database_name (str): The name of the MySQL database to connect to.
+        batch_size (int): Number of buffered rows that triggers a flush (see buffer_into_table).
+        max_latency (float): Maximum time in seconds a buffered row waits before being flushed.
 
     Example:
         mysql_connection = MySQL(
@@ -23,7 +131,13 @@ class MySQL:
     """
 
     def __init__(
-        self, host_name: str, user_name: str, user_password: str, database_name: str
+        self,
+        host_name: str,
+        user_name: str,
+        user_password: str,
+        database_name: str,
+        batch_size: int = 500,
+        max_latency: float = 1.0,
     ) -> None:
         """
         Initialize a new instance of MySQL.
@@ -33,11 +147,32 @@ class MySQL:
             user_name (str): The MySQL user name for authentication.
             user_password (str): The password associated with the MySQL user.
             database_name (str): The name of the MySQL database to connect to.
+            batch_size (int): Number of buffered rows that triggers a flush.
+            max_latency (float): Maximum time in seconds a buffered row waits before being flushed.
         """
-        self.my_db = mysql.connector.connect(
+        self._connection_args = (host_name, user_name, user_password, database_name)
+        self.my_db = self._connect(host_name, user_name, user_password, database_name)
+        self.mycursor = self.my_db.cursor()
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self._buffers = {}  # INSERT statement -> list of rows
+        self._insert_cmds = {}  # db_name -> (column names, INSERT statement)
+        self._prepared = {}  # INSERT statement -> {rows per statement: (SQL text, prepared cursor)}
+        self._tag_ids = {}  # db_name -> {tag name: tag_id} (long schema)
+        self._last_long_values = {}  # db_name -> {tag name: last stored value} (long schema)
+        self._indexed_tables = set()  # tables known to have the index on "created"
+        self._buffered_rows = 0
+        self._oldest_buffered = None
+        self.rows_written = 0
+        self.batches_written = 0
+        self.last_error = None  # the error of the last failed flush
+
+    def _connect(
+        self, host_name: str, user_name: str, user_password: str, database_name: str
+    ):
+        return mysql.connector.connect(
             host=host_name, user=user_name, passwd=user_password, database=database_name
         )
-        self.mycursor = self.my_db.cursor()
 
     def get_variables_types(self, variables: dict) -> dict:
         """
@@ -51,8 +186,8 @@ class MySQL:
         Returns:
             dict: A dictionary mapping variable names to their inferred data types.
                 Data types can be one of the following: "Real" (for float values),
-                "Boolean" (for boolean values), "Int" (for integer values), or
-                "VARCHAR(255)" (for values of other data types).
+                "Boolean" (for boolean values), "Int" (for integer values), "LONGBLOB"
+                (for packed arrays) or "VARCHAR(255)" (for values of other data types).
 
         Example:
             variables = {
@@ -81,18 +216,32 @@ class MySQL:
                 value_type = "Boolean"
             elif isinstance(value, int):
                 value_type = "Int"
+            elif isinstance(value, bytes):
+                value_type = "LONGBLOB"  # packed array, see save_array_metadata
             else:
                 value_type = "VARCHAR(255)"
             dict_temp.update({f"{key}": value_type})
         return dict_temp
 
-    def get_create_table_cmd(self, db_name: str, variables: dict) -> str:
+    def get_create_table_cmd(
+        self, db_name: str, variables: dict, partition_by: str = ""
+    ) -> str:
         """
         Generate a SQL command to create a table in a database with specified variables.
 
+        "created" is a DATETIME(6) holding the time of the sample (microseconds, UTC, see
+        MyOPCUA.get_sample_from_db_name). The variable columns accept NULL, used for the variables
+        left out of a sample because of their bad quality.
+
+        With partition_by="day" or "week" the table is RANGE partitioned on the "created" column,
+        with one partition per day or week (see get_partitions_cmd). "created" is then part of the
+        primary key, as MySQL requires for partitioned tables. Both layouts have an index on "created"
+        for the time range reads (see read_time_range).
+
         Args:
             db_name (str): The name of the database table to be created.
             var_types (dict): A dictionary mapping variable names to their values.
+            partition_by (str): "day", "week" or "" (not partitioned).
 
         Returns:
             str: A SQL command for creating the table with the specified variables and data types.
@@ -109,23 +258,84 @@ class MySQL:
             sql_command = get_create_table_cmd(db_name, variables)
             # Output:
             # "CREATE TABLE IF NOT EXISTS employees (employees_id int PRIMARY KEY AUTO_INCREMENT,
-            # first_name VARCHAR(255) NOT NULL, last_name VARCHAR(255) NOT NULL, age int NOT NULL,
-            # height real NOT NULL, is_manager Boolean NOT NULL, created TIMESTAMP NOT NULL)"
+            # `first_name` VARCHAR(255) NULL, `last_name` VARCHAR(255) NULL, `age` Int NULL,
+            # `height` Real NULL, `is_manager` Boolean NULL, created DATETIME(6) NOT NULL,
+            # INDEX created_index (created))"
         """
         var_types = self.get_variables_types(variables)
         table_id = f"{db_name.lower()}_id"
         variables_and_type_string = ""
         for key, value in var_types.items():
-            variables_and_type_string += f", {key} {value} NOT NULL"
-        return f"CREATE TABLE IF NOT EXISTS {db_name} ({table_id} int PRIMARY KEY AUTO_INCREMENT{variables_and_type_string}, created TIMESTAMP NOT NULL)"
+            variables_and_type_string += f", `{key}` {value} NULL"
+        if not partition_by:
+            return f"CREATE TABLE IF NOT EXISTS {db_name} ({table_id} int PRIMARY KEY AUTO_INCREMENT{variables_and_type_string}, created DATETIME(6) NOT NULL, INDEX {CREATED_INDEX} (created))"
+        partitions = ", ".join(
+            self.get_partitions_cmd(partition_by, datetime.now(timezone.utc).date(), 8)
+            + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+        )
+        return (
+            f"CREATE TABLE IF NOT EXISTS {db_name} ({table_id} int NOT NULL AUTO_INCREMENT{variables_and_type_string}, "
+            f"created DATETIME(6) NOT NULL, PRIMARY KEY ({table_id}, created), INDEX {CREATED_INDEX} (created)) "
+            f"PARTITION BY RANGE (TO_DAYS(created)) ({partitions})"
+        )
+
+    def get_partition_start(self, partition_by: str, day: date) -> date:
+        """
+        Get the first day of the partition containing "day".
+
+        Args:
+            partition_by (str): "day" or "week" (weeks start on Monday).
+            day (date): Any day.
 
-    def create_table(self, db_name: str, variables: dict) -> bool:
+        Returns:
+            date: The first day of the partition.
+        """
+        if partition_by == "week":
+            return day - timedelta(days=day.weekday())
+        if partition_by == "day":
+            return day
+        raise ValueError(f"partition_by must be 'day' or 'week', not {partition_by!r}")
+
+    def get_partitions_cmd(self, partition_by: str, start: date, count: int) -> list[str]:
+        """
+        Generate the SQL definitions of "count" consecutive partitions, starting with the one containing "start".
+
+        Partitions are named p<YYYYMMDD> after their first day.
+
+        Args:
+            partition_by (str): "day" or "week".
+            start (date): A day in the first partition.
+            count (int): The number of partitions.
+
+        Returns:
+            list[str]: The partition definitions.
+
+        Example:
+            get_partitions_cmd("day", date(2023, 10, 1), 2)
+            # Output:
+            # ["PARTITION p20231001 VALUES LESS THAN (TO_DAYS('2023-10-02'))",
+            #  "PARTITION p20231002 VALUES LESS THAN (TO_DAYS('2023-10-03'))"]
+        """
+        period = timedelta(days=7 if partition_by == "week" else 1)
+        first_day = self.get_partition_start(partition_by, start)
+        partitions = []
+        for index in range(count):
+            day = first_day + index * period
+            partitions.append(
+                f"PARTITION p{day:%Y%m%d} VALUES LESS THAN (TO_DAYS('{day + period:%Y-%m-%d}'))"
+            )
+        return partitions
+
+    def create_table(
+        self, db_name: str, variables: dict, partition_by: str = ""
+    ) -> bool:
         """
         Create a table in a database with specified variable types and return True if successful, False otherwise.
 
         Args:
             db_name (str): The name of the database table to be created.
-            var_types (dict): A dictionary mapping variable names to their data types.
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+            partition_by (str): "day", "week" or "" (not partitioned). See get_create_table_cmd.
 
         Returns:
             bool: True if the table creation is successful, False otherwise.
@@ -145,9 +355,78 @@ class MySQL:
             else:
                 print(f"Failed to create table '{db_name}'.")
         """
-        var_types = self.get_variables_types(variables)
         try:
-            self.mycursor.execute(self.get_create_table_cmd(db_name, var_types))
+            self.mycursor.execute(
+                self.get_create_table_cmd(db_name, variables, partition_by)
+            )
+            return True
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return False
+        except Exception as err:
+            # Handle other exceptions here.
+            print(f"An unexpected error occurred: {err}")
+            return False
+
+    def maintain_partitions(
+        self,
+        db_name: str,
+        partition_by: str,
+        future_partitions: int = 7,
+        retention_days: int = 30,
+    ) -> bool:
+        """
+        Pre-create the future partitions of a partitioned table and drop the expired ones.
+
+        Partitions are created until "future_partitions" partitions exist after the current one.
+        A partition is dropped when all its rows are older than "retention_days" days, so the
+        retention costs one DROP PARTITION instead of a large DELETE.
+
+        Args:
+            db_name (str): The name of the partitioned table.
+            partition_by (str): "day" or "week", as used in create_table.
+            future_partitions (int): The number of partitions to keep ready after the current one.
+            retention_days (int): The number of days of data to keep.
+
+        Returns:
+            bool: True if the maintenance was successful, False otherwise.
+
+        Example:
+            my_mysql.create_table("employees", variables, partition_by="day")
+            my_mysql.maintain_partitions("employees", "day", future_partitions=7, retention_days=90)
+        """
+        try:
+            self.mycursor.execute(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL",
+                (db_name,),
+            )
+            existing = {
+                datetime.strptime(name[1:], "%Y%m%d").date()
+                for (name,) in self.mycursor.fetchall()
+                if name != "pmax"
+            }
+            period = timedelta(days=7 if partition_by == "week" else 1)
+            today = datetime.now(timezone.utc).date()  # the created column is naive UTC
+            current = self.get_partition_start(partition_by, today)
+            last = max(existing) if existing else current - period
+            missing = (current + future_partitions * period - last) // period
+            if missing > 0:
+                new_partitions = ", ".join(
+                    self.get_partitions_cmd(partition_by, last + period, missing)
+                    + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+                )
+                self.mycursor.execute(
+                    f"ALTER TABLE {db_name} REORGANIZE PARTITION pmax INTO ({new_partitions})"
+                )
+            cutoff = today - timedelta(days=retention_days)
+            expired = sorted(day for day in existing if day + period <= cutoff)
+            if expired:
+                self.mycursor.execute(
+                    f"ALTER TABLE {db_name} DROP PARTITION "
+                    + ", ".join(f"p{day:%Y%m%d}" for day in expired)
+                )
             return True
         except mysql.connector.Error as err:
             # Handle specific database-related errors here.
@@ -180,20 +459,24 @@ class MySQL:
             }
             sql_command = get_insert_into_cmd(db_name, variables)
             # Output:
-            # "INSERT INTO employees (first_name, last_name, age, height, is_manager, created)
+            # "INSERT INTO employees (`first_name`, `last_name`, `age`, `height`, `is_manager`, created)
             # VALUES (%s, %s, %s, %s, %s, %s)"
         """
-        variables_names = ", ".join(variables.keys()) + ", created"
+        # quoted, as the elements of the arrays are named "name[i]"
+        variables_names = "".join(f"`{name}`, " for name in variables) + "created"
         amount_of_variables = ("%s, " * (len(variables) + 1))[:-2]
         return f"INSERT INTO {db_name} ({variables_names}) VALUES({amount_of_variables})"
 
-    def insert_into_table(self, db_name: str, variables: dict) -> bool:
+    def insert_into_table(
+        self, db_name: str, variables: dict, created: datetime = None
+    ) -> bool:
         """
         Insert data into a database table and return True if successful, False otherwise.
 
         Args:
             db_name (str): The name of the database table where data will be inserted.
             variables (dict): A dictionary mapping variable names to their corresponding values.
+            created (datetime): The source time of the row (naive UTC). Defaults to the current time.
 
         Returns:
             bool: True if the insertion is successful, False otherwise.
@@ -214,17 +497,740 @@ class MySQL:
                 print("Failed to insert data.")
         """
         try:
-            sql = self.get_insert_into_cmd(db_name, variables)
+            sql = self.get_cached_insert_cmd(db_name, variables)
             values_insert = list(variables.values())
-            values_insert.append(str(datetime.now()))
-            self.mycursor.execute(sql, tuple(values_insert))
+            values_insert.append(created if created is not None else utc_now())
+            self._execute_rows(sql, [tuple(values_insert)])
+            self.my_db.commit()
+            return True
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return False
+        except Exception as err:
+            # Handle other exceptions here.
+            print(f"An unexpected error occurred: {err}")
+            return False
+
+    def buffer_into_table(
+        self, db_name: str, variables: dict, created: datetime = None
+    ) -> bool:
+        """
+        Add a row to the write buffer and flush the buffer if a threshold is reached.
+
+        Rows are grouped by table and column set. The buffer is flushed when it holds "batch_size"
+        rows or when the oldest buffered row is older than "max_latency" seconds.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+            created (datetime): The source time of the row (naive UTC). Defaults to the current time.
+
+        Returns:
+            bool: False if a flush was triggered and failed, True otherwise.
+
+        Example:
+            my_mysql = MySQL(..., batch_size=1000, max_latency=2.0)
+            while True:
+                my_mysql.buffer_into_table("employees", variables)
+            my_mysql.close()
+        """
+        self.add_to_buffer(db_name, variables, created)
+        return self.flush_if_due()
+
+    def add_to_buffer(
+        self, db_name: str, variables: dict, created: datetime = None
+    ) -> None:
+        """
+        Add a row to the write buffer without flushing it. See buffer_into_table.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+            created (datetime): The source time of the row (naive UTC). Defaults to the current time.
+        """
+        values_insert = list(variables.values())
+        values_insert.append(created if created is not None else utc_now())
+        self._add_rows(
+            self.get_cached_insert_cmd(db_name, variables), [tuple(values_insert)]
+        )
+
+    def get_cached_insert_cmd(self, db_name: str, variables: dict) -> str:
+        """
+        Get the INSERT statement of a table, built only once per (table, column set) signature.
+
+        When the column set of a table changes, the statement and the prepared statements of the old
+        signature are discarded.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+
+        Returns:
+            str: The same SQL command as get_insert_into_cmd.
+        """
+        columns = tuple(variables)
+        cached = self._insert_cmds.get(db_name)
+        if cached is None or cached[0] != columns:
+            if cached is not None:
+                for _, cursor in self._prepared.pop(cached[1], {}).values():
+                    cursor.close()
+            cached = (columns, self.get_insert_into_cmd(db_name, variables))
+            self._insert_cmds[db_name] = cached
+        return cached[1]
+
+    def _get_prepared_cursor(self, sql: str, rows: int) -> tuple:
+        statements = self._prepared.setdefault(sql, {})
+        if rows not in statements:
+            head, row_placeholders = sql.rsplit("VALUES", 1)
+            statement = f"{head}VALUES " + ", ".join([row_placeholders.strip()] * rows)
+            statements[rows] = (statement, self.my_db.cursor(prepared=True))
+        return statements[rows]
+
+    def _execute_rows(self, sql: str, rows: list) -> None:
+        # Server-side prepared statements (binary protocol): the SQL is parsed once per
+        # signature, full chunks use a multi-row statement, the remainder a single-row one.
+        chunk = max(
+            1,
+            min(PREPARED_ROWS_PER_STATEMENT, MAX_PREPARED_PLACEHOLDERS // sql.count("%s")),
+        )
+        full_rows = len(rows) - len(rows) % chunk
+        if full_rows:
+            statement, cursor = self._get_prepared_cursor(sql, chunk)
+            for start in range(0, full_rows, chunk):
+                cursor.execute(
+                    statement,
+                    [value for row in rows[start : start + chunk] for value in row],
+                )
+        if full_rows < len(rows):
+            statement, cursor = self._get_prepared_cursor(sql, 1)
+            for row in rows[full_rows:]:
+                cursor.execute(statement, row)
+
+    def add_batch_to_buffer(self, db_name: str, batch) -> None:
+        """
+        Add all the rows of a columnar batch to the write buffer, without flushing it.
+
+        The rows go straight from the arrays of the batch to the INSERT parameters, without
+        building a dictionary per sample.
+
+        Args:
+            db_name (str): The name of the database table where data will be inserted.
+            batch (ColumnarBatch): The rows taken from a ColumnarRingBuffer.
+        """
+        if len(batch):
+            self._add_rows(
+                self.get_cached_insert_cmd(db_name, dict.fromkeys(batch.columns)),
+                batch.to_rows(),
+            )
+
+    def _add_rows(self, sql: str, rows: list) -> None:
+        if not rows:
+            return
+        self._buffers.setdefault(sql, []).extend(rows)
+        self._buffered_rows += len(rows)
+        if self._oldest_buffered is None:
+            self._oldest_buffered = time.monotonic()
+
+    def get_create_long_schema_cmds(self, db_name: str) -> list[str]:
+        """
+        Generate the SQL commands to create the narrow/long storage schema of a database.
+
+        The long schema stores one row per tag and sample instead of one column per variable:
+            - "<db_name>_tags": the tag dictionary (tag_id, name, data_type).
+            - "<db_name>_samples": the samples (tag_id, source_ts, value, value_text), clustered by
+              the primary key (tag_id, source_ts), so the samples of a tag are stored together in time order.
+        Numeric and boolean values are stored in "value", any other value in "value_text".
+
+        Args:
+            db_name (str): The name of the database (prefix of the tables).
+
+        Returns:
+            list[str]: The SQL commands to create the tag dictionary and samples tables.
+
+        Example:
+            commands = get_create_long_schema_cmds("employees")
+            # Output:
+            # ["CREATE TABLE IF NOT EXISTS employees_tags (...)",
+            #  "CREATE TABLE IF NOT EXISTS employees_samples (...)"]
+        """
+        return [
+            f"CREATE TABLE IF NOT EXISTS {db_name}_tags (tag_id int PRIMARY KEY AUTO_INCREMENT, "
+            "name VARCHAR(255) NOT NULL UNIQUE, data_type VARCHAR(32) NOT NULL)",
+            f"CREATE TABLE IF NOT EXISTS {db_name}_samples (tag_id int NOT NULL, "
+            "source_ts DATETIME(6) NOT NULL, value DOUBLE NULL, value_text VARCHAR(255) NULL, "
+            "PRIMARY KEY (tag_id, source_ts))",
+        ]
+
+    def create_long_schema(self, db_name: str) -> bool:
+        """
+        Create the tag dictionary and samples tables of the long schema and return True if successful.
+
+        Args:
+            db_name (str): The name of the database (prefix of the tables).
+
+        Returns:
+            bool: True if the tables were created successfully, False otherwise.
+        """
+        try:
+            for sql in self.get_create_long_schema_cmds(db_name):
+                self.mycursor.execute(sql)
+            return True
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return False
+        except Exception as err:
+            # Handle other exceptions here.
+            print(f"An unexpected error occurred: {err}")
+            return False
+
+    def get_tag_ids(self, db_name: str, variables: dict) -> dict:
+        """
+        Get the tag ids of the variables, adding the unknown ones to the tag dictionary.
+
+        Args:
+            db_name (str): The name of the database (prefix of the tables).
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+
+        Returns:
+            dict: A dictionary mapping the variable names to their tag ids.
+        """
+        tag_ids = self._tag_ids.setdefault(db_name, {})
+        missing = [name for name in variables if name not in tag_ids]
+        if missing:
+            var_types = self.get_variables_types({name: variables[name] for name in missing})
+            self.mycursor.executemany(
+                f"INSERT IGNORE INTO {db_name}_tags (name, data_type) VALUES (%s, %s)",
+                list(var_types.items()),
+            )
+            self.my_db.commit()
+            self.mycursor.execute(f"SELECT tag_id, name FROM {db_name}_tags")
+            for tag_id, name in self.mycursor.fetchall():
+                tag_ids[name] = tag_id
+        return tag_ids
+
+    def filter_changed_tags(self, db_name: str, variables: dict) -> dict:
+        """
+        Keep only the variables whose value changed since the last call for the same database.
+
+        Args:
+            db_name (str): The name of the database.
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+
+        Returns:
+            dict: The changed variables (all of them on the first call).
+        """
+        last_values = self._last_long_values.setdefault(db_name, {})
+        changed = {
+            name: value
+            for name, value in variables.items()
+            if name not in last_values or last_values[name] != value
+        }
+        last_values.update(changed)
+        return changed
+
+    def add_long_samples(
+        self, db_name: str, variables: dict, created: datetime = None
+    ) -> None:
+        """
+        Add one sample per variable to the write buffer of the long schema, without flushing it.
+
+        Args:
+            db_name (str): The name of the database (prefix of the tables).
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+            created (datetime): The source time of the samples. Defaults to the current time.
+        """
+        if not variables:
+            return
+        created = created if created is not None else utc_now()
+        tag_ids = self.get_tag_ids(db_name, variables)
+        rows = []
+        for name, value in variables.items():
+            if isinstance(value, (bool, int, float)):
+                rows.append((tag_ids[name], created, float(value), None))
+            else:
+                rows.append((tag_ids[name], created, None, str(value)))
+        # IGNORE keeps the replay of already stored samples idempotent
+        self._add_rows(
+            f"INSERT IGNORE INTO {db_name}_samples (tag_id, source_ts, value, value_text) "
+            "VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+    def buffer_long_samples(
+        self, db_name: str, variables: dict, created: datetime = None
+    ) -> bool:
+        """
+        Buffer the changed variables as samples of the long schema and flush if a threshold is reached.
+
+        Only the tags whose value changed since the last call are stored, so flat tags cost nothing.
+
+        Args:
+            db_name (str): The name of the database (prefix of the tables).
+            variables (dict): A dictionary mapping variable names to their corresponding values.
+            created (datetime): The source time of the samples. Defaults to the current time.
+
+        Returns:
+            bool: False if a flush was triggered and failed, True otherwise.
+
+        Example:
+            my_mysql.create_long_schema("employees")
+            my_mysql.buffer_long_samples("employees", {"age": 30, "height": 1.75})
+        """
+        try:
+            self.add_long_samples(
+                db_name, self.filter_changed_tags(db_name, variables), created
+            )
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return False
+        return self.flush_if_due()
+
+    def get_last_timestamp(self, db_name: str, long_schema: bool = False):
+        """
+        Get the time of the newest row stored in a table, to find the gap left by an outage.
+
+        Args:
+            db_name (str): The name of the table (wide schema) or prefix of the tables (long schema).
+            long_schema (bool): True to read the samples table of the long schema.
+
+        Returns:
+            datetime: The newest "created" (or "source_ts") value, or None if the table is empty
+            or cannot be read.
+        """
+        if long_schema:
+            sql = f"SELECT MAX(source_ts) FROM {db_name}_samples"
+        else:
+            sql = f"SELECT MAX(created) FROM {db_name}"
+        try:
+            self.mycursor.execute(sql)
+            (last_timestamp,) = self.mycursor.fetchone()
+            return last_timestamp
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return None
+
+    def ensure_created_index(self, db_name: str) -> bool:
+        """
+        Make sure a table has an index starting with "created", creating it on the tables of older versions.
+
+        Args:
+            db_name (str): The name of the table.
+
+        Returns:
+            bool: True if the index exists or was created, False otherwise.
+        """
+        try:
+            self._ensure_created_index(self.mycursor, db_name)
+            return True
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return False
+
+    def _ensure_created_index(self, cursor, db_name: str) -> None:
+        if db_name in self._indexed_tables:
+            return
+        cursor.execute(
+            f"SHOW INDEX FROM {db_name} WHERE Column_name = 'created' AND Seq_in_index = 1"
+        )
+        if not cursor.fetchall():
+            # InnoDB builds it online, the inserts are not blocked
+            cursor.execute(f"CREATE INDEX {CREATED_INDEX} ON {db_name} (created)")
+        self._indexed_tables.add(db_name)
+
+    def read_time_range(
+        self,
+        db_name: str,
+        start: datetime,
+        end: datetime,
+        columns: list[str] = None,
+        chunk_size: int = 10000,
+        batch_format: str = "arrays",
+    ):
+        """
+        Read the rows of a time range of a table as a stream of fixed-size chunks.
+
+        The rows are read in "created" order with an unbuffered cursor on a dedicated connection, so
+        the server streams them and only one chunk is held in memory at a time, whatever the length of
+        the range; the index on "created" is created first if needed (see ensure_created_index) and
+        the array metadata is read, on the same connection (the writer connection is left alone).
+        Every chunk is decoded into NumPy arrays:
+            - "arrays": a dictionary with "created" (datetime64[us]) and one array per column. NULL
+              values of numeric columns are NaN, packed array columns are decoded with the array
+              metadata of the table into a (rows, *dimensions) array, other columns are object arrays.
+            - "columnar": a ColumnarBatch with the timestamps and a float64 value per column (NULL is
+              NaN). The other columns (e.g. STATUS_COLUMN, packed arrays) are left out.
+
+        Args:
+            db_name (str): The name of the table.
+            start (datetime): The start of the range, included (naive UTC).
+            end (datetime): The end of the range, excluded (naive UTC).
+            columns (list[str]): The columns to read. Defaults to all the variable columns.
+            chunk_size (int): The number of rows per chunk (the last one may be shorter).
+            batch_format (str): "arrays" or "columnar".
+
+        Yields:
+            dict or ColumnarBatch: The chunks, in time order. On a database error the error is
+            printed and the iteration stops.
+
+        Example:
+            for chunk in my_mysql.read_time_range(
+                "plc1_Data_DB", datetime(2024, 1, 1), datetime(2024, 4, 1), ["temp", "pressure"]
+            ):
+                print(chunk["created"][0], chunk["temp"].mean())
+        """
+        if batch_format not in BATCH_FORMATS:
+            raise ValueError(f"batch_format must be one of {BATCH_FORMATS}, not {batch_format!r}")
+        if columns is None:
+            selected = "*"
+        else:
+            selected = "".join(f"`{name}`, " for name in columns) + "created"
+        sql = (
+            f"SELECT {selected} FROM {db_name} WHERE created >= %s AND created < %s "
+            "ORDER BY created"
+        )
+        # a dedicated connection: the rows of an unbuffered cursor must be read before any other query
+        connection = None
+        try:
+            connection = self._connect(*self._connection_args)
+            try:
+                self._ensure_created_index(connection.cursor(buffered=True), db_name)
+            except mysql.connector.Error as err:
+                # the range is read without the index
+                print(f"Database error: {err}")
+            array_metadata = {}
+            if batch_format == "arrays":
+                array_metadata = self._get_array_metadata(connection.cursor(buffered=True), db_name)
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(sql, (start, end))
+            names = list(cursor.column_names)
+            created_index = names.index("created")
+            selected_indexes = [
+                index
+                for index, name in enumerate(names)
+                if name != "created" and name != f"{db_name.lower()}_id"
+            ]
+            numeric_indexes = None
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                values = list(zip(*rows))
+                timestamps = np.array(values[created_index], dtype="datetime64[us]")
+                if batch_format == "columnar":
+                    if numeric_indexes is None:
+                        numeric_indexes = self._get_numeric_indexes(
+                            cursor.description, selected_indexes, values
+                        )
+                    batch_values = np.empty((len(rows), len(numeric_indexes)), dtype=np.float64)
+                    for position, index in enumerate(numeric_indexes):
+                        batch_values[:, position] = [
+                            np.nan if value is None else value for value in values[index]
+                        ]
+                    yield ColumnarBatch(
+                        [names[index] for index in numeric_indexes], timestamps, batch_values
+                    )
+                    continue
+                chunk = {"created": timestamps}
+                for index in selected_indexes:
+                    chunk[names[index]] = self._to_array(
+                        values[index], array_metadata.get(names[index])
+                    )
+                yield chunk
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+        finally:
+            if connection is not None:
+                # also drops the rows not read when the iteration is stopped early
+                connection.close()
+
+    @staticmethod
+    def _get_numeric_indexes(description: list, indexes: list, values: list) -> list:
+        # the numeric columns by their MySQL type, or by their first values if the type is unknown
+        numeric_types = FieldType.get_number_types()
+        numeric_indexes = []
+        for index in indexes:
+            type_code = description[index][1]
+            if type_code is not None:
+                numeric = type_code in numeric_types
+            else:
+                numeric = all(
+                    isinstance(value, (int, float)) for value in values[index] if value is not None
+                )
+            if numeric:
+                numeric_indexes.append(index)
+        return numeric_indexes
+
+    @staticmethod
+    def _to_array(values: tuple, metadata: dict = None) -> np.ndarray:
+        if metadata is not None and None not in values:
+            # packed arrays: one copy of the blobs, then a view with one row per sample
+            return decode_array(
+                b"".join(values),
+                metadata["element_type"],
+                [len(values), *metadata["dimensions"]],
+            )
+        if all(isinstance(value, (int, float)) for value in values if value is not None):
+            if None in values:
+                return np.array(
+                    [np.nan if value is None else value for value in values], dtype=np.float64
+                )
+            return np.array(values)
+        return np.array(values, dtype=object)
+
+    def save_array_metadata(self, db_name: str, arrays: dict) -> bool:
+        """
+        Record the element type and dimensions of the packed arrays of a table.
+
+        The metadata is stored in "<db_name>_arrays" (column_name, element_type, dimensions), so the
+        BLOB columns can be decoded with array_codec.decode_array.
+
+        Args:
+            db_name (str): The name of the table with the packed arrays.
+            arrays (dict): A dictionary mapping column names to {"element_type", "dimensions"} dictionaries,
+                as returned by MyOPCUA.get_array_metadata.
+
+        Returns:
+            bool: True if the metadata was saved, False otherwise.
+        """
+        try:
+            self.mycursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {db_name}_arrays (column_name VARCHAR(255) PRIMARY KEY, "
+                "element_type VARCHAR(16) NOT NULL, dimensions VARCHAR(255) NOT NULL)"
+            )
+            if arrays:
+                self.mycursor.executemany(
+                    f"REPLACE INTO {db_name}_arrays (column_name, element_type, dimensions) "
+                    "VALUES (%s, %s, %s)",
+                    [
+                        (
+                            name,
+                            array["element_type"],
+                            ",".join(str(size) for size in array["dimensions"]),
+                        )
+                        for name, array in arrays.items()
+                    ],
+                )
             self.my_db.commit()
             return True
         except mysql.connector.Error as err:
             # Handle specific database-related errors here.
             print(f"Database error: {err}")
             return False
+
+    def get_array_metadata(self, db_name: str) -> dict:
+        """
+        Read the element type and dimensions of the packed arrays of a table.
+
+        Args:
+            db_name (str): The name of the table with the packed arrays.
+
+        Returns:
+            dict: A dictionary mapping column names to {"element_type", "dimensions"} dictionaries,
+            empty if the table has no packed arrays (no "<db_name>_arrays" table).
+
+        Example:
+            metadata = my_mysql.get_array_metadata("MyDatabase")["pressure"]
+            pressure = decode_array(blob, metadata["element_type"], metadata["dimensions"])
+        """
+        return self._get_array_metadata(self.mycursor, db_name)
+
+    @staticmethod
+    def _get_array_metadata(cursor, db_name: str) -> dict:
+        try:
+            cursor.execute(f"SELECT column_name, element_type, dimensions FROM {db_name}_arrays")
+            return {
+                name: {
+                    "element_type": element_type,
+                    "dimensions": [int(size) for size in dimensions.split(",")],
+                }
+                for name, element_type, dimensions in cursor.fetchall()
+            }
+        except mysql.connector.Error as err:
+            if err.errno == errorcode.ER_NO_SUCH_TABLE:
+                return {}  # a table without packed arrays
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return {}
+
+    def create_rollup_table(self, db_name: str, window_label: str) -> bool:
+        """
+        Create the rollup table of a window next to the raw table and return True if successful.
+
+        The table "<db_name>_rollup_<window_label>" stores one row per tag and window, with the
+        min/max/mean/last/count of the window (see RollupAggregator).
+
+        Args:
+            db_name (str): The name of the raw table.
+            window_label (str): The label of the window, e.g. "1m" or "1h".
+
+        Returns:
+            bool: True if the table creation is successful, False otherwise.
+
+        Example:
+            my_mysql.create_rollup_table("employees", "1m")
+            # Creates: employees_rollup_1m (tag, window_start, min_value, max_value, mean_value,
+            # last_value, count_values)
+        """
+        try:
+            self.mycursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {db_name}_rollup_{window_label} ("
+                "tag VARCHAR(255) NOT NULL, window_start DATETIME NOT NULL, "
+                "min_value DOUBLE NOT NULL, max_value DOUBLE NOT NULL, mean_value DOUBLE NOT NULL, "
+                "last_value DOUBLE NOT NULL, count_values int NOT NULL, "
+                "PRIMARY KEY (tag, window_start))"
+            )
+            return True
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            return False
+        except Exception as err:
+            # Handle other exceptions here.
+            print(f"An unexpected error occurred: {err}")
+            return False
+
+    def add_rollups(
+        self, db_name: str, window_label: str, window_start: datetime, rollups: dict
+    ) -> None:
+        """
+        Add the rollups of a window to the write buffer, without flushing it.
+
+        A window written again (e.g. a partial window flushed on shutdown) replaces the previous rows.
+
+        Args:
+            db_name (str): The name of the raw table.
+            window_label (str): The label of the window, e.g. "1m" or "1h".
+            window_start (datetime): The start of the window.
+            rollups (dict): A dictionary mapping tag names to (min, max, mean, last, count) tuples.
+        """
+        self._add_rows(
+            f"REPLACE INTO {db_name}_rollup_{window_label} (tag, window_start, min_value, "
+            "max_value, mean_value, last_value, count_values) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [(tag, window_start, *values) for tag, values in rollups.items()],
+        )
+
+    def flush_if_due(self) -> bool:
+        """
+        Flush the write buffer if it is full or the oldest buffered row exceeded "max_latency".
+
+        Call it periodically when rows arrive slowly, so the latency bound is respected.
+
+        Returns:
+            bool: False if a flush was triggered and failed, True otherwise.
+        """
+        if self._buffered_rows == 0:
+            return True
+        if (
+            self._buffered_rows >= self.batch_size
+            or time.monotonic() - self._oldest_buffered >= self.max_latency
+        ):
+            return self.flush()
+        return True
+
+    def flush(self) -> bool:
+        """
+        Write all the buffered rows with multi-row INSERT statements in a single transaction.
+
+        Returns:
+            bool: True if the rows were committed (or there was nothing to write), False otherwise.
+                On failure the transaction is rolled back, the rows stay in the buffer and the error
+                is kept in "last_error" (see is_transient_error).
+        """
+        self.last_error = None
+        if self._buffered_rows == 0:
+            return True
+        try:
+            batches = 0
+            with metrics.timer("mysql_insert_seconds"):
+                for sql, rows in self._buffers.items():
+                    self._execute_rows(sql, rows)
+                    batches += 1
+            with metrics.timer("mysql_commit_seconds"):
+                self.my_db.commit()
+        except mysql.connector.Error as err:
+            # Handle specific database-related errors here.
+            print(f"Database error: {err}")
+            metrics.inc("mysql_flush_errors_total")
+            self.last_error = err
+            self._rollback()
+            return False
         except Exception as err:
             # Handle other exceptions here.
             print(f"An unexpected error occurred: {err}")
+            metrics.inc("mysql_flush_errors_total")
+            self.last_error = err
+            self._rollback()
             return False
+        metrics.inc("mysql_rows_written_total", self._buffered_rows)
+        self.rows_written += self._buffered_rows
+        self.batches_written += batches
+        self.clear_buffer()
+        return True
+
+    def clear_buffer(self) -> None:
+        """
+        Discard all the rows in the write buffer, e.g. after they were saved somewhere else.
+        """
+        self._buffers = {}
+        self._buffered_rows = 0
+        self._oldest_buffered = None
+
+    def reconnect(self) -> bool:
+        """
+        Check the connection with the MySQL server and reconnect if it was lost.
+
+        Returns:
+            bool: True if the connection is available, False otherwise.
+        """
+        try:
+            if not self.my_db.is_connected():
+                self.my_db.reconnect(attempts=1, delay=0)
+                self.mycursor = self.my_db.cursor()
+                # the prepared statements were lost with the old session
+                self._prepared = {}
+            return True
+        except mysql.connector.Error as err:
+            print(f"Database error: {err}")
+            return False
+
+    def _rollback(self) -> None:
+        try:
+            self.my_db.rollback()
+        except mysql.connector.Error:
+            pass
+
+    def get_writer_stats(self) -> dict:
+        """
+        Get the statistics of the buffered writer.
+
+        Returns:
+            dict: The rows and batches written so far and the rows still waiting in the buffer.
+
+        Example:
+            print(my_mysql.get_writer_stats())
+            # Output:
+            # {"rows_written": 12000, "batches_written": 24, "buffered_rows": 17}
+        """
+        return {
+            "rows_written": self.rows_written,
+            "batches_written": self.batches_written,
+            "buffered_rows": self._buffered_rows,
+        }
+
+    def close(self) -> bool:
+        """
+        Flush the write buffer and close the connection with the MySQL server.
+
+        Returns:
+            bool: True if the pending rows were written, False otherwise.
+        """
+        flushed = self.flush()
+        self.mycursor.close()
+        self.my_db.close()
+        return flushed
@@ -0,0 +1,197 @@
+"""SQLiteSpool class to keep rows in a local append-only SQLite file while MySQL is unavailable"""
+import base64
+import json
+from datetime import datetime
+import aiosqlite
+
+# JSON key marking a packed array (bytes) stored as base64 text
+BYTES_KEY = "__bytes__"
+
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {BYTES_KEY: base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_value(value: dict):
+    if BYTES_KEY in value:
+        return base64.b64decode(value[BYTES_KEY])
+    return value
+
+
+class SQLiteSpool:
+    """
+    A local, durable, append-only spool of rows waiting to be written to MySQL.
+
+    Rows are stored in insertion order with an autoincrement id, so they can be read back
+    in large ordered batches and deleted once they are committed in MySQL.
+
+    Args:
+        path (str): The SQLite file used as spool.
+
+    Example:
+        async with SQLiteSpool("mysql_spool.sqlite3") as spool:
+            await spool.append([("employees", variables, datetime.now())])
+            batch = await spool.read_batch(1000)
+            await spool.delete_up_to(batch[-1][0])
+    """
+
+    def __init__(self, path: str = "mysql_spool.sqlite3") -> None:
+        """
+        Initialize a new instance of SQLiteSpool.
+
+        Args:
+            path (str): The SQLite file used as spool.
+        """
+        self.path = path
+        self.db = None
+
+    async def __aenter__(self):
+        """
+        Open the spool when entering an asynchronous context.
+
+        Returns:
+            self: The instance of the object.
+        """
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Close the spool when exiting an asynchronous context.
+        """
+        await self.close()
+
+    async def open(self) -> None:
+        """
+        Open the SQLite file and create the spool table if needed.
+        """
+        self.db = await aiosqlite.connect(self.path)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.execute(
+            "CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "table_name TEXT NOT NULL, variables TEXT NOT NULL, created TEXT NOT NULL)"
+        )
+        await self.db.execute(
+            "CREATE TABLE IF NOT EXISTS quarantine (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "table_name TEXT NOT NULL, variables TEXT NOT NULL, created TEXT NOT NULL, "
+            "error TEXT NOT NULL)"
+        )
+        await self.db.commit()
+
+    async def close(self) -> None:
+        """
+        Close the SQLite file.
+        """
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
+
+    async def append(self, items: list) -> None:
+        """
+        Append rows to the spool in one transaction.
+
+        Args:
+            items (list): A list of (db_name, variables, created) tuples.
+        """
+        await self.db.executemany(
+            "INSERT INTO spool (table_name, variables, created) VALUES (?, ?, ?)",
+            [
+                (
+                    db_name,
+                    json.dumps(variables, default=_encode_value),
+                    created.isoformat(),
+                )
+                for db_name, variables, created in items
+            ],
+        )
+        await self.db.commit()
+
+    async def quarantine(self, items: list) -> None:
+        """
+        Keep rows rejected by MySQL with a permanent error (e.g. an unknown column) for inspection.
+
+        The quarantined rows are never replayed, so they cannot block the spool.
+
+        Args:
+            items (list): A list of (db_name, variables, created, error) tuples.
+        """
+        await self.db.executemany(
+            "INSERT INTO quarantine (table_name, variables, created, error) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    db_name,
+                    json.dumps(variables, default=_encode_value),
+                    created.isoformat(),
+                    str(error),
+                )
+                for db_name, variables, created, error in items
+            ],
+        )
+        await self.db.commit()
+
+    async def read_batch(self, limit: int) -> list:
+        """
+        Read the oldest rows of the spool.
+
+        Args:
+            limit (int): The maximum number of rows to read.
+
+        Returns:
+            list: A list of (id, (db_name, variables, created)) tuples, oldest first.
+        """
+        async with self.db.execute(
+            "SELECT id, table_name, variables, created FROM spool ORDER BY id LIMIT ?",
+            (limit,),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [
+            (
+                row_id,
+                (
+                    db_name,
+                    json.loads(variables, object_hook=_decode_value),
+                    datetime.fromisoformat(created),
+                ),
+            )
+            for row_id, db_name, variables, created in rows
+        ]
+
+    async def delete_up_to(self, row_id: int) -> None:
+        """
+        Delete all the rows with an id lower than or equal to "row_id".
+
+        Args:
+            row_id (int): The id of the last row written to MySQL.
+        """
+        await self.db.execute("DELETE FROM spool WHERE id <= ?", (row_id,))
+        await self.db.commit()
+
+    async def get_last_created(self, db_name: str):
+        """
+        Get the time of the newest row of a table waiting in the spool.
+
+        Args:
+            db_name (str): The name of the table.
+
+        Returns:
+            datetime: The newest "created" of the table, or None if the spool has no row of it.
+        """
+        async with self.db.execute(
+            "SELECT MAX(created) FROM spool WHERE table_name = ?", (db_name,)
+        ) as cursor:
+            (created,) = await cursor.fetchone()
+        return datetime.fromisoformat(created) if created is not None else None
+
+    async def count(self) -> int:
+        """
+        Count the rows waiting in the spool.
+
+        Returns:
+            int: The number of rows in the spool.
+        """
+        async with self.db.execute("SELECT COUNT(*) FROM spool") as cursor:
+            (rows,) = await cursor.fetchone()
+        return rows
@@ -1,5 +1,60 @@
 """MyOPCUA class to control communication with OPCUA Server"""
-from asyncua import Client
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from asyncua import Client, ua
+from my_metrics.metrics import metrics
+from my_opcua.node_cache import NodeCache
+from my_opcua.subscription_handler import DataChangeHandler, ModelChangeHandler
+from my_processing.array_codec import encode_array, get_element_type
+from my_processing.columnar_buffer import TagIndex
+
+# Chunk size used when the server does not advertise MaxNodesPerRead (0 means "no limit",
+# but very large requests may still exceed the negotiated message size)
+DEFAULT_MAX_NODES_PER_READ = 500
+DEFAULT_MAX_NODES_PER_BROWSE = 500
+DEFAULT_MAX_NODES_PER_HISTORY_READ = 100
+DATA_BLOCKS_GLOBAL_NODE_ID = "ns=3;s=DataBlocksGlobal"
+# Column added to the samples with the worst OPC UA status code of the sample (see get_sample_from_db_name)
+STATUS_COLUMN = "status_code"
+# Column types of the OPC UA built-in DataTypes in a ColumnarRingBuffer, the others are "object"
+COLUMN_DTYPES = {
+    "i=1": "bool",
+    **{f"i={type_id}": "int64" for type_id in range(2, 10)},  # SByte .. UInt64
+    "i=10": "float64",
+    "i=11": "float64",
+}
+# Per-variable status codes meaning that the cached node ids are outdated
+NODE_ID_ERRORS = (ua.StatusCodes.BadNodeIdUnknown, ua.StatusCodes.BadNodeIdInvalid)
+# Status codes of the bounding values of a HistoryRead when the server has no value at a bound
+NO_BOUND_ERRORS = (ua.StatusCodes.BadBoundNotFound, ua.StatusCodes.BadBoundNotSupported)
+# Typed stand-in values of the OPC UA built-in DataTypes, to create the columns of Bad variables
+PLACEHOLDER_VALUES = {
+    "i=1": False,
+    **{f"i={type_id}": 0 for type_id in range(2, 10)},  # SByte .. UInt64
+    "i=10": 0.0,
+    "i=11": 0.0,
+}
+
+
+def to_naive_utc(timestamp: datetime) -> datetime:
+    """
+    Convert a timestamp to a naive UTC datetime, as stored in the DATETIME(6) columns.
+
+    asyncua returns naive datetimes in UTC, but an aware datetime is converted as well.
+
+    Args:
+        timestamp (datetime): The timestamp to convert.
+
+    Returns:
+        datetime: The timestamp in UTC without tzinfo.
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class MyOPCUA:
@@ -8,19 +63,43 @@ class MyOPCUA:
 
     Args:
         url (str): The URL of the OPC UA server to connect to.
+        cache_path (str): JSON file where the resolved data blocks are persisted between runs.
+            None keeps the cache in memory only.
+        pack_arrays (bool): Keep numeric arrays as one packed little-endian binary value
+            (see array_codec) instead of one entry per element.
 
     Example:
-        client = MyOPCUA("opc.tcp://localhost:4840")
+        client = MyOPCUA("opc.tcp://localhost:4840", cache_path="node_cache.json")
     """
 
-    def __init__(self, url: str) -> None:
+    def __init__(
+        self, url: str, cache_path: str = None, pack_arrays: bool = False
+    ) -> None:
         """
         Initialize a new instance of MyOPCUA.
 
         Args:
             url (str): The URL of the OPC UA server to connect to.
+            cache_path (str): JSON file where the resolved data blocks are persisted between runs.
+            pack_arrays (bool): Keep numeric arrays as one packed binary value.
         """
+        self.url = url
         self.client = Client(url)
+        self.pack_arrays = pack_arrays
+        self.node_cache = NodeCache(cache_path)
+        self._operation_limits = {}
+        self._subscriptions = []
+        self._subscription_specs = []  # subscribe_db_name arguments, to recreate them on reconnect
+        self._tag_indexes = {}  # db_name (lower case) -> (variables of the node cache, TagIndex)
+        self._watchdog = None
+        self._reconnect_callbacks = []
+        self.connected = False
+        self.disconnected_since = None
+        self.reconnects = 0
+        self.failed_reconnects = 0
+        self.last_downtime = 0.0
+        self.max_downtime = 0.0
+        self.total_downtime = 0.0
 
     async def __aenter__(self):
         """
@@ -39,6 +118,11 @@ class MyOPCUA:
             Any exceptions that may occur during the connection process.
         """
         await self.client.connect()
+        self.connected = True
+        metrics.register_callback(
+            "opcua_connected", lambda: int(self.connected), endpoint=self.url
+        )
+        await self.validate_node_cache()
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
@@ -63,8 +147,172 @@ class MyOPCUA:
         Raises:
             Any exceptions that may occur during the disconnection or cleanup process.
         """
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        await self.unsubscribe_all()
+        self.node_cache.save()
+        self.connected = False
         await self.client.disconnect()
 
+    def start_watchdog(
+        self,
+        interval: float = 1.0,
+        timeout: float = 2.0,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        """
+        Monitor the session with keepalives and reconnect automatically when it is lost.
+
+        Every "interval" seconds the state of the server is read; when the read fails or takes more
+        than "timeout" seconds, the session is considered lost. While disconnected, reads fail at once
+        with ConnectionError instead of waiting for the request timeout. The reconnection is retried
+        with an exponential backoff from "min_backoff" to "max_backoff" seconds. Once reconnected,
+        the node cache and operation limits are reused (no browse of the server, unless its namespaces
+        changed), the subscriptions of subscribe_db_name are created again and the reconnect
+        callbacks are called (see add_reconnect_callback).
+
+        Args:
+            interval (float): The time in seconds between two keepalives.
+            timeout (float): The time in seconds after which a keepalive or connection attempt fails.
+            min_backoff (float): The delay in seconds before the second connection attempt.
+            max_backoff (float): The maximum delay in seconds between two connection attempts.
+
+        Example:
+            async with MyOPCUA("opc.tcp://localhost:4840") as my_opcua:
+                my_opcua.start_watchdog()
+        """
+        if self._watchdog is None:
+            self._watchdog = asyncio.create_task(
+                self._watch_session(interval, timeout, min_backoff, max_backoff)
+            )
+
+    def add_reconnect_callback(self, callback) -> None:
+        """
+        Register a function or coroutine function called after every automatic reconnection.
+
+        Args:
+            callback: Called with the times (naive UTC) when the session was lost and recovered,
+                e.g. to backfill the gap from the history of the server.
+        """
+        self._reconnect_callbacks.append(callback)
+
+    def get_connection_stats(self) -> dict:
+        """
+        Get the statistics of the session.
+
+        Returns:
+            dict: Whether the session is connected, since when it is disconnected (naive UTC, or None),
+            the number of reconnections and failed connection attempts, and the last, maximum and
+            total downtime in seconds.
+        """
+        return {
+            "connected": self.connected,
+            "disconnected_since": self.disconnected_since,
+            "reconnects": self.reconnects,
+            "failed_reconnects": self.failed_reconnects,
+            "last_downtime": self.last_downtime,
+            "max_downtime": self.max_downtime,
+            "total_downtime": self.total_downtime,
+        }
+
+    async def _watch_session(
+        self, interval: float, timeout: float, min_backoff: float, max_backoff: float
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.client.check_connection()
+                await asyncio.wait_for(
+                    self.client.nodes.server_state.read_value(), timeout
+                )
+                continue
+            except Exception as err:
+                print(f"Connection with the OPCUA-Server {self.url} lost: {err!r}")
+            await self._reconnect(timeout, min_backoff, max_backoff)
+
+    async def _reconnect(
+        self, timeout: float, min_backoff: float, max_backoff: float
+    ) -> None:
+        self.connected = False
+        self.disconnected_since = to_naive_utc(datetime.now(timezone.utc))
+        lost = time.monotonic()
+        for _, task in self._subscriptions:
+            if task is not None:
+                task.cancel()
+        self._subscriptions = []  # they died with the session
+        try:
+            await asyncio.wait_for(self.client.disconnect(), timeout)
+        except Exception:
+            pass  # the old session is gone anyway
+        backoff = min_backoff
+        while True:
+            self.client = Client(self.url)
+            try:
+                await asyncio.wait_for(self.client.connect(), timeout)
+                self.connected = True
+                await self.validate_node_cache()
+                break
+            except Exception as err:
+                self.connected = False
+                self.failed_reconnects += 1
+                print(f"Reconnection with {self.url} failed, retrying in {backoff} s: {err!r}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+        specs = self._subscription_specs
+        self._subscription_specs = []
+        for spec in specs:
+            try:
+                await self.subscribe_db_name(**spec)
+            except Exception as err:
+                print(f"Error subscribing again to {spec['db_name']}: {err}")
+        self.last_downtime = time.monotonic() - lost
+        self.max_downtime = max(self.max_downtime, self.last_downtime)
+        self.total_downtime += self.last_downtime
+        self.reconnects += 1
+        metrics.inc("opcua_reconnects_total", endpoint=self.url)
+        metrics.observe("opcua_downtime_seconds", self.last_downtime, endpoint=self.url)
+        disconnected_since = self.disconnected_since
+        self.disconnected_since = None
+        print(
+            f"Reconnected with the OPCUA-Server {self.url} after {self.last_downtime:.3f} s"
+        )
+        reconnected_at = to_naive_utc(datetime.now(timezone.utc))
+        for callback in self._reconnect_callbacks:
+            try:
+                result = callback(disconnected_since, reconnected_at)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as err:
+                print(f"Error in reconnect callback: {err}")
+
+    async def validate_node_cache(self) -> bool:
+        """
+        Check the node cache against the server and watch the server for model changes.
+
+        The NamespaceArray of the server is used as fingerprint of the address space. While connected,
+        GeneralModelChangeEvents of the server (if supported) clear the cache.
+
+        Returns:
+            bool: True if the cached node tree is still valid, False if it was cleared.
+        """
+        namespace_array = await self.client.get_namespace_array()
+        valid = self.node_cache.validate(
+            {"url": self.client.server_url.geturl(), "namespaces": namespace_array}
+        )
+        try:
+            subscription = await self.client.create_subscription(
+                1000, ModelChangeHandler(self.node_cache)
+            )
+            await subscription.subscribe_events(
+                self.client.nodes.server, ua.ObjectIds.GeneralModelChangeEventType
+            )
+            self._subscriptions.append((subscription, None))
+        except Exception as err:
+            print(f"Model change events not available: {err}")
+        return valid
+
     async def get_input_value(self, node_id: str) -> dict:
         """
         Get the input values of a specified node and return them as a dictionary.
@@ -86,28 +334,169 @@ class MyOPCUA:
             #   "pressure[2]": 7.89
             # }
         """
-        dict_temp = {}
         client_node = self.client.get_node(node_id)  # Get the node
         client_node_value = await client_node.get_value()  # Read the node value
-        client_node_name = str(await client_node.read_display_name())[
-            33:-2
-        ]  # Read the node name
-        if isinstance(client_node_value, list):
-            for index, value in enumerate(client_node_value):
-                dict_temp.update(
-                    {
-                        f"{client_node_name}[{index}]": value
-                        if not isinstance(value, float)
-                        else round(value, 2)
-                    }
+        client_node_name = (await client_node.read_display_name()).Text  # Read the node name
+        return self.format_variable(client_node_name, client_node_value)
+
+    @staticmethod
+    def format_variable(name: str, value, element_type: str = None) -> dict:
+        """
+        Convert a variable name and its value into the dictionary layout used for the MySQL table.
+
+        Arrays are exploded into one entry per element and float values are rounded to 2 decimals.
+        If "element_type" is given, an array is kept as one entry with its elements packed as
+        little-endian binary (see array_codec.encode_array).
+
+        Args:
+            name (str): The display name of the variable.
+            value: The value read from the OPC UA server.
+            element_type (str): The packed element type of an array, e.g. "<f4".
+
+        Returns:
+            dict: A dictionary where keys are variable names and values are the corresponding values.
+
+        Example:
+            MyOPCUA.format_variable("pressure", [1.234, 4.567])
+            # Output:
+            # {
+            #   "pressure[0]": 1.23,
+            #   "pressure[1]": 4.57
+            # }
+        """
+        if isinstance(value, list) and element_type is not None:
+            return {name: encode_array(value, element_type)}
+        if isinstance(value, list):
+            dict_temp = {}
+            for index, element in enumerate(value):
+                dict_temp[f"{name}[{index}]"] = (
+                    element if not isinstance(element, float) else round(element, 2)
                 )
             return dict_temp
-        else:
-            return {
-                f"{client_node_name}": client_node_value
-                if not isinstance(client_node_value, float)
-                else round(client_node_value, 2)
-            }
+        return {name: value if not isinstance(value, float) else round(value, 2)}
+
+    async def get_max_nodes_per_read(self) -> int:
+        """
+        Get the maximum number of nodes allowed in a single Read service call.
+
+        The value is read once from the server's OperationLimits and cached. If the server does not
+        advertise a limit, DEFAULT_MAX_NODES_PER_READ is used.
+
+        Returns:
+            int: The maximum number of nodes to send in one Read request.
+        """
+        return await self._get_operation_limit(
+            ua.ObjectIds.Server_ServerCapabilities_OperationLimits_MaxNodesPerRead,
+            DEFAULT_MAX_NODES_PER_READ,
+        )
+
+    async def get_max_nodes_per_browse(self) -> int:
+        """
+        Get the maximum number of nodes allowed in a single Browse service call.
+
+        The value is read once from the server's OperationLimits and cached. If the server does not
+        advertise a limit, DEFAULT_MAX_NODES_PER_BROWSE is used.
+
+        Returns:
+            int: The maximum number of nodes to send in one Browse request.
+        """
+        return await self._get_operation_limit(
+            ua.ObjectIds.Server_ServerCapabilities_OperationLimits_MaxNodesPerBrowse,
+            DEFAULT_MAX_NODES_PER_BROWSE,
+        )
+
+    async def get_max_nodes_per_history_read(self) -> int:
+        """
+        Get the maximum number of nodes allowed in a single HistoryRead (raw data) service call.
+
+        The value is read once from the server's OperationLimits and cached. If the server does not
+        advertise a limit, DEFAULT_MAX_NODES_PER_HISTORY_READ is used.
+
+        Returns:
+            int: The maximum number of nodes to send in one HistoryRead request.
+        """
+        return await self._get_operation_limit(
+            ua.ObjectIds.Server_ServerCapabilities_OperationLimits_MaxNodesPerHistoryReadData,
+            DEFAULT_MAX_NODES_PER_HISTORY_READ,
+        )
+
+    async def _get_operation_limit(self, object_id: int, default: int) -> int:
+        if object_id not in self._operation_limits:
+            try:
+                limit = await self.client.get_node(ua.NodeId(object_id)).read_value()
+            except Exception:
+                limit = 0
+            self._operation_limits[object_id] = (
+                int(limit) if limit and int(limit) > 0 else default
+            )
+        return self._operation_limits[object_id]
+
+    async def read_attributes(
+        self, nodes: list, attribute_id: int = ua.AttributeIds.Value
+    ) -> list:
+        """
+        Read one attribute of many nodes using as few Read service calls as possible.
+
+        The nodes are split in chunks of at most MaxNodesPerRead nodes, so each chunk is
+        a single round trip to the server.
+
+        Args:
+            nodes (list): The nodes (Node objects, NodeId objects or node id strings) to read.
+            attribute_id (int): The attribute to read. Defaults to the Value attribute.
+
+        Returns:
+            list: A list of ua.DataValue objects, in the same order as "nodes". Value reads carry
+            the source and server timestamps.
+
+        Example:
+            data_values = await my_opcua.read_attributes(variables)
+            values = [data_value.Value.Value for data_value in data_values]
+        """
+        if self._watchdog is not None and not self.connected:
+            raise ConnectionError(f"Not connected with the OPCUA-Server {self.url}")
+        node_ids = [self.client.get_node(node).nodeid for node in nodes]
+        chunk_size = await self.get_max_nodes_per_read()
+        data_values = []
+        for start in range(0, len(node_ids), chunk_size):
+            params = ua.ReadParameters()
+            if attribute_id == ua.AttributeIds.Value:
+                params.TimestampsToReturn = ua.TimestampsToReturn.Both
+            else:
+                params.TimestampsToReturn = ua.TimestampsToReturn.Neither
+            for node_id in node_ids[start : start + chunk_size]:
+                read_value_id = ua.ReadValueId()
+                read_value_id.NodeId = node_id
+                read_value_id.AttributeId = attribute_id
+                params.NodesToRead.append(read_value_id)
+            with metrics.timer("opcua_read_seconds", endpoint=self.url):
+                data_values.extend(await self.client.uaclient.read(params))
+        metrics.inc("opcua_read_nodes_total", len(node_ids), endpoint=self.url)
+        return data_values
+
+    async def get_values_from_nodes(self, nodes: list) -> dict:
+        """
+        Read the values and names of many variables with batched Read requests.
+
+        Args:
+            nodes (list): The variable nodes to read.
+
+        Returns:
+            dict: A dictionary with the same layout as get_input_value, for all the nodes.
+
+        Raises:
+            ua.UaStatusCodeError: If the server returns a bad status for any of the variables.
+        """
+        var_dict = {}
+        if not nodes:
+            return var_dict
+        data_values = await self.read_attributes(nodes, ua.AttributeIds.Value)
+        names = await self.read_attributes(nodes, ua.AttributeIds.DisplayName)
+        for name, data_value in zip(names, data_values):
+            data_value.StatusCode.check()
+            var_dict.update(
+                self.format_variable(name.Value.Value.Text, data_value.Value.Value)
+            )
+        return var_dict
 
     async def get_specific_db_node_id(self, db_name: str) -> str:
         """
@@ -127,13 +516,341 @@ class MyOPCUA:
             # Output (if the database does not exist):
             # ""
         """
-        data_block_global = self.client.get_node("ns=3;s=DataBlocksGlobal")
-        databases = await data_block_global.get_children()
-        for database in databases:
-            if str(await database.read_display_name())[33:-2].lower() == db_name.lower():
-                return str(database)
+        for database_name, database_node_id in (await self.get_databases()).items():
+            if database_name.lower() == db_name.lower():
+                return database_node_id
         return ""
 
+    async def get_databases(self) -> dict:
+        """
+        Get the data blocks of the global data blocks folder, using the node cache.
+
+        Returns:
+            dict: A dictionary mapping data block names to their node ids.
+        """
+        if not self.node_cache.databases:
+            references = (await self.browse_nodes([DATA_BLOCKS_GLOBAL_NODE_ID]))[0]
+            self.node_cache.set_databases(
+                {
+                    reference.DisplayName.Text: reference.NodeId.to_string()
+                    for reference in references
+                }
+            )
+            self.node_cache.save()
+        return self.node_cache.databases
+
+    async def get_db_variables(self, db_name: str) -> list:
+        """
+        Get the variables of a specific database node by its name, using the node cache.
+
+        Only the first call for a database browses the server; the node ids, names, data types and
+        array dimensions of its variables are then kept in the node cache.
+
+        Args:
+            db_name (str): The name of the database node.
+
+        Returns:
+            list: A list of {"node_id", "name", "data_type", "array_dimensions"} dictionaries,
+            or an empty list if not found.
+        """
+        variables = self.node_cache.get_variables(db_name)
+        if variables is not None:
+            return variables
+        db_node_id = await self.get_specific_db_node_id(db_name)
+        if db_node_id == "":
+            return []
+        return (await self.discover_variables({db_name: db_node_id}))[db_name]
+
+    async def discover_data_blocks(self) -> dict:
+        """
+        Enumerate all the data blocks of the PLC and their variables in a handful of requests.
+
+        The global data blocks folder is browsed with one request, then all the data blocks are
+        browsed together with multi-node Browse requests, and the DataType and ArrayDimensions of
+        all the variables are read with batched Read requests. The result is stored in the node cache.
+
+        Returns:
+            dict: A dictionary mapping data block names to their list of variable dictionaries.
+
+        Example:
+            data_blocks = await my_opcua.discover_data_blocks()
+            for db_name, variables in data_blocks.items():
+                print(f"{db_name}: {len(variables)} variables")
+        """
+        self.node_cache.set_databases({})
+        databases = await self.get_databases()
+        return await self.discover_variables(
+            {name: node_id for name, node_id in databases.items() if name != "Icon"}
+        )
+
+    async def discover_variables(self, databases: dict) -> dict:
+        """
+        Browse the variables of many data blocks at once and store them in the node cache.
+
+        Args:
+            databases (dict): A dictionary mapping data block names to their node ids.
+
+        Returns:
+            dict: A dictionary mapping data block names to their list of variable dictionaries.
+        """
+        names = list(databases)
+        references = await self.browse_nodes(
+            [databases[name] for name in names], ua.NodeClass.Variable
+        )
+        all_node_ids = [
+            reference.NodeId for db_references in references for reference in db_references
+        ]
+        data_types = await self.read_attributes(all_node_ids, ua.AttributeIds.DataType)
+        array_dimensions = await self.read_attributes(
+            all_node_ids, ua.AttributeIds.ArrayDimensions
+        )
+        discovered = {}
+        index = 0
+        for name, db_references in zip(names, references):
+            variables = []
+            for reference in db_references:
+                variables.append(
+                    {
+                        "node_id": reference.NodeId.to_string(),
+                        "name": reference.DisplayName.Text,
+                        "data_type": data_types[index].Value.Value.to_string(),
+                        "array_dimensions": array_dimensions[index].Value.Value,
+                    }
+                )
+                index += 1
+            self.node_cache.set_variables(name, variables)
+            discovered[name] = variables
+        self.node_cache.save()
+        return discovered
+
+    async def browse_nodes(
+        self, node_ids: list, node_class_mask: int = ua.NodeClass.Unspecified
+    ) -> list:
+        """
+        Browse the hierarchical children of many nodes with multi-node Browse requests.
+
+        The nodes are split in chunks of at most MaxNodesPerBrowse nodes. BrowseName, DisplayName and
+        NodeClass are returned inline (result mask All), and BrowseNext is used with the continuation
+        points until every node is completely browsed.
+
+        Args:
+            node_ids (list): The nodes (Node objects, NodeId objects or node id strings) to browse.
+            node_class_mask (int): The node classes to return. Defaults to all node classes.
+
+        Returns:
+            list: A list with the ua.ReferenceDescription list of each node, in the same order as "node_ids".
+        """
+        node_ids = [self.client.get_node(node_id).nodeid for node_id in node_ids]
+        chunk_size = await self.get_max_nodes_per_browse()
+        references = []
+        for start in range(0, len(node_ids), chunk_size):
+            params = ua.BrowseParameters()
+            for node_id in node_ids[start : start + chunk_size]:
+                description = ua.BrowseDescription()
+                description.NodeId = node_id
+                description.BrowseDirection = ua.BrowseDirection.Forward
+                description.ReferenceTypeId = ua.NodeId(
+                    ua.ObjectIds.HierarchicalReferences
+                )
+                description.IncludeSubtypes = True
+                description.NodeClassMask = node_class_mask
+                description.ResultMask = ua.BrowseResultMask.All
+                params.NodesToBrowse.append(description)
+            with metrics.timer("opcua_browse_seconds", endpoint=self.url):
+                results = await self.client.uaclient.browse(params)
+            chunk_references = []
+            pending = {}  # continuation point -> index in chunk_references
+            for result in results:
+                result.StatusCode.check()
+                chunk_references.append(list(result.References))
+                if result.ContinuationPoint:
+                    pending[result.ContinuationPoint] = len(chunk_references) - 1
+            while pending:
+                next_params = ua.BrowseNextParameters()
+                next_params.ReleaseContinuationPoints = False
+                next_params.ContinuationPoints = list(pending)
+                with metrics.timer("opcua_browse_seconds", endpoint=self.url):
+                    next_results = await self.client.uaclient.browse_next(next_params)
+                next_pending = {}
+                for continuation_point, result in zip(pending, next_results):
+                    result.StatusCode.check()
+                    index = pending[continuation_point]
+                    chunk_references[index].extend(result.References)
+                    if result.ContinuationPoint:
+                        next_pending[result.ContinuationPoint] = index
+                pending = next_pending
+            references.extend(chunk_references)
+        return references
+
+    async def read_raw_history(
+        self,
+        nodes: list,
+        start: datetime,
+        end: datetime,
+        max_values_per_node: int = 1000,
+    ) -> list:
+        """
+        Read the raw history of many nodes using as few HistoryRead service calls as possible.
+
+        The nodes are split in chunks of at most MaxNodesPerHistoryReadData nodes, and every request
+        returns at most "max_values_per_node" values per node; the continuation points are followed
+        until the whole interval is read. The bounding values (the last value before "start" and the
+        first one after "end") are included. Nodes without history on the server are returned
+        with an empty history.
+
+        Args:
+            nodes (list): The nodes (Node objects, NodeId objects or node id strings) to read.
+            start (datetime): The start of the interval (naive datetimes are UTC).
+            end (datetime): The end of the interval (naive datetimes are UTC).
+            max_values_per_node (int): The maximum number of values per node in one request.
+
+        Returns:
+            list: A list with the ua.DataValue objects of every node, in the same order as "nodes".
+
+        Example:
+            histories = await my_opcua.read_raw_history(variables, start, datetime.utcnow())
+        """
+        node_ids = [self.client.get_node(node).nodeid for node in nodes]
+        chunk_size = await self.get_max_nodes_per_history_read()
+        details = ua.ReadRawModifiedDetails()
+        details.IsReadModified = False
+        details.StartTime = start
+        details.EndTime = end
+        details.NumValuesPerNode = max_values_per_node
+        details.ReturnBounds = True
+        histories = [[] for _ in node_ids]
+        for chunk_start in range(0, len(node_ids), chunk_size):
+            # node index -> continuation point of the nodes still to read
+            pending = dict.fromkeys(
+                range(chunk_start, min(chunk_start + chunk_size, len(node_ids)))
+            )
+            while pending:
+                params = ua.HistoryReadParameters()
+                params.HistoryReadDetails = details
+                params.TimestampsToReturn = ua.TimestampsToReturn.Both
+                params.ReleaseContinuationPoints = False
+                for index, continuation_point in pending.items():
+                    value_id = ua.HistoryReadValueId()
+                    value_id.NodeId = node_ids[index]
+                    value_id.IndexRange = ""
+                    value_id.ContinuationPoint = continuation_point
+                    params.NodesToRead.append(value_id)
+                with metrics.timer("opcua_history_read_seconds", endpoint=self.url):
+                    results = await self.client.uaclient.history_read(params)
+                requested = list(pending)
+                pending = {}
+                for index, result in zip(requested, results):
+                    if result.StatusCode.is_bad():
+                        continue  # e.g. BadHistoryOperationUnsupported: the node is not historized
+                    if result.HistoryData is not None:
+                        histories[index].extend(result.HistoryData.DataValues)
+                    if result.ContinuationPoint:
+                        pending[index] = result.ContinuationPoint
+        return histories
+
+    async def backfill_db_name(
+        self,
+        db_name: str,
+        start: datetime,
+        end: datetime,
+        callback,
+        chunk_length: float = 600.0,
+        max_values_per_node: int = 1000,
+        min_request_interval: float = 0.5,
+        semaphore: asyncio.Semaphore = None,
+        bad_quality: str = "flag",
+    ) -> int:
+        """
+        Rebuild the samples of a database between two times from the history of the server.
+
+        The interval is read in chunks of "chunk_length" seconds (see read_raw_history), so the memory
+        used does not depend on the length of the gap. The histories of all the variables are merged in
+        time order: every timestamp where at least one variable changed gives one sample, with the
+        other variables holding their previous value, in the layout of get_sample_from_db_name.
+        The samples of every chunk are passed at once to the callback, so they can go through a bulk
+        insert path. At most one chunk is requested every "min_request_interval" seconds, and every
+        request holds "semaphore", so the backfill can run next to the live acquisition of the server.
+
+        Args:
+            db_name (str): The name of the database node.
+            start (datetime): The first time to backfill (naive UTC, included).
+            end (datetime): The end of the gap (naive UTC, excluded), e.g. the time of the first live sample.
+            callback: A function or coroutine function called with a list of (values, source_timestamp)
+                tuples per chunk.
+            chunk_length (float): The length in seconds of the interval read per chunk.
+            max_values_per_node (int): The maximum number of values per node in one HistoryRead request.
+            min_request_interval (float): The minimum time in seconds between two chunks.
+            semaphore (asyncio.Semaphore): A semaphore shared with the live reads of the server.
+            bad_quality (str): "flag" or "drop", see get_sample_from_db_name.
+
+        Returns:
+            int: The number of samples passed to the callback.
+
+        Example:
+            async def save(rows):
+                await writer.put_history("MyDatabase", rows)
+
+            await my_opcua.backfill_db_name("MyDatabase", last_stored, first_live, save)
+        """
+        variables = await self.get_db_variables(db_name)
+        if not variables:
+            return 0
+        semaphore = semaphore if semaphore is not None else asyncio.Semaphore(1)
+        node_ids = [variable["node_id"] for variable in variables]
+        state = [None] * len(variables)  # last DataValue of every variable
+        samples = 0
+        chunk_start = start
+        while chunk_start < end:
+            request_time = time.monotonic()
+            chunk_end = min(chunk_start + timedelta(seconds=chunk_length), end)
+            async with semaphore:
+                histories = await self.read_raw_history(
+                    node_ids, chunk_start, chunk_end, max_values_per_node
+                )
+            entries = heapq.merge(
+                *(
+                    self._get_history_entries(index, history)
+                    for index, history in enumerate(histories)
+                ),
+                key=lambda entry: entry[0],
+            )
+            rows = []
+            for timestamp, group in itertools.groupby(entries, key=lambda entry: entry[0]):
+                for _, index, data_value in group:
+                    state[index] = data_value
+                if not chunk_start <= timestamp < chunk_end:
+                    continue  # bounding values only set the state
+                known = [
+                    index for index, data_value in enumerate(state) if data_value is not None
+                ]
+                values, created, _ = self._format_sample(
+                    [variables[index] for index in known],
+                    [state[index] for index in known],
+                    bad_quality,
+                )
+                if values:
+                    rows.append((values, created))
+            if rows:
+                result = callback(rows)
+                if asyncio.iscoroutine(result):
+                    await result
+                samples += len(rows)
+            chunk_start = chunk_end
+            await asyncio.sleep(
+                max(0.0, min_request_interval - (time.monotonic() - request_time))
+            )
+        return samples
+
+    @staticmethod
+    def _get_history_entries(index: int, history: list) -> list:
+        entries = []
+        for data_value in history:
+            timestamp = data_value.SourceTimestamp or data_value.ServerTimestamp
+            if timestamp is None or data_value.StatusCode.value in NO_BOUND_ERRORS:
+                continue
+            entries.append((to_naive_utc(timestamp), index, data_value))
+        return entries
+
     async def get_values_from_db_name(self, db_name: str) -> dict:
         """
         Get all input values from variables within a specific database node and return them as a dictionary.
@@ -157,15 +874,335 @@ class MyOPCUA:
             # Output (if no variables with input values are found):
             # {}
         """
+        variables, data_values = await self._read_db_data_values(db_name)
+        return self._format_sample(variables, data_values, "raise")[0]
+
+    async def get_db_columns(self, db_name: str) -> dict:
+        """
+        Get the columns of the table of a database: every variable, whatever its current quality.
+
+        The variables with a Bad status code are left out of the samples (bad_quality="flag"), so a
+        table created from a sample would miss them; here they get a stand-in value of their
+        DataType (and ArrayDimensions), so create_table gives them a column of the right type.
+
+        Args:
+            db_name (str): The name of the database node.
+
+        Returns:
+            dict: A dictionary mapping every column of the samples of the database, STATUS_COLUMN
+            included, to an example value, to be passed to MySQL.create_table.
+
+        Example:
+            await writer.create_table("MyDatabase", await my_opcua.get_db_columns("MyDatabase"))
+        """
+        variables, data_values = await self._read_db_data_values(db_name)
+        columns = {}
+        for variable, data_value in zip(variables, data_values):
+            value = data_value.Value.Value
+            if data_value.StatusCode.is_bad() or value is None:
+                value = PLACEHOLDER_VALUES.get(variable["data_type"], "")
+                dimensions = variable.get("array_dimensions")
+                if dimensions:
+                    value = [value] * math.prod(dimensions)
+            columns.update(
+                self.format_variable(variable["name"], value, self._get_packed_type(variable))
+            )
+        if columns:
+            columns[STATUS_COLUMN] = ua.StatusCode().name
+        return columns
+
+    async def get_sample_from_db_name(
+        self, db_name: str, bad_quality: str = "flag"
+    ) -> tuple:
+        """
+        Read all the variables of a database as one sample with its time and quality.
+
+        The time of the sample is the time of the read, in UTC (taken when the values are received:
+        servers do not all stamp every Read with a new server timestamp). So every poll gets its own
+        time, even when no value changed (the heartbeat of the change filter and the rollup windows follow it);
+        the source timestamps of the variables are returned by get_timestamped_sample_from_db_name.
+        The worst status code of the variables is added to the values as STATUS_COLUMN ("Good",
+        "UncertainLastUsableValue", "BadSensorFailure", ...).
+
+        Args:
+            db_name (str): The name of the database node to retrieve.
+            bad_quality (str): What to do with variables with a Bad status code:
+                - "flag": leave them out of the sample (stored as NULL) and keep the sample.
+                - "drop": drop the whole sample (the values are an empty dictionary).
+                - "raise": raise ua.UaStatusCodeError, as get_values_from_db_name does (no STATUS_COLUMN).
+
+        Returns:
+            tuple: A (values, read_timestamp) tuple, where values has the same layout as
+            get_values_from_db_name.
+
+        Example:
+            values, created = await my_opcua.get_sample_from_db_name("MyDatabase")
+            # Output:
+            # ({"Variable1": 123, "Variable2": 45.67, "status_code": "Good"},
+            #  datetime.datetime(2024, 1, 1, 10, 0, 0, 123456))
+        """
+        return (await self.get_timestamped_sample_from_db_name(db_name, bad_quality))[:2]
+
+    async def get_timestamped_sample_from_db_name(
+        self, db_name: str, bad_quality: str = "flag"
+    ) -> tuple:
+        """
+        Read a sample like get_sample_from_db_name, with the source timestamp of every value as well.
+
+        Args:
+            db_name (str): The name of the database node to retrieve.
+            bad_quality (str): "flag", "drop" or "raise", see get_sample_from_db_name.
+
+        Returns:
+            tuple: A (values, read_timestamp, source_timestamps) tuple, where source_timestamps maps
+            every key of values (the elements of the arrays included) to the source timestamp of its
+            variable, e.g. for the long schema (see AsyncMySQLWriter.put).
+        """
+        variables, data_values = await self._read_db_data_values(db_name)
+        read_time = datetime.now(timezone.utc).replace(tzinfo=None)
+        with metrics.timer("opcua_transform_seconds", endpoint=self.url):
+            return self._format_sample(variables, data_values, bad_quality, read_time)
+
+    async def _read_db_data_values(self, db_name: str) -> tuple:
+        for retry in (True, False):
+            variables = await self.get_db_variables(db_name)
+            data_values = await self.read_attributes(
+                [variable["node_id"] for variable in variables]
+            )
+            for data_value in data_values:
+                if data_value.StatusCode.value in NODE_ID_ERRORS:
+                    # The cached node ids are outdated (e.g. the data block was changed in the PLC)
+                    if not retry:
+                        data_value.StatusCode.check()
+                    self.node_cache.invalidate()
+                    break
+            else:
+                return variables, data_values
+        return [], []
+
+    def _format_sample(
+        self, variables: list, data_values: list, bad_quality: str, created: datetime = None
+    ) -> tuple:
         var_dict = {}
-        db_node_id = await self.get_specific_db_node_id(db_name)
-        if db_node_id != "":
-            db_node = self.client.get_node(db_node_id)
-            # db_name = str(await db_node.read_display_name())[33:-2]
-            variables = await db_node.get_children()
-            for variable in variables:
-                var_dict.update(await self.get_input_value(variable))
-        return var_dict
+        source_timestamps = {}
+        worst_status = ua.StatusCode()
+        if created is None:
+            created = self.get_source_timestamp(data_values)
+        if not variables:
+            return var_dict, created, source_timestamps
+        for variable, data_value in zip(variables, data_values):
+            status = data_value.StatusCode
+            if bad_quality == "raise":
+                status.check()
+            if not status.is_good() and (
+                worst_status.is_good() or (status.is_bad() and not worst_status.is_bad())
+            ):
+                worst_status = status
+            if status.is_bad():
+                continue
+            formatted = self.format_variable(
+                variable["name"],
+                data_value.Value.Value,
+                self._get_packed_type(variable),
+            )
+            var_dict.update(formatted)
+            source_timestamp = data_value.SourceTimestamp or data_value.ServerTimestamp
+            source_timestamp = to_naive_utc(source_timestamp) if source_timestamp else created
+            source_timestamps.update(dict.fromkeys(formatted, source_timestamp))
+        if bad_quality == "raise":
+            return var_dict, created, source_timestamps
+        if bad_quality == "drop" and worst_status.is_bad():
+            return {}, created, {}
+        var_dict[STATUS_COLUMN] = worst_status.name
+        return var_dict, created, source_timestamps
+
+    @staticmethod
+    def get_source_timestamp(data_values: list) -> datetime:
+        """
+        Get the time of a sample: the newest source timestamp of its data values.
+
+        The server timestamp is used for the data values without source timestamp, and the current
+        time if there is none at all.
+
+        Args:
+            data_values (list): The ua.DataValue objects of the sample.
+
+        Returns:
+            datetime: The time of the sample, as a naive UTC datetime (as stored in DATETIME(6) columns).
+        """
+        timestamps = [
+            to_naive_utc(timestamp)
+            for timestamp in (
+                data_value.SourceTimestamp or data_value.ServerTimestamp
+                for data_value in data_values
+            )
+            if timestamp is not None
+        ]
+        if not timestamps:
+            return datetime.now(timezone.utc).replace(tzinfo=None)
+        return max(timestamps)
+
+    def _get_packed_type(self, variable: dict):
+        if not self.pack_arrays:
+            return None
+        return get_element_type(variable["data_type"])
+
+    async def get_array_metadata(self, db_name: str) -> dict:
+        """
+        Get the element type and dimensions of the arrays stored packed (pack_arrays=True).
+
+        Args:
+            db_name (str): The name of the database node.
+
+        Returns:
+            dict: A dictionary mapping array names to {"element_type", "dimensions"} dictionaries.
+            It is empty if pack_arrays is False.
+
+        Example:
+            await my_opcua.get_array_metadata("MyDatabase")
+            # Output:
+            # {"pressure": {"element_type": "<f4", "dimensions": [100]}}
+        """
+        if not self.pack_arrays:
+            return {}
+        variables = await self.get_db_variables(db_name)
+        data_values = await self.read_attributes(
+            [variable["node_id"] for variable in variables]
+        )
+        metadata = {}
+        for variable, data_value in zip(variables, data_values):
+            element_type = self._get_packed_type(variable)
+            value = data_value.Value.Value
+            if element_type is not None and isinstance(value, list):
+                metadata[variable["name"]] = {
+                    "element_type": element_type,
+                    "dimensions": variable.get("array_dimensions") or [len(value)],
+                }
+        return metadata
+
+    async def get_tag_index(self, db_name: str) -> TagIndex:
+        """
+        Get the precomputed column layout of a database, for read_into_buffer.
+
+        The array lengths are taken from one read of the values, so the layout matches the dictionaries
+        returned by get_sample_from_db_name: the columns of every variable (with the type of its
+        DataType, see COLUMN_DTYPES), then STATUS_COLUMN. With pack_arrays, the numeric arrays are one
+        packed column each. The layout is computed again when the node cache was invalidated.
+
+        Args:
+            db_name (str): The name of the database node.
+
+        Returns:
+            TagIndex: The column layout of the database.
+        """
+        variables = await self.get_db_variables(db_name)
+        cached = self._tag_indexes.get(db_name.lower())
+        if cached is not None and cached[0] is variables:
+            return cached[1]
+        data_values = await self.read_attributes(
+            [variable["node_id"] for variable in variables]
+        )
+        names, lengths, dtypes = [], [], []
+        for variable, data_value in zip(variables, data_values):
+            value = data_value.Value.Value
+            dimensions = variable.get("array_dimensions")
+            if isinstance(value, list):
+                length = len(value)
+            else:
+                length = math.prod(dimensions) if dimensions else None
+            names.append(variable["name"])
+            if length is not None and self._get_packed_type(variable) is not None:
+                lengths.append(None)  # one packed column
+                dtypes.append("object")
+            else:
+                lengths.append(length)
+                dtypes.append(COLUMN_DTYPES.get(variable["data_type"], "object"))
+        tag_index = TagIndex(
+            [*names, STATUS_COLUMN], [*lengths, None], [*dtypes, "object"]
+        )
+        self._tag_indexes[db_name.lower()] = (variables, tag_index)
+        return tag_index
+
+    async def read_into_buffer(
+        self, db_name: str, buffer, timestamp: datetime = None
+    ) -> bool:
+        """
+        Read all the variables of a database straight into the next row of a ColumnarRingBuffer.
+
+        No dictionary is built: every value is written in the columns precomputed by the TagIndex
+        of the buffer (see get_tag_index), and the worst status code in STATUS_COLUMN. A sample with
+        a Bad variable is not kept (like bad_quality="drop"); the row is only copied into the buffer
+        once all the variables passed the checks, so a rejected sample leaves the buffer unchanged.
+
+        Args:
+            db_name (str): The name of the database node.
+            buffer (ColumnarRingBuffer): The buffer of the database.
+            timestamp (datetime): The time of the sample. Defaults to the time of the read
+                (naive UTC, see get_sample_from_db_name).
+
+        Returns:
+            bool: True if the sample was added to the buffer, False if a variable was Bad.
+
+        Raises:
+            ValueError: If the variables do not match the layout of the buffer any more (e.g. an
+                array was resized): get_tag_index then computes a new layout.
+
+        Example:
+            buffer = ColumnarRingBuffer(await my_opcua.get_tag_index("MyDatabase"))
+            await my_opcua.read_into_buffer("MyDatabase", buffer)
+        """
+        variables = await self.get_db_variables(db_name)
+        data_values = await self.read_attributes(
+            [variable["node_id"] for variable in variables]
+        )
+        if timestamp is None:
+            timestamp = datetime.now(timezone.utc).replace(tzinfo=None)
+        slices = buffer.tag_index.slices
+        if len(data_values) != len(slices) - 1:
+            self._tag_indexes.pop(db_name.lower(), None)
+            raise ValueError(
+                f"{db_name} has {len(data_values)} variables, the buffer {len(slices) - 1}"
+            )
+        row = buffer.next_row()
+        worst_status = ua.StatusCode()
+        for variable, (block, start, length), data_value in zip(variables, slices, data_values):
+            status = data_value.StatusCode
+            if status.is_bad():
+                return False
+            if not status.is_good() and worst_status.is_good():
+                worst_status = status
+            value = data_value.Value.Value
+            packed_type = self._get_packed_type(variable)
+            if length is None and packed_type is not None and isinstance(value, list):
+                value = encode_array(value, packed_type)
+            if length is None and not isinstance(value, list):
+                row[block][start] = value
+            elif length is not None and isinstance(value, list) and len(value) == length:
+                row[block][start : start + length] = value
+            else:
+                self._tag_indexes.pop(db_name.lower(), None)
+                raise ValueError(
+                    f"{variable['name']} of {db_name} does not match the buffer layout"
+                )
+        block, start, _ = slices[-1]
+        row[block][start] = worst_status.name
+        buffer.commit(timestamp)
+        return True
+
+    async def get_db_variable_nodes(self, db_name: str) -> list:
+        """
+        Get the variable nodes of a specific database node by its name.
+
+        Args:
+            db_name (str): The name of the database node.
+
+        Returns:
+            list: A list with the variable nodes of the database, or an empty list if not found.
+        """
+        return [
+            self.client.get_node(variable["node_id"])
+            for variable in await self.get_db_variables(db_name)
+        ]
 
     async def get_values_from_db_node_id(self, db_node_id: str) -> dict:
         """
@@ -195,8 +1232,7 @@ class MyOPCUA:
             db_node = self.client.get_node(db_node_id)
             # db_name = str(db_node.get_browse_name())[16:-1]
             variables = await db_node.get_children()
-            for variable in variables:
-                var_dict.update(await self.get_input_value(variable))
+            var_dict = await self.get_values_from_nodes(variables)
         return var_dict
 
     async def get_list_of_databases(
@@ -221,11 +1257,151 @@ class MyOPCUA:
                 print(f"Database: {database}")
         """
         dbs_list = []
-        data_block_global = self.client.get_node(folder_data_blocks_global_node_id)
-        databases = await data_block_global.get_children()
-        for database in databases:
-            if (
-                database_name := str(await database.read_display_name())[33:-2]
-            ) != "Icon":  # Skip the Icon element
+        if folder_data_blocks_global_node_id == DATA_BLOCKS_GLOBAL_NODE_ID:
+            database_names = list(await self.get_databases())
+        else:
+            references = await self.browse_nodes([folder_data_blocks_global_node_id])
+            database_names = [reference.DisplayName.Text for reference in references[0]]
+        for database_name in database_names:
+            if database_name != "Icon":  # Skip the Icon element
                 dbs_list.append(database_name)
         return dbs_list
+
+    async def subscribe_db_name(
+        self,
+        db_name: str,
+        callback,
+        publishing_interval: float = 500,
+        sampling_interval: float = 100,
+        queue_size: int = 10,
+        deadband_type: str = "",
+        deadband_value: float = 0.0,
+        bad_quality: str = "flag",
+    ):
+        """
+        Create monitored items for every variable of a database and feed the changes into a callback.
+
+        Instead of polling the whole database, the server samples the variables and only publishes
+        the values that changed. All the changes received in one publish cycle are merged into the
+        current snapshot of the database, and the callback is called once with the full snapshot
+        and its source timestamp, as returned by get_sample_from_db_name.
+
+        Args:
+            db_name (str): The name of the database node to subscribe to.
+            callback: A function or coroutine function called with the snapshot dictionary and
+                its source timestamp. It is not called for samples dropped by "bad_quality".
+            publishing_interval (float): The publishing interval of the subscription in milliseconds.
+            sampling_interval (float): The sampling interval of the monitored items in milliseconds.
+            queue_size (int): The queue size of the monitored items on the server.
+            deadband_type (str): "absolute", "percent" or "" (no deadband).
+            deadband_value (float): The deadband applied to numeric variables.
+            bad_quality (str): "flag" or "drop", see get_sample_from_db_name.
+
+        Returns:
+            Subscription: The asyncua subscription, or None if the database was not found.
+
+        Example:
+            async def save(values, created):
+                my_mysql.buffer_into_table("MyDatabase", values, created)
+
+            await my_opcua.subscribe_db_name("MyDatabase", save, sampling_interval=50)
+        """
+        db_variables = await self.get_db_variables(db_name)
+        if not db_variables:
+            return None
+        self._subscription_specs.append(
+            {
+                "db_name": db_name,
+                "callback": callback,
+                "publishing_interval": publishing_interval,
+                "sampling_interval": sampling_interval,
+                "queue_size": queue_size,
+                "deadband_type": deadband_type,
+                "deadband_value": deadband_value,
+                "bad_quality": bad_quality,
+            }
+        )
+        variables = [self.client.get_node(variable["node_id"]) for variable in db_variables]
+        data_values = await self.read_attributes(variables)
+        handler = DataChangeHandler(
+            {variable["node_id"]: variable["name"] for variable in db_variables}
+        )
+        subscription = await self.client.create_subscription(
+            publishing_interval, handler
+        )
+        deadband_filter = None
+        if deadband_type:
+            deadband_filter = ua.DataChangeFilter()
+            deadband_filter.Trigger = ua.DataChangeTrigger.StatusValue
+            deadband_filter.DeadbandType = (
+                ua.DeadbandType.Percent
+                if deadband_type.lower() == "percent"
+                else ua.DeadbandType.Absolute
+            )
+            deadband_filter.DeadbandValue = deadband_value
+        handles = await self._create_monitored_items(
+            subscription, variables, deadband_filter, queue_size, sampling_interval
+        )
+        if deadband_filter is not None:
+            # Non numeric variables (Bool, String, ...) reject the deadband filter
+            rejected = [
+                variable
+                for variable, handle in zip(variables, handles)
+                if isinstance(handle, ua.StatusCode)
+            ]
+            if rejected:
+                await self._create_monitored_items(
+                    subscription, rejected, None, queue_size, sampling_interval
+                )
+        task = asyncio.create_task(
+            self._consume_data_changes(
+                handler, db_variables, data_values, callback, bad_quality
+            )
+        )
+        self._subscriptions.append((subscription, task))
+        return subscription
+
+    async def _create_monitored_items(
+        self, subscription, nodes, mfilter, queue_size, sampling_interval
+    ) -> list:
+        requests = [
+            subscription._make_monitored_item_request(
+                node,
+                ua.AttributeIds.Value,
+                mfilter,
+                queue_size,
+                ua.MonitoringMode.Reporting,
+                sampling_interval,
+            )
+            for node in nodes
+        ]
+        return await subscription.create_monitored_items(requests)
+
+    async def _consume_data_changes(
+        self, handler, variables: list, data_values: list, callback, bad_quality: str
+    ) -> None:
+        indexes = {variable["name"]: index for index, variable in enumerate(variables)}
+        while True:
+            for name, data_value in await handler.get_changes():
+                data_values[indexes[name]] = data_value
+            with metrics.timer("opcua_transform_seconds", endpoint=self.url):
+                values, created, _ = self._format_sample(variables, data_values, bad_quality)
+            if not values:
+                continue
+            result = callback(values, created)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def unsubscribe_all(self) -> None:
+        """
+        Delete all the subscriptions (data changes and model changes) and stop their consumer tasks.
+        """
+        for subscription, task in self._subscriptions:
+            if task is not None:
+                task.cancel()
+            try:
+                await subscription.delete()
+            except Exception as err:
+                print(f"Error deleting subscription: {err}")
+        self._subscriptions = []
+        self._subscription_specs = []
@@ -0,0 +1,129 @@
+"""NodeCache class to keep the resolved address space of the data blocks in memory and on disk"""
+import json
+import os
+
+
+class NodeCache:
+    """
+    A cache of the resolved node tree of the global data blocks.
+
+    It maps each data block name to its node id and to the node ids, names, data types and array
+    dimensions of its variables, so the address space is only browsed once. The cache is tagged with a fingerprint
+    of the server (its NamespaceArray); when the fingerprint changes the cache is cleared.
+
+    Args:
+        path (str): The JSON file where the cache is persisted between runs. None keeps it in memory only.
+
+    Example:
+        cache = NodeCache("node_cache.json")
+        cache.set_variables("MyDatabase", [{"node_id": "ns=3;s=...", "name": "temp", "data_type": "i=10"}])
+        cache.save()
+    """
+
+    def __init__(self, path: str = None) -> None:
+        """
+        Initialize a new instance of NodeCache and load the persisted cache, if any.
+
+        Args:
+            path (str): The JSON file where the cache is persisted. None keeps it in memory only.
+        """
+        self.path = path
+        self.fingerprint = None
+        self.databases = {}  # data block name -> node id
+        self.variables = {}  # data block name (lower case) -> list of variable dicts
+        self.load()
+
+    def load(self) -> None:
+        """
+        Load the cache from "path". A missing or corrupted file leaves the cache empty.
+        """
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+            self.fingerprint = data["fingerprint"]
+            self.databases = data["databases"]
+            self.variables = data["variables"]
+        except (OSError, ValueError, KeyError) as err:
+            print(f"Error loading the node cache {self.path}: {err}")
+            self.invalidate()
+
+    def save(self) -> None:
+        """
+        Persist the cache to "path". The file is replaced atomically.
+        """
+        if self.path is None:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as cache_file:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "databases": self.databases,
+                    "variables": self.variables,
+                },
+                cache_file,
+            )
+        os.replace(temp_path, self.path)
+
+    def validate(self, fingerprint) -> bool:
+        """
+        Compare the cached fingerprint with the current one and clear the cache if they differ.
+
+        Args:
+            fingerprint: A JSON serializable value describing the server's address space.
+
+        Returns:
+            bool: True if the cache is still valid, False if it was cleared.
+        """
+        if fingerprint == self.fingerprint:
+            return True
+        self.invalidate()
+        self.fingerprint = fingerprint
+        return False
+
+    def invalidate(self, db_name: str = None) -> None:
+        """
+        Clear the whole cache or only the variables of one data block.
+
+        Args:
+            db_name (str): The data block to invalidate. None clears everything.
+        """
+        if db_name is None:
+            self.databases = {}
+            self.variables = {}
+        else:
+            self.variables.pop(db_name.lower(), None)
+
+    def set_databases(self, databases: dict) -> None:
+        """
+        Store the data blocks found on the server.
+
+        Args:
+            databases (dict): A dictionary mapping data block names to their node ids.
+        """
+        self.databases = databases
+
+    def get_variables(self, db_name: str):
+        """
+        Get the cached variables of a data block.
+
+        Args:
+            db_name (str): The name of the data block.
+
+        Returns:
+            list: A list of {"node_id", "name", "data_type", "array_dimensions"} dictionaries,
+            or None if not cached.
+        """
+        return self.variables.get(db_name.lower())
+
+    def set_variables(self, db_name: str, variables: list) -> None:
+        """
+        Store the variables of a data block.
+
+        Args:
+            db_name (str): The name of the data block.
+            variables (list): A list of {"node_id", "name", "data_type", "array_dimensions"} dictionaries.
+        """
+        self.variables[db_name.lower()] = variables
@@ -0,0 +1,175 @@
+"""AcquisitionScheduler class to run acquisitions on fixed-rate, wall-clock aligned ticks"""
+import asyncio
+import math
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+OVERRUN_POLICIES = ("skip", "coalesce")
+# Number of recent run durations per job kept for the duration percentiles
+DURATION_SAMPLES = 1024
+
+
+class AcquisitionScheduler:
+    """
+    A drift-free scheduler that runs acquisition jobs on absolute, wall-clock aligned ticks.
+
+    A job with an interval of 5 s fires at hh:mm:00, hh:mm:05, hh:mm:10, ... (plus an optional offset),
+    whatever the duration of the acquisition, so the samples do not drift and are aligned across runs
+    and machines. When an acquisition takes longer than the interval (overrun), the missed ticks are
+    never piled up:
+        - "skip": the missed ticks are skipped and the job waits for the next tick.
+        - "coalesce": the missed ticks are merged into one acquisition run immediately.
+
+    Args:
+        overrun_policy (str): The default overrun policy of the jobs, "skip" or "coalesce".
+
+    Example:
+        async def acquire(tick: datetime):
+            values = await my_opcua.get_values_from_db_name("MyDatabase")
+            await writer.put("MyDatabase", values, tick)
+
+        scheduler = AcquisitionScheduler()
+        scheduler.add_job("MyDatabase", 1.0, acquire)
+        await scheduler.run()
+    """
+
+    def __init__(self, overrun_policy: str = "skip") -> None:
+        """
+        Initialize a new instance of AcquisitionScheduler.
+
+        Args:
+            overrun_policy (str): The default overrun policy of the jobs, "skip" or "coalesce".
+        """
+        if overrun_policy not in OVERRUN_POLICIES:
+            raise ValueError(
+                f"overrun_policy must be one of {OVERRUN_POLICIES}, not {overrun_policy!r}"
+            )
+        self.overrun_policy = overrun_policy
+        self._jobs = {}
+        self._tasks = []
+        self._durations = {}  # job name -> recent run durations
+        self.stats = {}
+
+    def add_job(
+        self,
+        name: str,
+        interval: float,
+        function,
+        offset: float = 0.0,
+        overrun_policy: str = "",
+    ) -> None:
+        """
+        Add a job to the scheduler.
+
+        Args:
+            name (str): The name of the job (e.g. the name of the data block).
+            interval (float): The time in seconds between two ticks.
+            function: A coroutine function called with the tick time (naive UTC datetime) on every tick.
+            offset (float): A shift in seconds of the ticks from the aligned wall-clock times.
+            overrun_policy (str): "skip" or "coalesce". Defaults to the scheduler's policy.
+        """
+        policy = overrun_policy or self.overrun_policy
+        if policy not in OVERRUN_POLICIES:
+            raise ValueError(
+                f"overrun_policy must be one of {OVERRUN_POLICIES}, not {policy!r}"
+            )
+        self._jobs[name] = (interval, function, offset, policy)
+        self.stats[name] = {
+            "runs": 0,
+            "overruns": 0,
+            "skipped_ticks": 0,
+            "last_jitter": 0.0,
+            "max_jitter": 0.0,
+            "avg_jitter": 0.0,
+            "last_duration": 0.0,
+            "max_duration": 0.0,
+        }
+        self._durations[name] = deque(maxlen=DURATION_SAMPLES)
+
+    def start(self) -> None:
+        """
+        Start a task for every job. It must be called from a running event loop.
+        """
+        for name, job in self._jobs.items():
+            self._tasks.append(asyncio.create_task(self._run_job(name, *job)))
+
+    async def run(self) -> None:
+        """
+        Start all the jobs and wait until they end (they run until stop() is called).
+        """
+        self.start()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def stop(self) -> None:
+        """
+        Cancel all the jobs.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def reset_stats(self) -> None:
+        """
+        Reset the statistics of all the jobs, e.g. after a warm-up period.
+        """
+        for name in self._jobs:
+            # in place, the running jobs hold a reference to their statistics
+            self.stats[name].update(dict.fromkeys(self.stats[name], 0))
+            self._durations[name].clear()
+
+    def get_stats(self) -> dict:
+        """
+        Get the statistics of the jobs.
+
+        Returns:
+            dict: A dictionary mapping job names to their runs, overruns, skipped ticks, jitter
+            (delay between the tick and the actual start, in seconds) and durations (in seconds),
+            with the 50th, 95th and 99th percentiles of the last DURATION_SAMPLES durations.
+        """
+        all_stats = {}
+        for name, stats in self.stats.items():
+            all_stats[name] = dict(stats)
+            durations = sorted(self._durations[name])
+            for percentile in (50, 95, 99):
+                all_stats[name][f"p{percentile}_duration"] = (
+                    durations[min(len(durations) - 1, len(durations) * percentile // 100)]
+                    if durations
+                    else 0.0
+                )
+        return all_stats
+
+    async def _run_job(self, name, interval, function, offset, policy) -> None:
+        stats = self.stats[name]
+        next_tick = math.ceil((time.time() - offset) / interval) * interval + offset
+        while True:
+            delay = next_tick - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start = time.time()
+            jitter = max(start - next_tick, 0.0)
+            try:
+                # the tick is naive UTC, as the created column
+                await function(datetime.fromtimestamp(next_tick, timezone.utc).replace(tzinfo=None))
+            except Exception as err:
+                print(f"Error in acquisition job {name}: {err}")
+            end = time.time()
+            stats["runs"] += 1
+            stats["last_jitter"] = jitter
+            stats["max_jitter"] = max(stats["max_jitter"], jitter)
+            stats["avg_jitter"] += (jitter - stats["avg_jitter"]) / stats["runs"]
+            stats["last_duration"] = end - start
+            stats["max_duration"] = max(stats["max_duration"], end - start)
+            self._durations[name].append(end - start)
+            next_tick += interval
+            if end >= next_tick:
+                missed = math.floor((end - next_tick) / interval) + 1
+                stats["overruns"] += 1
+                if policy == "skip":
+                    stats["skipped_ticks"] += missed
+                    next_tick += missed * interval
+                else:
+                    # run once, right now, for the latest missed tick
+                    stats["skipped_ticks"] += missed - 1
+                    next_tick += (missed - 1) * interval
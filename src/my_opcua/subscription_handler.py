@@ -0,0 +1,97 @@
+"""Handler classes to receive DataChange and model change notifications from OPCUA subscriptions"""
+import asyncio
+
+
+class DataChangeHandler:
+    """
+    A subscription handler that collects DataChange notifications of a data block.
+
+    The asyncua subscription calls datachange_notification synchronously for every changed
+    monitored item. The handler only queues the change; a consumer task (see MyOPCUA.subscribe_db_name)
+    merges all the changes of one publish cycle into the current snapshot of the data block.
+
+    Args:
+        node_names (dict): A dictionary mapping node id strings to the display names of the variables.
+
+    Example:
+        handler = DataChangeHandler({"ns=3;s=\"Data_DB\".\"pressure\"": "pressure"})
+        subscription = await client.create_subscription(500, handler)
+    """
+
+    def __init__(self, node_names: dict) -> None:
+        """
+        Initialize a new instance of DataChangeHandler.
+
+        Args:
+            node_names (dict): A dictionary mapping node id strings to the display names of the variables.
+        """
+        self.node_names = node_names
+        self.changes = asyncio.Queue()
+
+    def datachange_notification(self, node, val, data) -> None:
+        """
+        Called by asyncua for every DataChange notification.
+
+        Args:
+            node (Node): The node whose value changed.
+            val: The new value of the node.
+            data (DataChangeNotif): The raw notification data (monitored item and DataValue).
+        """
+        name = self.node_names.get(node.nodeid.to_string())
+        if name is not None:
+            self.changes.put_nowait((name, data.monitored_item.Value))
+
+    def status_change_notification(self, status) -> None:
+        """
+        Called by asyncua when the status of the subscription changes.
+
+        Args:
+            status (ua.StatusChangeNotification): The new status of the subscription.
+        """
+        print(f"Subscription status changed: {status.Status}")
+
+    async def get_changes(self) -> list:
+        """
+        Wait for at least one change and return all the changes queued so far.
+
+        Returns:
+            list: A list of (name, ua.DataValue) tuples, in the order they were received. The data
+            values carry the new value with its source timestamp and status code.
+        """
+        changes = [await self.changes.get()]
+        while not self.changes.empty():
+            changes.append(self.changes.get_nowait())
+        return changes
+
+
+class ModelChangeHandler:
+    """
+    A subscription handler that clears a NodeCache when the server reports a model change.
+
+    Args:
+        node_cache (NodeCache): The cache to invalidate.
+
+    Example:
+        subscription = await client.create_subscription(1000, ModelChangeHandler(node_cache))
+        await subscription.subscribe_events(client.nodes.server, ua.ObjectIds.GeneralModelChangeEventType)
+    """
+
+    def __init__(self, node_cache) -> None:
+        """
+        Initialize a new instance of ModelChangeHandler.
+
+        Args:
+            node_cache (NodeCache): The cache to invalidate.
+        """
+        self.node_cache = node_cache
+
+    def event_notification(self, event) -> None:
+        """
+        Called by asyncua for every GeneralModelChangeEvent of the server.
+
+        Args:
+            event (Event): The received event.
+        """
+        print("Address space changed on the server, clearing the node cache")
+        self.node_cache.invalidate()
+        self.node_cache.save()
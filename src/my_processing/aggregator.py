@@ -0,0 +1,158 @@
+"""RollupAggregator class to downsample high-rate samples into min/max/mean/last/count windows"""
+import math
+from datetime import datetime, timezone
+import numpy as np
+
+DEFAULT_WINDOWS = {"1m": 60, "1h": 3600}
+
+
+def _to_utc_datetime(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+class _WindowBuffer:
+    """
+    The running min/max/sum/count/last of every tag (one array element per tag) for the current window
+    of one table, so its memory does not depend on the sample rate or the window length.
+    """
+
+    def __init__(self) -> None:
+        self.tags = {}  # tag name -> position in the arrays
+        self.minimums = np.empty(0)
+        self.maximums = np.empty(0)
+        self.sums = np.empty(0)
+        self.lasts = np.empty(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.rows = 0
+        self.window = None
+
+    def append(self, values: dict) -> None:
+        new_tags = [name for name in values if name not in self.tags]
+        if new_tags:
+            for name in new_tags:
+                self.tags[name] = len(self.tags)
+            added = len(new_tags)
+            self.minimums = np.append(self.minimums, np.full(added, np.inf))
+            self.maximums = np.append(self.maximums, np.full(added, -np.inf))
+            self.sums = np.append(self.sums, np.zeros(added))
+            self.lasts = np.append(self.lasts, np.full(added, np.nan))
+            self.counts = np.append(self.counts, np.zeros(added, dtype=np.int64))
+        columns = np.fromiter((self.tags[name] for name in values), np.intp, len(values))
+        samples = np.fromiter(values.values(), np.float64, len(values))
+        valid = ~np.isnan(samples)
+        columns, samples = columns[valid], samples[valid]
+        np.minimum.at(self.minimums, columns, samples)
+        np.maximum.at(self.maximums, columns, samples)
+        self.sums[columns] += samples
+        self.lasts[columns] = samples
+        self.counts[columns] += 1
+        self.rows += 1
+
+    def aggregate(self) -> dict:
+        rollups = {
+            name: (
+                float(self.minimums[column]),
+                float(self.maximums[column]),
+                float(self.sums[column] / self.counts[column]),
+                float(self.lasts[column]),
+                int(self.counts[column]),
+            )
+            for name, column in self.tags.items()
+            if self.counts[column]
+        }
+        self.minimums.fill(np.inf)
+        self.maximums.fill(-np.inf)
+        self.sums.fill(0.0)
+        self.lasts.fill(np.nan)
+        self.counts.fill(0)
+        self.rows = 0
+        return rollups
+
+
+class RollupAggregator:
+    """
+    An in-process aggregation stage that maintains rolling windows of the numeric tags of every table.
+
+    Every sample updates, vectorized over its tags, the running min/max/sum/count/last of its table and
+    window (NumPy arrays with one element per tag, so the memory only grows with the number of tags);
+    when a sample falls in a new window, min/max/mean/last/count of the previous window are returned,
+    ready to be written in the rollup tables (MySQL.create_rollup_table). Timestamps are naive UTC and
+    windows are aligned to the epoch (e.g. 1 min windows start at hh:mm:00 UTC). Booleans are
+    aggregated as 0/1, non numeric tags and NaN values are ignored.
+
+    Args:
+        windows (dict): A dictionary mapping window labels to their length in seconds.
+
+    Example:
+        aggregator = RollupAggregator({"1m": 60, "1h": 3600})
+        for label, window_start, rollups in aggregator.add("MyDatabase", values, created):
+            my_mysql.add_rollups("MyDatabase", label, window_start, rollups)
+    """
+
+    def __init__(self, windows: dict = None) -> None:
+        """
+        Initialize a new instance of RollupAggregator.
+
+        Args:
+            windows (dict): A dictionary mapping window labels to their length in seconds.
+        """
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        self._buffers = {}  # (table, window label) -> _WindowBuffer
+
+    def add(self, table: str, values: dict, timestamp: datetime) -> list:
+        """
+        Add a sample and return the windows completed by it.
+
+        Args:
+            table (str): The table (data block) of the sample.
+            values (dict): A dictionary mapping tag names to their values.
+            timestamp (datetime): The time of the sample (naive UTC).
+
+        Returns:
+            list: A list of (window label, window start (naive UTC), rollups) tuples, where rollups
+            maps tag names to (min, max, mean, last, count) tuples.
+        """
+        numeric = {
+            name: float(value)
+            for name, value in values.items()
+            if isinstance(value, (bool, int, float))
+        }
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        seconds = timestamp.timestamp()
+        completed = []
+        for label, length in self.windows.items():
+            window = math.floor(seconds / length) * length
+            buffer = self._buffers.get((table, label))
+            if buffer is None:
+                buffer = self._buffers[(table, label)] = _WindowBuffer()
+            if buffer.window is not None and window != buffer.window and buffer.rows:
+                completed.append(
+                    (label, _to_utc_datetime(buffer.window), buffer.aggregate())
+                )
+            buffer.window = window
+            buffer.append(numeric)
+        return completed
+
+    def flush(self, table: str = None) -> list:
+        """
+        Return the current (incomplete) windows, e.g. on shutdown.
+
+        Args:
+            table (str): The table to flush. None flushes all the tables.
+
+        Returns:
+            list: A list of (table, window label, window start, rollups) tuples.
+        """
+        flushed = []
+        for (buffer_table, label), buffer in self._buffers.items():
+            if (table is None or buffer_table == table) and buffer.rows:
+                flushed.append(
+                    (
+                        buffer_table,
+                        label,
+                        _to_utc_datetime(buffer.window),
+                        buffer.aggregate(),
+                    )
+                )
+        return flushed
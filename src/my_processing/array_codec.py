@@ -0,0 +1,73 @@
+"""Functions to store OPCUA array variables as packed little-endian binary values"""
+import numpy as np
+
+# OPC UA built-in DataType ids (ns=0) and their packed little-endian element types
+ELEMENT_TYPES = {
+    "i=1": "|b1",  # Boolean
+    "i=2": "|i1",  # SByte
+    "i=3": "|u1",  # Byte
+    "i=4": "<i2",  # Int16
+    "i=5": "<u2",  # UInt16
+    "i=6": "<i4",  # Int32
+    "i=7": "<u4",  # UInt32
+    "i=8": "<i8",  # Int64
+    "i=9": "<u8",  # UInt64
+    "i=10": "<f4",  # Float (Siemens REAL)
+    "i=11": "<f8",  # Double (Siemens LREAL)
+}
+
+
+def get_element_type(data_type: str):
+    """
+    Get the packed element type of an OPC UA data type.
+
+    Args:
+        data_type (str): The DataType node id of the variable, e.g. "i=10".
+
+    Returns:
+        str: The NumPy type string (e.g. "<f4"), or None if the type cannot be packed.
+    """
+    return ELEMENT_TYPES.get(data_type)
+
+
+def encode_array(values: list, element_type: str) -> bytes:
+    """
+    Pack the elements of an array as little-endian binary.
+
+    Args:
+        values (list): The elements of the array, as read from the OPC UA server.
+        element_type (str): The NumPy type string of the elements (see get_element_type).
+
+    Returns:
+        bytes: The packed elements.
+
+    Example:
+        encode_array([1.0, 2.0], "<f4")
+        # Output:
+        # b'\\x00\\x00\\x80?\\x00\\x00\\x00@'
+    """
+    return np.asarray(values, dtype=element_type).tobytes()
+
+
+def decode_array(blob: bytes, element_type: str, dimensions=None) -> np.ndarray:
+    """
+    Decode a packed array back into a NumPy array without copying the data.
+
+    The returned array is a read-only view of "blob".
+
+    Args:
+        blob (bytes): The packed elements, as stored in the BLOB column.
+        element_type (str): The NumPy type string of the elements, as stored in the array metadata.
+        dimensions (list): The dimensions of the array. None keeps it one-dimensional.
+
+    Returns:
+        np.ndarray: The array.
+
+    Example:
+        metadata = my_mysql.get_array_metadata("MyDatabase")["pressure"]
+        pressure = decode_array(row_blob, metadata["element_type"], metadata["dimensions"])
+    """
+    array = np.frombuffer(blob, dtype=element_type)
+    if dimensions:
+        array = array.reshape(dimensions)
+    return array
@@ -0,0 +1,133 @@
+"""ChangeFilter class to store values by exception, with per-tag deadbands and heartbeat"""
+from datetime import datetime
+
+
+class ChangeFilter:
+    """
+    A report-by-exception filter placed between MyOPCUA and the MySQL sink.
+
+    It keeps the last stored value of every tag and only lets a tag through when:
+        - it is new,
+        - a numeric value moved more than the absolute deadband, or more than the percent deadband
+          (percent of the last stored value),
+        - a non numeric (or boolean) value changed,
+        - or it was not stored for more than "max_silence" seconds (heartbeat).
+    With both deadbands at 0, any change lets the tag through.
+
+    Args:
+        absolute_deadband (float): The default absolute deadband of the numeric tags.
+        percent_deadband (float): The default percent deadband of the numeric tags.
+        max_silence (float): The heartbeat in seconds. 0 disables it.
+        tag_deadbands (dict): Per-tag overrides, mapping tag names to dictionaries with
+            "absolute", "percent" and/or "max_silence" keys.
+
+    Example:
+        change_filter = ChangeFilter(absolute_deadband=0.5, max_silence=600,
+                                     tag_deadbands={"pressure": {"percent": 1.0}})
+        values = await my_opcua.get_values_from_db_name("MyDatabase")
+        changed = change_filter.filter(values)
+    """
+
+    def __init__(
+        self,
+        absolute_deadband: float = 0.0,
+        percent_deadband: float = 0.0,
+        max_silence: float = 0.0,
+        tag_deadbands: dict = None,
+    ) -> None:
+        """
+        Initialize a new instance of ChangeFilter.
+
+        Args:
+            absolute_deadband (float): The default absolute deadband of the numeric tags.
+            percent_deadband (float): The default percent deadband of the numeric tags.
+            max_silence (float): The heartbeat in seconds. 0 disables it.
+            tag_deadbands (dict): Per-tag overrides of the deadbands and heartbeat.
+        """
+        self.default = {
+            "absolute": absolute_deadband,
+            "percent": percent_deadband,
+            "max_silence": max_silence,
+        }
+        self.tag_deadbands = {
+            name: dict(self.default, **deadbands)
+            for name, deadbands in (tag_deadbands or {}).items()
+        }
+        self._last = {}  # "source.tag name" -> (last stored value, time)
+        self.samples_in = 0
+        self.samples_out = 0
+        self.suppressed = {}  # "source.tag name" -> suppressed samples
+
+    def filter(
+        self, values: dict, timestamp: datetime = None, source: str = ""
+    ) -> dict:
+        """
+        Keep only the tags that must be stored and remember them as the last stored values.
+
+        Args:
+            values (dict): A dictionary mapping tag names to their values.
+            timestamp (datetime): The time of the sample. Defaults to the current time.
+            source (str): The data block or table of the values, so tags with the same name in
+                different data blocks are tracked separately.
+
+        Returns:
+            dict: The tags that must be stored, with their values.
+        """
+        timestamp = timestamp if timestamp is not None else datetime.now()
+        changed = {}
+        for name, value in values.items():
+            key = f"{source}.{name}" if source else name
+            last = self._last.get(key)
+            if last is None or self._must_store(name, last, value, timestamp):
+                changed[name] = value
+                self._last[key] = (value, timestamp)
+            else:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+        self.samples_in += len(values)
+        self.samples_out += len(changed)
+        return changed
+
+    def reset(self) -> None:
+        """
+        Forget the last stored values, so the next sample of every tag is stored.
+        """
+        self._last = {}
+
+    def get_stats(self) -> dict:
+        """
+        Get the statistics of the filter.
+
+        Returns:
+            dict: Samples received, stored and suppressed, the suppression ratio and the suppressed
+            samples per tag.
+        """
+        suppressed = self.samples_in - self.samples_out
+        return {
+            "samples_in": self.samples_in,
+            "samples_out": self.samples_out,
+            "suppressed": suppressed,
+            "suppression_ratio": suppressed / self.samples_in if self.samples_in else 0.0,
+            "suppressed_per_tag": dict(self.suppressed),
+        }
+
+    def _must_store(self, name: str, last: tuple, value, timestamp: datetime) -> bool:
+        deadbands = self.tag_deadbands.get(name, self.default)
+        last_value, last_time = last
+        if (
+            deadbands["max_silence"]
+            and (timestamp - last_time).total_seconds() >= deadbands["max_silence"]
+        ):
+            return True
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return value != last_value
+        if isinstance(last_value, bool) or not isinstance(last_value, (int, float)):
+            return True
+        delta = abs(value - last_value)
+        if not deadbands["absolute"] and not deadbands["percent"]:
+            return delta != 0
+        if deadbands["absolute"] and delta > deadbands["absolute"]:
+            return True
+        return bool(
+            deadbands["percent"]
+            and delta > abs(last_value) * deadbands["percent"] / 100
+        )
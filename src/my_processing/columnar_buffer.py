@@ -0,0 +1,222 @@
+"""TagIndex and ColumnarRingBuffer classes to keep the samples of a data block in preallocated arrays"""
+import itertools
+from datetime import datetime
+import numpy as np
+
+# Types of the column blocks of a buffer, in column order
+COLUMN_DTYPES = ("float64", "int64", "bool", "object")
+
+
+class TagIndex:
+    """
+    The precomputed column layout of a data block.
+
+    Every variable of the data block owns a fixed slice of columns: one column for a scalar, one column
+    per element for an array (named "name[i]", as in MyOPCUA.format_variable). The columns are grouped
+    in one block per type (COLUMN_DTYPES), so integers and booleans keep their type. The layout is
+    computed once, so the reads can write the values straight into the columns of a buffer.
+
+    Args:
+        names (list): The names of the variables, in read order.
+        lengths (list): The number of elements of each variable (None for a scalar).
+        dtypes (list): The type of each variable, one of COLUMN_DTYPES. Defaults to "float64".
+
+    Example:
+        tag_index = TagIndex(
+            ["temp", "pressure", "count"], [None, 3, None], ["float64", "float64", "int64"]
+        )
+        tag_index.columns
+        # Output:
+        # ["temp", "pressure[0]", "pressure[1]", "pressure[2]", "count"]
+    """
+
+    def __init__(self, names: list, lengths: list, dtypes: list = None) -> None:
+        """
+        Initialize a new instance of TagIndex.
+
+        Args:
+            names (list): The names of the variables, in read order.
+            lengths (list): The number of elements of each variable (None for a scalar).
+            dtypes (list): The type of each variable, one of COLUMN_DTYPES. Defaults to "float64".
+        """
+        if len(lengths) != len(names):
+            raise ValueError(f"{len(names)} variables but {len(lengths)} lengths")
+        dtypes = list(dtypes) if dtypes is not None else ["float64"] * len(names)
+        if len(dtypes) != len(names) or not set(dtypes) <= set(COLUMN_DTYPES):
+            raise ValueError(f"dtypes must be {len(names)} values of {COLUMN_DTYPES}")
+        self.names = list(names)
+        block_columns = {dtype: [] for dtype in COLUMN_DTYPES}
+        slices = []
+        for name, length, dtype in zip(names, lengths, dtypes):
+            columns = block_columns[dtype]
+            slices.append((dtype, len(columns), length))
+            if length is None:
+                columns.append(name)
+            else:
+                columns.extend(f"{name}[{index}]" for index in range(length))
+        self.dtypes = [dtype for dtype in COLUMN_DTYPES if block_columns[dtype]]
+        self.block_sizes = [len(block_columns[dtype]) for dtype in self.dtypes]
+        self.columns = list(itertools.chain(*(block_columns[dtype] for dtype in self.dtypes)))
+        # (block, first column in the block, number of elements or None for a scalar)
+        self.slices = [
+            (self.dtypes.index(dtype), start, length) for dtype, start, length in slices
+        ]
+
+    def __len__(self) -> int:
+        """
+        int: The number of columns.
+        """
+        return len(self.columns)
+
+
+class ColumnarBatch:
+    """
+    A batch of rows taken out of a ColumnarRingBuffer.
+
+    Args:
+        columns (list): The column names.
+        timestamps (np.ndarray): The timestamps of the rows (datetime64[us]).
+        values: The values, one row per sample and one column per tag: an array, or a list of arrays
+            (one block per type, see TagIndex) whose columns follow each other.
+    """
+
+    def __init__(self, columns: list, timestamps: np.ndarray, values) -> None:
+        """
+        Initialize a new instance of ColumnarBatch.
+
+        Args:
+            columns (list): The column names.
+            timestamps (np.ndarray): The timestamps of the rows (datetime64[us]).
+            values: The values, an array or a list of typed blocks of columns.
+        """
+        self.columns = columns
+        self.timestamps = timestamps
+        self.values = values
+        self.blocks = values if isinstance(values, list) else [values]
+
+    def __len__(self) -> int:
+        """
+        int: The number of rows.
+        """
+        return len(self.timestamps)
+
+    def to_rows(self) -> list:
+        """
+        Convert the batch to INSERT parameters: one tuple per row, with the timestamp as last value.
+
+        Returns:
+            list: A list of tuples, with Python values of the type of their block (float, int, bool...).
+        """
+        if len(self.blocks) == 1:
+            return [
+                (*row, timestamp)
+                for row, timestamp in zip(self.blocks[0].tolist(), self.timestamps.tolist())
+            ]
+        return [
+            (*itertools.chain(*rows), timestamp)
+            for *rows, timestamp in zip(
+                *(block.tolist() for block in self.blocks), self.timestamps.tolist()
+            )
+        ]
+
+    def to_dicts(self) -> list:
+        """
+        Convert the batch to (variables, created) tuples, the layout used by the rest of the sink.
+
+        Returns:
+            list: A list of (dict, datetime) tuples.
+        """
+        return [(dict(zip(self.columns, row[:-1])), row[-1]) for row in self.to_rows()]
+
+
+class ColumnarRingBuffer:
+    """
+    A typed, preallocated ring buffer of the samples of one data block.
+
+    Values are stored in one (capacity x columns) array per column type of the TagIndex (float64,
+    int64, bool, object) and timestamps in a datetime64[us] array. A reader writes a sample
+    with next_row()/commit(), the sink takes all the pending rows at once with drain(). No dictionary
+    is built per sample. When the buffer is full the oldest rows are overwritten and counted in
+    "overwritten".
+
+    Args:
+        tag_index (TagIndex): The column layout of the data block.
+        capacity (int): The number of rows of the buffer.
+
+    Example:
+        buffer = ColumnarRingBuffer(tag_index, capacity=4096)
+        await my_opcua.read_into_buffer("MyDatabase", buffer)
+        batch = buffer.drain()
+    """
+
+    def __init__(self, tag_index: TagIndex, capacity: int = 4096) -> None:
+        """
+        Initialize a new instance of ColumnarRingBuffer.
+
+        Args:
+            tag_index (TagIndex): The column layout of the data block.
+            capacity (int): The number of rows of the buffer.
+        """
+        self.tag_index = tag_index
+        self.capacity = capacity
+        self.blocks = [
+            np.zeros((capacity, size), dtype=dtype)
+            for dtype, size in zip(tag_index.dtypes, tag_index.block_sizes)
+        ]
+        self.timestamps = np.zeros(capacity, dtype="datetime64[us]")
+        # the row being written, copied into the buffer by commit()
+        self._row = [
+            np.zeros(size, dtype=dtype)
+            for dtype, size in zip(tag_index.dtypes, tag_index.block_sizes)
+        ]
+        self.start = 0
+        self.count = 0
+        self.overwritten = 0
+        self.last_timestamp = None  # the time of the newest sample committed
+
+    def next_row(self) -> list:
+        """
+        Get the row where the next sample must be written. It is only kept after commit().
+
+        The row is a scratch row outside the ring, so a sample abandoned before commit() (e.g. a Bad
+        variable) never changes the buffered rows, even the oldest one of a full buffer.
+
+        Returns:
+            list: The row of every block, indexed like TagIndex.slices.
+        """
+        return self._row
+
+    def commit(self, timestamp: datetime) -> None:
+        """
+        Keep the row returned by next_row() as a sample.
+
+        Args:
+            timestamp (datetime): The time of the sample.
+        """
+        index = (self.start + self.count) % self.capacity
+        for block, values in zip(self.blocks, self._row):
+            block[index] = values
+        self.timestamps[index] = np.datetime64(timestamp, "us")
+        self.last_timestamp = timestamp
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.overwritten += 1
+        else:
+            self.count += 1
+
+    def drain(self) -> ColumnarBatch:
+        """
+        Take all the pending rows, oldest first.
+
+        Returns:
+            ColumnarBatch: The pending rows (copied, so the buffer can be reused at once).
+        """
+        indexes = (self.start + np.arange(self.count)) % self.capacity
+        batch = ColumnarBatch(
+            self.tag_index.columns,
+            self.timestamps[indexes],
+            [block[indexes] for block in self.blocks],
+        )
+        self.start = (self.start + self.count) % self.capacity
+        self.count = 0
+        return batch